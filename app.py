@@ -1,42 +1,152 @@
 # app.py
 import streamlit as st
+import functools
 import json
 import os
-from datetime import datetime
+import uuid
 import pandas as pd
-from tab_generator import TabGenerator, clean_blank_and_convert_to_numeric
-from datamap_parser import parse_datamap_to_json
-import pyreadstat  # Add this with other imports
+from datamap_parser import GRID_MODES, parse_datamap_to_json
+from expressions import ExpressionError
+from question_store import QUESTION_DB, QuestionStoreError, open_question_store
+from data_loader import CHUNK_ROWS, DataFileError
+from jobs import JobRegistry
+from tab_cli import JobError, validate_job
+from tab_runner import DEFAULT_BANNER_CONFIG, load_banner_config
+from table_writer import OUTPUT_FORMATS
+from profiling import Profiler
+from weighting import WeightingError, parse_rim_targets
 
 # Constants
 JSON_FILE = "questions_master.json"
+QUESTIONS_PER_PAGE = 50
 DEFAULT_DATA_FILE = "Final_CE_10042023_V3.csv"
 DEFAULT_STUDY_NAME = "DTV-010 Feature Prioritization"
 DEFAULT_CLIENT_NAME = "PEERLESS INSIGHTS"
+# Generation jobs running at once on this server; later ones queue
+MAX_RUNNING_JOBS = 2
 
 # ----------------------
 # Helper functions
 # ----------------------
-def load_questions():
-    """Load questions from local JSON file with error handling."""
-    try:
-        if os.path.exists(JSON_FILE):
-            with open(JSON_FILE, "r", encoding='utf-8') as f:
-                return json.load(f)
-        return []
-    except Exception as e:
-        st.error(f"Error loading questions: {str(e)}")
-        return []
-
-def save_questions(questions):
-    """Save questions to local JSON file with error handling."""
-    try:
-        with open(JSON_FILE, "w", encoding='utf-8') as f:
-            json.dump(questions, f, indent=4, ensure_ascii=False)
-        return True
-    except Exception as e:
-        st.error(f"Error saving questions: {str(e)}")
-        return False
+@st.cache_resource
+def get_question_store():
+    """The shared question store (seeded from the JSON file the first time)."""
+    return open_question_store(QUESTION_DB, json_file=JSON_FILE)
+
+def show_profile(profiler, file_stem, key=None):
+    """Collapsible timing/memory report of a profiled run, with the JSON trace as a download."""
+    with st.expander("⏱️ Profiling", expanded=True):
+        st.markdown("**Stages and steps**")
+        st.dataframe(profiler.summary())
+        st.markdown("**Slowest tables**")
+        st.dataframe(profiler.slowest("table"))
+        if profiler.banners:
+            st.markdown("**Slowest banners**")
+            st.dataframe(profiler.slowest("banner", by="name"))
+        st.download_button(
+            label="⬇️ Download JSON Trace",
+            data=profiler.export_json(),
+            file_name=f"{file_stem}_profile.json",
+            mime="application/json",
+            help="Chrome trace format; open it in chrome://tracing or ui.perfetto.dev",
+            on_click="ignore",
+            key=key
+        )
+
+@st.cache_resource
+def get_job_registry():
+    """Background generation jobs, shared by every session of this server."""
+    return JobRegistry(max_running=MAX_RUNNING_JOBS)
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}:{seconds:02d}"
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def show_job_result(job):
+    """Outcome of a finished job: the download and run details, or what went wrong."""
+    if job.status == "done":
+        summary = job.summary
+        st.success(f"✅ Tables generated successfully! Saved to: {job.output}")
+        if "rim_weights" in summary:
+            report = summary["rim_weights"]
+            st.caption(f"⚖️ Rim weights: {report['iterations']} iteration(s), "
+                       f"efficiency {report['efficiency']:.1%}, "
+                       f"range {report['min_weight']:.2f}–{report['max_weight']:.2f}")
+            if not report["converged"]:
+                st.warning(f"⚠️ Rim weights did not converge (max error {report['max_error']:.4f})")
+        if "reused_tables" in summary:
+            st.caption(f"♻️ {summary['reused_tables']} table(s) reused, {summary['computed_tables']} recomputed")
+        if "cube" in summary:
+            st.caption(f"🧊 Result cube saved to: {summary['cube']} (re-lay it out with `python result_cube.py`)")
+        if summary["coerced_columns"]:
+            st.warning(f"⚠️ {len(summary['coerced_columns'])} column(s) had non-numeric values that were "
+                       f"treated as blank")
+            with st.expander("🧹 Cleaning report"):
+                st.dataframe(pd.Series(summary["coerced_columns"], name="coerced_to_na"))
+        if os.path.exists(job.output):
+            # Served from the file on disk, read only when clicked
+            st.download_button(
+                label="⬇️ Download Tables",
+                data=functools.partial(read_bytes, job.output),
+                file_name=os.path.basename(job.output),
+                mime=OUTPUT_FORMATS[job.spec["output_format"]][1],
+                on_click="ignore",
+                key=f"download_{job.id}"
+            )
+        if job.profiler is not None:
+            show_profile(job.profiler, os.path.splitext(os.path.basename(job.output))[0], key=f"trace_{job.id}")
+    elif job.status == "failed":
+        e = job.error
+        st.error(f"❌ {str(e)}" if isinstance(e, (ExpressionError, DataFileError, ImportError, WeightingError,
+                                                   JobError)) else f"❌ Error generating tables: {str(e)}")
+        if isinstance(e, ExpressionError):
+            # Raised before any table is generated: a banner condition or base filter is invalid
+            st.info("Fix the banner conditions or base filters listed above and run again")
+        elif isinstance(e, DataFileError):
+            st.info("Try exporting your data to CSV/Excel and re-uploading")
+        elif isinstance(e, ImportError):
+            st.info(f"Please run: pip install {e.name}")
+    else:
+        st.info("Cancelled; no output was written")
+
+def show_jobs(registry, owner, polling):
+    """Live progress of the background jobs, newest first."""
+    jobs = registry.jobs(owner)
+    if not jobs:
+        st.caption("No generation jobs yet")
+    for job in jobs:
+        with st.container(border=True):
+            st.markdown(f"**{job.label}** · job {job.id} · {job.status}")
+            if job.status == "queued":
+                st.progress(0.0, text=f"Waiting for a free slot ({registry.queued_ahead(job)} job(s) ahead)")
+            elif job.status == "running":
+                if job.stage == "tables":
+                    eta = job.eta()
+                    text = (f"{job.done} of {job.total} tables · {format_seconds(job.elapsed())} elapsed"
+                            + (f" · about {format_seconds(eta)} left" if eta is not None else ""))
+                    st.progress(job.fraction(), text=text)
+                elif job.stage == "reading":
+                    st.progress(0.0, text=f"Reading data: {job.done} chunk(s)")
+                else:
+                    st.progress(0.0, text="Loading data...")
+                # Tables go to a .part file that is moved into place only when the run completes
+                st.caption(f"⬇️ {os.path.basename(job.output)} can be downloaded here once the run completes")
+            else:
+                show_job_result(job)
+
+            if not job.is_finished:
+                st.button("Cancelling..." if job.cancel_requested else "✖️ Cancel", key=f"cancel_{job.id}",
+                          disabled=job.cancel_requested or job.owner != st.session_state.job_owner,
+                          on_click=job.cancel)
+            else:
+                st.button("Dismiss", key=f"dismiss_{job.id}", on_click=registry.forget, args=(job.id,))
+    if polling and not registry.active():
+        # The last job just finished; rerun the page once so polling stops
+        st.rerun(scope="app")
 
 def validate_display_structure(structure):
     """Validate the display structure format."""
@@ -50,10 +160,13 @@ def validate_display_structure(structure):
     return True
 
 # ----------------------
-# Initialize session state
+# Initialize question store and job registry
 # ----------------------
-if 'questions' not in st.session_state:
-    st.session_state.questions = load_questions()
+store = get_question_store()
+job_registry = get_job_registry()
+# Identifies this browser session's jobs in the shared registry
+if "job_owner" not in st.session_state:
+    st.session_state.job_owner = uuid.uuid4().hex
 
 # ----------------------
 # UI Layout
@@ -64,9 +177,20 @@ st.title("📊 Survey Table Config Manager")
 # Sidebar - View/Select Questions
 st.sidebar.header("🔍 Stored Questions")
 
-if st.session_state.questions:
-    question_options = {f"ID {q['id']} - {q['question_text'][:30]}...": q['id'] 
-                      for q in st.session_state.questions}
+search = st.sidebar.text_input("Search", key="question_search", placeholder="Variable, text or ID")
+matches = store.count(search)
+stored = store.count() if search else matches
+selected_id = None
+
+if matches:
+    # Only one page of questions is read from the store at a time
+    pages = -(-matches // QUESTIONS_PER_PAGE)
+    page = 1
+    if pages > 1:
+        st.session_state.question_page = min(st.session_state.get("question_page", 1), pages)
+        page = st.sidebar.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key="question_page")
+    question_options = {f"ID {qid} - {text[:30]}...": qid
+                        for qid, _, text in store.page((page - 1) * QUESTIONS_PER_PAGE, QUESTIONS_PER_PAGE, search)}
     selected_label = st.sidebar.selectbox(
         "Select Question", 
         list(question_options.keys()),
@@ -79,11 +203,11 @@ if st.session_state.questions:
         st.session_state.edit_id = selected_id
         st.rerun()
     if col2.button("🗑️ Delete", key="delete_btn"):
-        st.session_state.questions = [q for q in st.session_state.questions 
-                                    if q['id'] != selected_id]
-        if save_questions(st.session_state.questions):
-            st.sidebar.success(f"Deleted question ID {selected_id}")
-            st.rerun()
+        store.delete(selected_id)
+        st.sidebar.success(f"Deleted question ID {selected_id}")
+        st.rerun()
+elif search:
+    st.sidebar.info("ℹ️ No questions match the search.")
 else:
     st.sidebar.info("ℹ️ No questions stored yet. Import or add new questions below.")
 
@@ -100,29 +224,60 @@ with tab1:
         type=["xlsx"],
         help="Upload your survey datamap Excel file to automatically generate question configurations"
     )
+    datamap_sheet = st.text_input(
+        "Datamap Sheet Name",
+        value="Sheet1",
+        help="Worksheet holding the datamap; leave blank to use the first sheet"
+    )
+    grid_mode = st.radio(
+        "Grid Questions",
+        GRID_MODES,
+        format_func=lambda m: {"items": "One question per item", "grid": "Grid summary plus item tables"}[m],
+        horizontal=True,
+        help="Import each grid item as its own single-select question, or each grid as one grid question"
+    )
 
     if uploaded_file is not None:
         if st.button("⚡ Generate Questions from Datamap", type="primary"):
             try:
                 with st.spinner("🔍 Processing datamap..."):
-                    new_questions = parse_datamap_to_json(uploaded_file)
-                    
-                    # Get next available ID
-                    existing_ids = [q['id'] for q in st.session_state.questions] if st.session_state.questions else [0]
-                    start_id = max(existing_ids) + 1
-                    
-                    # Update IDs to avoid conflicts
-                    for i, q in enumerate(new_questions):
-                        q['id'] = start_id + i
+                    new_questions = parse_datamap_to_json(uploaded_file, sheet_name=datamap_sheet.strip() or None,
+                                                          grid_mode=grid_mode)
                     
-                    st.session_state.questions.extend(new_questions)
-                    if save_questions(st.session_state.questions):
-                        st.success(f"✅ Added {len(new_questions)} new questions from datamap!")
-                        st.rerun()
+                    # New questions are numbered after the highest existing ID, in one transaction
+                    store.add_many(new_questions)
+                    st.success(f"✅ Added {len(new_questions)} new questions from datamap!")
+                    st.rerun()
             except Exception as e:
                 st.error(f"❌ Error processing datamap: {str(e)}")
                 st.exception(e)
 
+    st.header("Import / Export Question JSON")
+    json_file = st.file_uploader(
+        "Upload Question JSON",
+        type=["json"],
+        help="A questions_master.json-style list of question configurations"
+    )
+    replace_questions = st.checkbox(
+        "Replace all stored questions",
+        value=False,
+        help="Keep the IDs in the file and drop every stored question; otherwise the file's questions are added with new IDs"
+    )
+    if json_file is not None and st.button("📥 Import JSON"):
+        try:
+            imported = store.import_json(json_file, replace=replace_questions)
+            st.success(f"✅ Imported {imported} question(s)")
+            st.rerun()
+        except QuestionStoreError as e:
+            st.error(f"❌ {str(e)}")
+    st.download_button(
+        label="⬇️ Export Questions (JSON)",
+        data=store.export_json,  # built only when the button is clicked
+        file_name=JSON_FILE,
+        mime="application/json",
+        disabled=not stored
+    )
+
 # ----------------------
 # Tab 2: Add/Edit Question
 # ----------------------
@@ -142,13 +297,13 @@ with tab2:
         "base_filter": "",
         "question_type": "single",
         "mean_var": "",
-        "show_sigma": True
+        "show_sigma": True,
+        "item_labels": ""
     }
 
     # Load question for editing if in edit mode
     if "edit_id" in st.session_state:
-        q_to_edit = next((q for q in st.session_state.questions 
-                         if q['id'] == st.session_state.edit_id), None)
+        q_to_edit = store.get(st.session_state.edit_id)
         if q_to_edit:
             form_defaults.update({
                 "question_var": ",".join(q_to_edit['question_var']) 
@@ -160,7 +315,8 @@ with tab2:
                 "base_filter": q_to_edit['base_filter'] or "",
                 "question_type": q_to_edit['question_type'],
                 "mean_var": q_to_edit['mean_var'] or "",
-                "show_sigma": q_to_edit.get("show_sigma", True)
+                "show_sigma": q_to_edit.get("show_sigma", True),
+                "item_labels": "\n".join(q_to_edit.get("item_labels") or [])
             })
         else:
             st.warning("Question not found for editing.")
@@ -187,9 +343,9 @@ with tab2:
             )
             question_type = st.selectbox(
                 "Question Type*",
-                ["single", "multi", "open_numeric"],
-                index=["single", "multi", "open_numeric"].index(form_defaults["question_type"]),
-                help="Single-select, Multi-select, or Open Numeric question"
+                ["single", "multi", "grid", "open_numeric"],
+                index=["single", "multi", "grid", "open_numeric"].index(form_defaults["question_type"]),
+                help="Single-select, Multi-select, Grid (items answered on one scale) or Open Numeric question"
             )
             
         with col2:
@@ -220,6 +376,11 @@ Example:
                 value=form_defaults["show_sigma"],
                 help="Show statistical significance testing"
             )
+            item_labels = st.text_area(
+                "Grid Item Labels",
+                value=form_defaults["item_labels"],
+                help="Grid questions only: one label per item variable, in order; blank lines use the variable name"
+            )
 
         submitted = st.form_submit_button("💾 Save Question", type="primary")
 
@@ -250,25 +411,26 @@ Example:
                 "mean_var": mean_var if mean_var else None,
                 "show_sigma": show_sigma
             }
+            if question_type == "grid" and item_labels.strip():
+                question_data["item_labels"] = [label.strip() for label in item_labels.strip("\n").splitlines()]
 
             if "edit_id" in st.session_state:
-                # Update existing question
-                for q in st.session_state.questions:
-                    if q['id'] == st.session_state.edit_id:
-                        q.update(question_data)
-                        break
+                # Update existing question (only its row is rewritten)
+                try:
+                    store.update(st.session_state.edit_id, question_data)
+                except QuestionStoreError as e:
+                    st.error(f"❌ {str(e)}")
+                    st.session_state.pop("edit_id", None)
+                    st.stop()
                 success_msg = f"Question ID {st.session_state.edit_id} updated!"
                 st.session_state.pop("edit_id", None)
             else:
                 # Add new question
-                new_id = max([q['id'] for q in st.session_state.questions], default=0) + 1
-                question_data["id"] = new_id
-                st.session_state.questions.append(question_data)
+                new_id = store.add(question_data)
                 success_msg = f"Question saved with ID {new_id}!"
 
-            if save_questions(st.session_state.questions):
-                st.success(success_msg)
-                st.rerun()
+            st.success(success_msg)
+            st.rerun()
 
 # ----------------------
 # Tab 3: Generate Tables
@@ -294,19 +456,147 @@ with tab3:
                 "Client Name*",
                 value=DEFAULT_CLIENT_NAME
             )
+        workers = st.number_input(
+            "Worker Processes",
+            min_value=1,
+            max_value=os.cpu_count() or 1,
+            value=1,
+            help="Split tables across this many processes (1 = serial). Output is identical either way."
+        )
+        use_data_cache = st.checkbox(
+            "Use Data Cache",
+            value=True,
+            help="Reuse the cleaned data from .tab_cache/ until the data file changes"
+        )
+        reuse_tables = st.checkbox(
+            "Reuse Unchanged Tables",
+            value=True,
+            help="Only recompute tables whose question, banners or underlying data changed since the last run"
+        )
+        save_cube = st.checkbox(
+            "Save Result Cube",
+            value=False,
+            help="Also save every table's counts, bases and stats next to the output (.npz), so the tables can be "
+                 "laid out again with other decimals, banners or significance settings without the data. "
+                 "Tables are then computed serially, without table reuse."
+        )
+        col8, col9 = st.columns(2)
+        with col8:
+            streaming = st.checkbox(
+                "Streaming Mode (low memory)",
+                value=False,
+                help="Read CSV/SPSS files in chunks instead of loading them whole; for files that do not fit "
+                     "in memory. Runs serially, without the data cache or table reuse."
+            )
+        with col9:
+            chunk_rows = st.number_input(
+                "Rows per Chunk",
+                min_value=1000,
+                value=CHUNK_ROWS,
+                step=10000,
+                help="Peak memory grows with the chunk size",
+                disabled=not streaming
+            )
+        col4, col5 = st.columns(2)
+        with col4:
+            output_format = st.radio(
+                "Output Format",
+                ["csv", "xlsx"],
+                format_func=lambda f: {"csv": "CSV", "xlsx": "Excel (XLSX)"}[f],
+                horizontal=True
+            )
+        with col5:
+            xlsx_layout = st.radio(
+                "Excel Layout",
+                ["sheets", "single"],
+                format_func=lambda l: {"sheets": "One sheet per table", "single": "All tables on one sheet"}[l],
+                horizontal=True,
+                disabled=output_format != "xlsx"
+            )
+
+        col6, col7 = st.columns(2)
+        with col6:
+            sig_testing = st.checkbox(
+                "Significance Testing",
+                value=False,
+                help="Tag percentages and means with the letters of the banner columns they are significantly higher than"
+            )
+        with col7:
+            sig_level = st.select_slider(
+                "Confidence Level",
+                options=[0.90, 0.95, 0.99],
+                value=0.95,
+                format_func=lambda c: f"{c:.0%}",
+                disabled=not sig_testing
+            )
+
+        extra_stats = st.multiselect(
+            "Extra Statistics",
+            ["min", "p5", "p10", "p25", "p75", "p90", "p95", "max"],
+            format_func=lambda s: s.capitalize() if s in ("min", "max") else f"{s[1:]}th percentile",
+            help="Rows added after the Median for every question with a mean variable"
+        )
+
+        col10, col11, col12 = st.columns(3)
+        with col10:
+            profile_run = st.checkbox(
+                "Profile Run",
+                value=False,
+                help="Time every stage and table and show where the run spent its time"
+            )
+        with col11:
+            profile_memory = st.checkbox(
+                "Track Memory",
+                value=False,
+                help="Also record peak memory per stage and table (slows the run down; jobs running at the "
+                     "same time share the process-wide memory tracer)",
+                disabled=not profile_run
+            )
+        with col12:
+            profile_banners = st.checkbox(
+                "Per-Banner Detail",
+                value=False,
+                help="Also time each banner condition (and each banner of tables counted banner by banner)",
+                disabled=not profile_run
+            )
+
+    with st.expander("⚖️ Weighting"):
+        weighting = st.radio(
+            "Weighting",
+            ["none", "variable", "rim"],
+            format_func=lambda w: {"none": "Unweighted", "variable": "Weight variable",
+                                   "rim": "Rim weights (raking)"}[w],
+            horizontal=True
+        )
+        weight_var = st.text_input(
+            "Weight Variable",
+            help="Column in the data file holding respondent weights",
+            disabled=weighting != "variable"
+        ).strip()
+        rim_targets_text = st.text_area(
+            "Rim Targets (JSON)",
+            value='{"hGender": {"1": 0.5, "2": 0.5}}',
+            help="Target share of each code per variable; weights are raked to match every variable at once",
+            disabled=weighting != "rim"
+        )
 
     # Banner configuration
     st.subheader("Banner Configuration")
-    banner_config = [
-        {"id": "A", "label": "Total", "condition": None},
-        {"id": "B", "label": "Gen Pop Sample", "condition": "vboost == 1"},
-        {"id": "C", "label": "MVPD Users", "condition": "hMVPD == 2"},
-        {"id": "D", "label": "vMVPD Users", "condition": "S6r1 == 1 or S6r2 == 1 or S6r3 == 1 or S6r4 == 1 or S6r5 == 1 or S6r6 == 1 or S6r7 == 1 or S6r8 == 1 or S6r9 == 1"},
-        {"id": "E", "label": "Male", "condition": "hGender == 1 and vboost == 1"},    
-        {"id": "F", "label": "Female", "condition": "hGender == 2 and vboost == 1"},
-    ]
+    banner_text = st.text_area(
+        "Banners (JSON)",
+        value=json.dumps(DEFAULT_BANNER_CONFIG, indent=2),
+        height=250,
+        help='List of {"id", "label", "condition"} objects; the same spec batch job files use. A banner with '
+             '"nest": [{"var": "hGender", "codes": [[1, "Male"], [2, "Female"]]}, {"var": "hAGE", "codes": [1, 2, 3]}] '
+             'gets a column for every combination of its levels\' codes'
+    )
+    try:
+        banner_config = load_banner_config(banner_text)
+    except ValueError as e:
+        banner_config = None
+        st.error(f"❌ {str(e)}")
     
-    if st.button("✨ Generate Tables", type="primary", disabled=not st.session_state.questions):
+    if st.button("✨ Generate Tables", type="primary", disabled=not (stored and banner_config)):
         if not all([data_file, study_name, client_name]):
             st.error("Please fill in all required configuration fields (*)")
             st.stop()
@@ -316,119 +606,42 @@ with tab3:
             st.stop()
 
         try:
-            with st.spinner("⏳ Generating tables..."):
-                # Load data
-                ext = os.path.splitext(data_file)[1].lower()
-                if ext == ".csv":
-                    data = pd.read_csv(data_file)
-                elif ext == ".xls":
-                    try:
-                        data = pd.read_excel(data_file, engine='xlrd')
-                    except ImportError:
-                        st.error("❌ xlrd package required for .xls files")
-                        st.info("Please run: pip install xlrd")
-                        st.stop()
-                elif ext == ".xlsx":
-                    try:
-                        data = pd.read_excel(data_file, engine='openpyxl')
-                    except ImportError:
-                        st.error("❌ openpyxl package required for .xlsx files")
-                        st.info("Please run: pip install openpyxl")
-                        st.stop()
-                elif ext == ".sav":
-                    try:
-                        data, _ = pyreadstat.read_sav(data_file)
-                    except Exception as e:
-                        st.error(f"❌ Failed to read SPSS file: {str(e)}")
-                        st.info("Try exporting your data to CSV/Excel and re-uploading")
-                        st.stop()
-                else:
-                    raise ValueError(f"Unsupported file format: {ext}")
-
-                # Process data
-                data = data.set_index(keys=["record","uuid"]).sort_index()
-                data = clean_blank_and_convert_to_numeric(data)
-
-                # Get current date
-                now = datetime.now()
-                month = now.strftime("%B")
-                year = now.year
-
-                # Generate tables
-                results = []
-                for i, question in enumerate(st.session_state.questions, start=1):
-                    tg = TabGenerator(
-                        client_name=client_name,
-                        study_name=study_name,
-                        month=month,
-                        year=year,
-                        first_data=data,
-                        question_var=question["question_var"],
-                        question_text=question["question_text"],
-                        base_text=question["base_text"],
-                        display_structure=question["display_structure"],
-                        question_type=question["question_type"],
-                        table_number=i,
-                        mean_var=question["mean_var"],
-                        filter_condition=question["base_filter"],
-                        show_sigma=question["show_sigma"]
-                    )
-                    
-                    cross_tab_df = tg.generate_crosstab(banner_config, tg.display_structure)
-                    
-                    # Prepare metadata rows
-                    metadata = pd.DataFrame([
-                        [""],
-                        ["#page"],
-                        [client_name],
-                        [study_name],
-                        [f"{month} {year}"],
-                        [f"Table {i}"],
-                        [question["question_text"]],
-                        [f"Base: {question['base_text']}"]
-                    ], columns=["Label"]).reindex(columns=cross_tab_df.columns, fill_value="")
-                    
-                    # Prepare banner rows
-                    banner_labels = [""] + [seg["label"] for seg in banner_config]
-                    banner_ids = [""] + [seg["id"] for seg in banner_config]
-                    
-                    # Combine all components
-                    full_table = pd.concat([
-                        metadata,
-                        pd.DataFrame([[""] * len(cross_tab_df.columns)], columns=cross_tab_df.columns),
-                        pd.DataFrame([banner_labels], columns=cross_tab_df.columns),
-                        pd.DataFrame([banner_ids], columns=cross_tab_df.columns),
-                        cross_tab_df
-                    ], ignore_index=True)
-                    
-                    results.append(full_table)
-
-                # Save output
-                today = datetime.today().strftime('%m%d%Y')
-                file_name = f"{study_name.replace(' ', '_')}_Output_Tables_{today}.csv"
-                
-                if results:
-                    final_df = pd.concat(results, ignore_index=True)
-                    final_df.to_csv(file_name, index=False, header=False)
-                    st.success(f"✅ Tables generated successfully! Saved to: {file_name}")
-                    
-                    # Provide download button
-                    with open(file_name, "rb") as f:
-                        st.download_button(
-                            label="⬇️ Download Tables",
-                            data=f,
-                            file_name=file_name,
-                            mime="text/csv"
-                        )
-                else:
-                    st.warning("No tables were generated")
+            rim_targets = parse_rim_targets(rim_targets_text) if weighting == "rim" else None
+            # The questions are snapshotted now, so edits made while the job waits do not leak into it
+            spec = validate_job({
+                "study_name": study_name,
+                "client_name": client_name,
+                "data_file": data_file,
+                "questions": store.all(),
+                "banners": banner_config,
+                "output_format": output_format,
+                "xlsx_layout": xlsx_layout,
+                "weight_var": weight_var if weighting == "variable" and weight_var else None,
+                "rim_targets": rim_targets,
+                "sig_level": sig_level if sig_testing else None,
+                "extra_stats": extra_stats or None,
+                "workers": int(workers),
+                "streaming": streaming,
+                "chunk_rows": int(chunk_rows),
+                "use_data_cache": use_data_cache,
+                "reuse_tables": reuse_tables,
+                "cube": save_cube or None,
+            }, base_dir=os.getcwd())
+            profiler = Profiler(memory=profile_memory, banners=profile_banners) if profile_run else None
+            job = job_registry.submit(spec, owner=st.session_state.job_owner, profiler=profiler)
+            st.toast(f"Job {job.id} queued: {job.label}")
+        except (WeightingError, JobError) as e:
+            st.error(f"❌ {str(e)}")
 
-        except Exception as e:
-            st.error(f"❌ Error generating tables: {str(e)}")
-            st.exception(e)
+    # Jobs keep running through reruns; refresh just this panel while any is unfinished
+    st.subheader("Generation Jobs")
+    show_all_jobs = st.checkbox("Show every job on this server", value=False)
+    polling = job_registry.active() > 0
+    st.fragment(run_every=1.0 if polling else None)(show_jobs)(
+        job_registry, None if show_all_jobs else st.session_state.job_owner, polling)
 
 # ----------------------
 # Current Questions Display
 # ----------------------
-with st.expander("📋 View Current Questions (JSON)"):
-    st.json(st.session_state.questions)
\ No newline at end of file
+with st.expander("📋 View Selected Question (JSON)"):
+    st.json(store.get(selected_id) if selected_id is not None else {})
\ No newline at end of file
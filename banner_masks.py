@@ -0,0 +1,163 @@
+# banner_masks.py
+import numpy as np
+import pandas as pd
+from crosstab_engine import BannerLayout, mask_matrix, pack_masks
+from expressions import ExpressionError, compile_expression, run_expressions, validate_expressions
+from profiling import NULL_PROFILER
+
+
+class BannerMaskCache:
+    """
+    Evaluate banner conditions and base filters once per run.
+
+    Every distinct expression is compiled once (see ``expressions``) and turned
+    into a boolean array aligned with the rows of the dataset the first time it
+    is requested. Subexpression results are shared across all expressions, so
+    ``vboost == 1`` is computed once however many banners use it, and
+    banner/filter combinations are memoized as well. The cells of a nested
+    banner are also encoded as one array of group keys per banner and filter.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._masks = {}
+        self._combined = {}
+        self._packed = {}
+        self._group_keys = {}
+        self._columns = {}
+        self._subexpressions = {}
+
+    def __len__(self):
+        return len(self._masks)
+
+    def mask(self, condition):
+        """Boolean row mask for a single condition (``None`` selects every row)."""
+        key = condition or None
+        if key not in self._masks:
+            if key is None:
+                self._masks[key] = np.ones(len(self.df), dtype=bool)
+            else:
+                result = np.asarray(compile_expression(key).evaluate(self._column, self._subexpressions), dtype=bool)
+                # a constant expression ("1 == 1") evaluates to a scalar
+                self._masks[key] = result if result.ndim else np.full(len(self.df), bool(result))
+        return self._masks[key]
+
+    def available_columns(self):
+        """Names expressions may refer to: data columns and respondent index levels."""
+        return set(self.df.columns) | {name for name in self.df.index.names if name is not None}
+
+    def _column(self, name):
+        """
+        One column as an array, with compact nullable numbers as float64.
+
+        Blanks then behave like NaN in comparisons (``!=`` is true, everything
+        else false) rather than propagating NA through the expression.
+        """
+        if name not in self._columns:
+            if name in self.df.columns:
+                series = self.df[name]
+                if pd.api.types.is_extension_array_dtype(series.dtype) and pd.api.types.is_numeric_dtype(series.dtype):
+                    self._columns[name] = series.to_numpy(dtype="float64", na_value=np.nan)
+                else:
+                    self._columns[name] = series.to_numpy()
+            elif name in self.df.index.names:
+                self._columns[name] = self.df.index.get_level_values(name).to_numpy()
+            else:
+                raise ExpressionError(f"Unknown column {name!r}")
+        return self._columns[name]
+
+    def combined(self, filter_condition, condition):
+        """Row mask for a banner condition restricted to a base filter."""
+        key = (filter_condition or None, condition or None)
+        if key not in self._combined:
+            if key[0] is None:
+                self._combined[key] = self.mask(key[1])
+            elif key[1] is None:
+                self._combined[key] = self.mask(key[0])
+            else:
+                self._combined[key] = self.mask(key[0]) & self.mask(key[1])
+        return self._combined[key]
+
+    def packed(self, filter_condition, condition):
+        """Bit-packed form of ``combined`` for popcount-based counting."""
+        key = (filter_condition or None, condition or None)
+        if key not in self._packed:
+            self._packed[key] = pack_masks(self.combined(*key))
+        return self._packed[key]
+
+    def group_keys(self, filter_condition, conditions):
+        """
+        Cell of every row among banner cells that never overlap, restricted to a base filter.
+
+        Row ``i`` holds the position in ``conditions`` of the cell it falls
+        in, or ``len(conditions)`` when it falls in none (or outside the
+        filter). Raises ValueError when two cells select the same row.
+        """
+        key = (filter_condition or None, tuple(conditions))
+        if key not in self._group_keys:
+            n_cells = len(conditions)
+            if key[0] is not None:
+                keys = np.where(self.mask(key[0]), self.group_keys(None, conditions), n_cells)
+            else:
+                keys = np.full(len(self.df), n_cells, dtype=np.intp)
+                for k, condition in enumerate(conditions):
+                    mask = self.mask(condition)
+                    if (keys[mask] != n_cells).any():
+                        raise ValueError(f"Cells of a nested banner overlap: {conditions[keys[mask].min()]!r} "
+                                         f"and {condition!r} select the same respondents")
+                    keys[mask] = k
+            self._group_keys[key] = keys
+        return self._group_keys[key]
+
+    def layout(self, filter_condition, banner_segments):
+        """
+        The ``BannerLayout`` of ``banner_segments`` restricted to a base filter.
+
+        Banners sharing a ``group`` (the cells of a nested banner, see
+        ``tab_runner.load_banner_config``) are counted from their group keys,
+        every other banner from its mask.
+        """
+        plain, groups = [], {}
+        for b, banner in enumerate(banner_segments):
+            if banner.get("group") is None:
+                plain.append(b)
+            else:
+                groups.setdefault(banner["group"], []).append(b)
+        masks = mask_matrix([self.combined(filter_condition, banner_segments[b].get("condition")) for b in plain])
+        if not plain:
+            masks = np.zeros((0, len(self.df)), dtype=bool)
+        keys = [(positions, self.group_keys(filter_condition, [banner_segments[b].get("condition")
+                                                               for b in positions]))
+                for positions in groups.values()]
+        return BannerLayout(len(self.df), plain, masks, keys)
+
+    def validate(self, banner_segments, questions=()):
+        """Check every banner condition and base filter compiles and only reads known columns."""
+        validate_expressions(run_expressions(banner_segments, questions), self.available_columns())
+        return self
+
+    def prime(self, banner_segments, questions=(), profiler=None):
+        """
+        Evaluate every banner condition and distinct base filter up front.
+
+        A ``profiler`` recording per-banner detail gets a span for each banner
+        condition and each base filter that was not evaluated yet.
+        """
+        profiler = profiler or NULL_PROFILER
+        if not profiler.banners:
+            with profiler.span("evaluate banners"):
+                for banner in banner_segments:
+                    self.mask(banner.get("condition"))
+                for question in questions:
+                    self.mask(question.get("base_filter"))
+            return self
+
+        for banner in banner_segments:
+            with profiler.span(f"Banner {banner['id']}", "banner", banner=banner["id"], label=banner.get("label"),
+                               condition=banner.get("condition")):
+                self.mask(banner.get("condition"))
+        for condition in dict.fromkeys(q["base_filter"] for q in questions if q.get("base_filter")):
+            if condition not in self._masks:
+                with profiler.span("Base filter", "banner", condition=condition):
+                    self.mask(condition)
+        return self
@@ -0,0 +1 @@
+"""Performance benchmarks and the synthetic survey generator they run on."""
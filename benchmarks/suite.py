@@ -0,0 +1,258 @@
+# benchmarks/suite.py
+"""
+Benchmark suite for the tab pipeline.
+
+Times ``generate_tables`` per question type and engine, the end-to-end
+generation loop (load, tabulate, write), data loading per file format and
+``parse_datamap_to_json`` on a synthetic survey, recording the best wall
+time and the peak traced memory of each. Results can be saved and later
+runs compared against them to catch slowdowns:
+
+    python -m benchmarks.suite --respondents 50000 --save baseline.json
+    python -m benchmarks.suite --respondents 50000 --compare baseline.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import DATA_FORMATS, add_survey_arguments, survey_options, write_survey
+from data_loader import load_data, referenced_columns
+from datamap_parser import parse_datamap_to_json
+from dataset import DatasetContext
+from tab_generator import TabGenerator
+from tab_runner import iter_tables, make_tab_generator
+from table_writer import open_table_writer
+
+RUN_INFO = {"client_name": "Benchmark", "study_name": "Synthetic", "month": "January", "year": 2000}
+
+
+def measure(fn, repeat=3):
+    """
+    Best wall time of ``repeat`` calls of ``fn`` and the peak memory of one more.
+
+    Memory is measured in a separate call under ``tracemalloc`` (which numpy
+    and pandas allocations report to), so tracing does not slow the timed
+    calls. Returns ``(seconds, peak_bytes)``.
+    """
+    times = []
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def question_kind(question):
+    """Benchmark group of a synthetic question: single, single+mean, multi or grid."""
+    if question["question_type"] in ("multi", "grid"):
+        return question["question_type"]
+    if str(question["question_var"]).startswith("G") and "_" in str(question["question_var"]):
+        return "grid"
+    return "single+mean" if question.get("mean_var") else "single"
+
+
+# ----------------------
+# Benchmarks
+# ----------------------
+def bench_crosstabs(data, questions, banner_config, engines, table_options, repeat):
+    """``generate_tables`` for every question of each kind, per engine (masks evaluated up front)."""
+    dataset = DatasetContext(data)
+    dataset.masks.prime(banner_config, questions)
+    groups = defaultdict(list)
+    for question in questions:
+        groups[question_kind(question)].append(question)
+
+    results = {}
+    for engine in engines:
+        options = {**table_options, "engine": engine}
+        for kind, group in groups.items():
+            generators = [make_tab_generator(dataset, q, q["id"], table_options=options, **RUN_INFO) for q in group]
+
+            def run():
+                for tg in generators:
+                    tg.generate_tables(banner_config, tg.display_structure)
+
+            seconds, peak = measure(run, repeat)
+            results[f"crosstab/{engine}/{kind}"] = {"seconds": seconds, "peak_bytes": peak,
+                                                    "per_question": seconds / len(group), "questions": len(group)}
+    return results
+
+
+def bench_end_to_end(data_file, questions, banner_config, table_options, workers, output_format, repeat):
+    """The app's generation loop: load the referenced columns, tabulate every question and write the file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, f"tables.{output_format}")
+
+        def run():
+            data, _ = load_data(data_file, columns=referenced_columns(questions, banner_config), use_cache=False)
+            tables = iter_tables(data, questions, banner_config, workers=workers, table_options=table_options,
+                                 **RUN_INFO)
+            with open_table_writer(output, output_format) as writer:
+                for full_table in tables:
+                    writer.write_table(full_table)
+
+        seconds, peak = measure(run, repeat)
+    return {f"end_to_end/{output_format}/workers={workers}": {"seconds": seconds, "peak_bytes": peak,
+                                                              "questions": len(questions)}}
+
+
+def bench_loading(paths, repeat):
+    """``load_data`` per file format without the Parquet cache, and the CSV again from a warm cache."""
+    results = {}
+    for ext in DATA_FORMATS:
+        if ext in paths:
+            seconds, peak = measure(lambda: load_data(paths[ext], use_cache=False), repeat)
+            results[f"load/{ext.lstrip('.')}"] = {"seconds": seconds, "peak_bytes": peak}
+    if ".csv" in paths:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            load_data(paths[".csv"], cache_dir=cache_dir)
+            seconds, peak = measure(lambda: load_data(paths[".csv"], cache_dir=cache_dir), repeat)
+        results["load/csv-cached"] = {"seconds": seconds, "peak_bytes": peak}
+    return results
+
+
+def bench_datamap(datamap_file, repeat):
+    seconds, peak = measure(lambda: parse_datamap_to_json(datamap_file), repeat)
+    return {"datamap/parse": {"seconds": seconds, "peak_bytes": peak}}
+
+
+def run_suite(directory, survey, engines=TabGenerator.ENGINES, formats=DATA_FORMATS, weighted=False, workers=1,
+              output_format="csv", repeat=3, only=None):
+    """
+    Write a synthetic survey to ``directory`` and run the benchmarks on it.
+
+    ``survey`` holds the ``make_survey`` options and ``only`` limits the run
+    to some of ``crosstab``, ``end_to_end``, ``load`` and ``datamap``.
+    Returns ``{benchmark name: {"seconds": ..., "peak_bytes": ..., ...}}``.
+    """
+    formats = [ext for ext in formats if ext != ".sav" or _has_module("pyreadstat")]
+    paths = write_survey(directory, formats=sorted(set(formats) | {".csv"}), **survey)
+    with open(paths["questions"], encoding="utf-8") as f:
+        questions = json.load(f)
+    with open(paths["banners"], encoding="utf-8") as f:
+        banner_config = json.load(f)
+    table_options = {"weight_var": "wt"} if weighted else {}
+    selected = set(only or ("crosstab", "end_to_end", "load", "datamap"))
+
+    results = {}
+    if "crosstab" in selected:
+        data, _ = load_data(paths[".csv"], use_cache=False)
+        results.update(bench_crosstabs(data, questions, banner_config, engines, table_options, repeat))
+        del data
+    if "end_to_end" in selected:
+        results.update(bench_end_to_end(paths[".csv"], questions, banner_config, table_options, workers,
+                                        output_format, repeat))
+    if "load" in selected:
+        results.update(bench_loading({ext: paths[ext] for ext in formats}, repeat))
+    if "datamap" in selected:
+        results.update(bench_datamap(paths["datamap"], repeat))
+    return results
+
+
+def _has_module(name):
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+# ----------------------
+# Reporting
+# ----------------------
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Benchmarks slower than ``baseline`` by more than ``tolerance`` (0.2 = 20%).
+
+    Returns ``[(name, baseline_seconds, seconds), ...]``; benchmarks missing
+    from either run are ignored.
+    """
+    slower = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before and result["seconds"] > before["seconds"] * (1 + tolerance):
+            slower.append((name, before["seconds"], result["seconds"]))
+    return slower
+
+
+def format_results(results, baseline=None):
+    lines = [f"{'benchmark':<36} {'seconds':>10} {'peak MB':>9}" + ("  vs baseline" if baseline else "")]
+    for name, result in results.items():
+        line = f"{name:<36} {result['seconds']:>10.4f} {result['peak_bytes'] / 2 ** 20:>9.1f}"
+        before = (baseline or {}).get(name)
+        if before:
+            line += f"  {result['seconds'] / before['seconds']:>6.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tab pipeline on a synthetic survey")
+    add_survey_arguments(parser)
+    parser.add_argument("--engines", nargs="+", default=list(TabGenerator.ENGINES), choices=TabGenerator.ENGINES)
+    parser.add_argument("--formats", nargs="+", default=list(DATA_FORMATS), choices=DATA_FORMATS,
+                        help="respondent file formats to time loading for")
+    parser.add_argument("--only", nargs="+", choices=["crosstab", "end_to_end", "load", "datamap"])
+    parser.add_argument("--weighted", action="store_true", help="weight every table by the synthetic weight")
+    parser.add_argument("--workers", type=int, default=1, help="process-pool workers for the end-to-end run")
+    parser.add_argument("--output-format", default="csv", choices=["csv", "xlsx"])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (the best is kept)")
+    parser.add_argument("--data-dir", help="where to write the synthetic survey (default: a temporary directory)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown versus --compare that counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    options = dict(engines=args.engines, formats=args.formats, weighted=args.weighted, workers=args.workers,
+                   output_format=args.output_format, repeat=args.repeat, only=args.only)
+    if args.data_dir:
+        results = run_suite(args.data_dir, survey_options(args), **options)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            results = run_suite(directory, survey_options(args), **options)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print(format_results(results, baseline))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "survey": survey_options(args),
+                       "options": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "results": results}, f, indent=2)
+    if baseline is not None:
+        slower = compare(results, baseline, args.tolerance)
+        for name, before, after in slower:
+            print(f"SLOWER: {name} {before:.4f}s -> {after:.4f}s ({after / before:.2f}x)", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
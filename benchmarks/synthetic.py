@@ -0,0 +1,231 @@
+# benchmarks/synthetic.py
+"""
+Synthetic survey generator for benchmarks.
+
+Produces a respondent file, the matching question configurations (in the
+``questions_master.json`` format), a banner configuration and a datamap
+workbook, at whatever size and shape a benchmark needs.
+
+    python -m benchmarks.synthetic out_dir --respondents 100000 --singles 40
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from tab_runner import nest_banner_cells
+
+# Banner variables every synthetic file carries
+BANNER_VARIABLES = {"hGender": 2, "hAGE": 3, "region": 4, "vboost": 2}
+DATA_FORMATS = (".csv", ".xlsx", ".sav")
+
+
+def _codes(rng, n, n_codes, blank_rate):
+    """Skewed answer codes 1..n_codes with ``blank_rate`` of them missing (NaN)."""
+    shares = rng.dirichlet(np.ones(n_codes) * 2)
+    values = rng.choice(np.arange(1, n_codes + 1), size=n, p=shares).astype(np.float64)
+    values[rng.random(n) < blank_rate] = np.nan
+    return values
+
+
+def _display_structure(n_codes, net=True):
+    structure = [["code", f"Code {code}", code] for code in range(1, n_codes + 1)]
+    if net and n_codes > 2:
+        structure.append(["net", f"Top {n_codes // 2} (NET)", list(range(n_codes - n_codes // 2 + 1, n_codes + 1))])
+    return structure
+
+
+def _question(question_var, question_text, display_structure, question_type, mean_var=None, base_filter=None):
+    return {
+        "question_var": question_var,
+        "question_text": question_text,
+        "base_text": "Total Respondents" if base_filter is None else "Filtered Respondents",
+        "display_structure": display_structure,
+        "base_filter": base_filter,
+        "question_type": question_type,
+        "mean_var": mean_var,
+        "show_sigma": True,
+    }
+
+
+def make_banners(n_banners=6, depth=2, rng=None, any_of=(), nested=False):
+    """
+    ``n_banners`` banner columns, the first being Total.
+
+    ``depth`` is how many conditions each banner combines with ``and``.
+    When ``any_of`` names multi-select items, every fifth banner selects
+    respondents who picked any of them, as net banners do. With ``nested``
+    the columns after Total are instead the cells of nested banners, each
+    crossing every code of ``depth`` banner variables, until there are at
+    least ``n_banners`` columns.
+    """
+    rng = rng or np.random.default_rng(0)
+    names = list(BANNER_VARIABLES)
+    banners = [{"id": "A", "label": "Total", "condition": None}]
+    if nested:
+        while len(banners) < n_banners:
+            picked = rng.choice(len(names), size=min(depth, len(names)), replace=False)
+            levels = [{"var": names[i], "codes": list(range(1, BANNER_VARIABLES[names[i]] + 1))} for i in picked]
+            banner_id = f"N{len(banners)}"
+            banners.extend(nest_banner_cells({"id": banner_id, "label": f"Nested {banner_id}", "nest": levels}))
+        return banners
+    for b in range(1, n_banners):
+        if b % 5 == 0 and any_of:
+            condition = " or ".join(f"{item} == 1" for item in any_of)
+        else:
+            picked = rng.choice(len(names), size=min(depth, len(names)), replace=False)
+            condition = " and ".join(f"{names[i]} == {rng.integers(1, BANNER_VARIABLES[names[i]] + 1)}"
+                                     for i in sorted(picked))
+        banner_id = chr(ord("A") + b) if b < 26 else f"A{b}"
+        banners.append({"id": banner_id, "label": f"Banner {banner_id}", "condition": condition})
+    return banners
+
+
+def make_survey(respondents=10_000, singles=20, multis=10, grids=5, grid_items=5, codes=5, multi_items=8,
+                banners=6, banner_depth=2, blank_rate=0.05, filtered_share=0.2, seed=0, grid_mode="items",
+                nested_banners=False):
+    """
+    Build a synthetic survey.
+
+    Returns ``(data, questions, banner_config, datamap)``: the raw respondent
+    DataFrame (with ``record``/``uuid`` columns, as files are read), the
+    question configs with ids, the banners and the datamap rows. Grids are
+    configured as the datamap importer's ``grid_mode`` would: one
+    single-select question per item ("items") or one grid question ("grid").
+    Every third single has a numeric mean
+    variable and ``filtered_share`` of the questions a base filter.
+    ``nested_banners`` builds the banners from nested banners (see
+    ``make_banners``).
+    """
+    rng = np.random.default_rng(seed)
+    n = respondents
+    columns = {"record": np.arange(1, n + 1), "uuid": [f"u{i:08d}" for i in range(n)]}
+    for name, n_codes in BANNER_VARIABLES.items():
+        columns[name] = _codes(rng, n, n_codes, 0.0)
+    columns["wt"] = np.round(rng.lognormal(0, 0.35, n), 4)
+    columns["S1"] = np.round(rng.normal(45, 15, n).clip(18, 90))
+
+    questions, datamap = [], []
+    for q in range(1, singles + 1):
+        var = f"Q{q}"
+        columns[var] = _codes(rng, n, codes, blank_rate)
+        mean_var = "S1" if q % 3 == 0 else None
+        base_filter = "hGender == 1" if rng.random() < filtered_share else None
+        questions.append(_question(var, f"{var}. Single-select question {q}", _display_structure(codes), "single",
+                                   mean_var, base_filter))
+        datamap.extend([var, var, "single", f"{var}. Single-select question {q}" if code == 1 else None, code,
+                        f"Code {code}"] for code in range(1, codes + 1))
+
+    for m in range(1, multis + 1):
+        items = [f"M{m}r{item}" for item in range(1, multi_items + 1)]
+        for item in items:
+            selected = (rng.random(n) < rng.uniform(0.1, 0.6)).astype(np.float64)
+            selected[rng.random(n) < blank_rate] = np.nan
+            columns[item] = selected
+        structure = [["code", f"Item {i}", item] for i, item in enumerate(items, start=1)]
+        structure.append(["net", f"Any M{m} (NET)", items])
+        base_filter = "vboost == 1" if rng.random() < filtered_share else None
+        questions.append(_question(items, f"M{m}. Multi-select question {m}", structure, "multi",
+                                   base_filter=base_filter))
+        datamap.extend([item, f"M{m}", "multi", f"Item {i}", None, None] for i, item in enumerate(items, start=1))
+
+    for g in range(1, grids + 1):
+        for item in range(1, grid_items + 1):
+            var = f"G{g}_{item}"
+            columns[var] = _codes(rng, n, codes, blank_rate)
+            if grid_mode == "items":
+                questions.append(_question(var, f"G{g}. Grid question {g} - Row {item}", _display_structure(codes),
+                                           "single"))
+            datamap.extend([var, f"G{g}", "grid", f"Row {item}", code, f"Code {code}"]
+                           for code in range(1, codes + 1))
+        if grid_mode == "grid":
+            question = _question([f"G{g}_{item}" for item in range(1, grid_items + 1)], f"G{g}. Grid question {g}",
+                                 _display_structure(codes), "grid")
+            question["item_labels"] = [f"Row {item}" for item in range(1, grid_items + 1)]
+            questions.append(question)
+
+    for question_id, question in enumerate(questions, start=1):
+        question["id"] = question_id
+    datamap = pd.DataFrame(datamap, columns=["Variable ID", "Question ID", "Type", "Question Label",
+                                             "Answer Code", "Answer Label"])
+    any_of = [f"M1r{item}" for item in range(1, min(multi_items, 3) + 1)] if multis else []
+    banner_config = make_banners(banners, banner_depth, rng, any_of, nested_banners)
+    return pd.DataFrame(columns), questions, banner_config, datamap
+
+
+def write_data(data, path):
+    """Write the respondent file in the format its extension names (.csv, .xlsx or .sav)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        data.to_csv(path, index=False)
+    elif ext == ".xlsx":
+        data.to_excel(path, index=False)
+    elif ext == ".sav":
+        import pyreadstat
+        pyreadstat.write_sav(data, path)
+    else:
+        raise ValueError(f"Unsupported file format: {ext}")
+    return path
+
+
+def write_survey(directory, formats=(".csv",), **options):
+    """
+    Write a synthetic survey to ``directory``.
+
+    Creates ``data<ext>`` for every format in ``formats``, plus
+    ``questions_master.json``, ``banners.json`` and ``datamap.xlsx``;
+    ``options`` are passed to ``make_survey``. Returns the written paths.
+    """
+    data, questions, banner_config, datamap = make_survey(**options)
+    os.makedirs(directory, exist_ok=True)
+    paths = {ext: write_data(data, os.path.join(directory, f"data{ext}")) for ext in formats}
+    paths["questions"] = os.path.join(directory, "questions_master.json")
+    with open(paths["questions"], "w", encoding="utf-8") as f:
+        json.dump(questions, f, indent=4)
+    paths["banners"] = os.path.join(directory, "banners.json")
+    with open(paths["banners"], "w", encoding="utf-8") as f:
+        json.dump(banner_config, f, indent=4)
+    paths["datamap"] = os.path.join(directory, "datamap.xlsx")
+    datamap.to_excel(paths["datamap"], sheet_name="Sheet1", index=False)
+    return paths
+
+
+def add_survey_arguments(parser):
+    """The ``make_survey`` options as command-line flags."""
+    parser.add_argument("--respondents", type=int, default=10_000)
+    parser.add_argument("--singles", type=int, default=20, help="single-select questions")
+    parser.add_argument("--multis", type=int, default=10, help="multi-select questions")
+    parser.add_argument("--grids", type=int, default=5, help="grid questions")
+    parser.add_argument("--grid-items", type=int, default=5)
+    parser.add_argument("--grid-mode", default="items", choices=["items", "grid"],
+                        help="configure grids as one single-select question per item or as grid questions")
+    parser.add_argument("--codes", type=int, default=5, help="answer codes per single/grid question")
+    parser.add_argument("--multi-items", type=int, default=8)
+    parser.add_argument("--banners", type=int, default=6, help="banner columns, Total included")
+    parser.add_argument("--banner-depth", type=int, default=2, help="conditions combined per banner")
+    parser.add_argument("--nested-banners", action="store_true",
+                        help="cross every code of --banner-depth variables per banner instead of single conditions")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def survey_options(args):
+    return {"respondents": args.respondents, "singles": args.singles, "multis": args.multis, "grids": args.grids,
+            "grid_items": args.grid_items, "codes": args.codes, "multi_items": args.multi_items,
+            "banners": args.banners, "banner_depth": args.banner_depth, "seed": args.seed,
+            "grid_mode": args.grid_mode, "nested_banners": args.nested_banners}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic survey for benchmarking")
+    parser.add_argument("directory")
+    parser.add_argument("--formats", nargs="+", default=[".csv"], choices=DATA_FORMATS)
+    add_survey_arguments(parser)
+    args = parser.parse_args(argv)
+    for name, path in write_survey(args.directory, formats=args.formats, **survey_options(args)).items():
+        print(f"{name:>10}  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+# crosstab_engine.py
+import numpy as np
+import pandas as pd
+
+from weighting import effective_base
+
+
+def is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def hashable_payloads(display_structure):
+    """True when every code and NET member can key a count slot (the vectorized engines need that)."""
+    for row_type, _, payload in display_structure:
+        if row_type == "code" and not is_hashable(payload):
+            return False
+        if row_type == "net" and isinstance(payload, list) and not all(is_hashable(p) for p in payload):
+            return False
+    return True
+
+
+def mask_matrix(masks):
+    """Stack per-banner boolean masks into a banners x respondents matrix."""
+    return np.vstack(masks) if masks else np.zeros((0, 0), dtype=bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+
+
+def numeric_answers(dtype, codes):
+    """True when answers of ``dtype`` can be matched to ``codes`` as float64 numbers (NaN for blanks)."""
+    return (bool(codes) and all(_is_number(code) for code in codes) and dtype is not None
+            and pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype))
+
+
+def _numeric_positions(numbers, codes):
+    """
+    ``factorize_codes`` for float64 answers, without hashing Python objects:
+    a lookup table indexed by the answer when the codes are a narrow range
+    of whole numbers (as survey codes are), else a binary search of the
+    sorted codes.
+    """
+    code_values = np.asarray(codes, dtype=np.float64)
+    lo, hi = code_values.min(), code_values.max()
+    if (code_values == np.floor(code_values)).all() and hi - lo <= 4096:
+        table = np.full(int(hi - lo) + 1, len(codes))
+        table[(code_values - lo).astype(np.intp)] = np.arange(len(codes))
+        # NaN (blank) answers fail every comparison, so they stay in the overflow slot
+        inside = (numbers >= lo) & (numbers <= hi)
+        offsets = np.where(inside, numbers - lo, 0.0)
+        whole = inside & (offsets == np.floor(offsets))
+        return np.where(whole, table[offsets.astype(np.intp)], len(codes))
+    order = np.argsort(code_values, kind="stable")
+    ordered = code_values[order]
+    found = np.searchsorted(ordered, numbers).clip(max=len(codes) - 1)
+    # NaN (blank) answers never equal a code
+    return np.where(ordered[found] == numbers, order[found], len(codes))
+
+
+def factorize_codes(values, codes):
+    """
+    Map every respondent's answer to the position of its code in ``codes``.
+
+    Answers that match none of the codes (including blanks) get ``len(codes)``,
+    an overflow slot that is counted but never reported.
+    """
+    codes = list(codes)
+    if numeric_answers(getattr(values, "dtype", None), codes):
+        if isinstance(values, pd.Series):
+            return _numeric_positions(values.to_numpy(dtype=np.float64, na_value=np.nan), codes)
+        return _numeric_positions(np.asarray(values, dtype=np.float64), codes)
+    index = pd.Index(codes, dtype=object)
+    positions = index.get_indexer(pd.Series(values, dtype=object))
+    positions[positions < 0] = len(codes)
+    return positions
+
+
+def code_counts(code_index, n_codes, masks, weights=None):
+    """
+    Count every code under every banner in a single bincount.
+
+    ``masks`` is a banners x respondents boolean matrix; the result is a
+    banners x (n_codes + 1) matrix whose last column is the overflow slot
+    from ``factorize_codes``. Counts are integers, or weighted float sums
+    when respondent ``weights`` are given. A respondents x items matrix of
+    code positions gives a banners x items x (n_codes + 1) cube instead.
+    """
+    n_banners = masks.shape[0]
+    width = n_codes + 1
+    banner_pos, respondent_pos = np.nonzero(masks)
+    if code_index.ndim == 1:
+        keys = banner_pos * width + code_index[respondent_pos]
+        counts = np.bincount(keys, weights=None if weights is None else weights[respondent_pos],
+                             minlength=n_banners * width)
+        return counts.reshape(n_banners, width)
+
+    n_items = code_index.shape[1]
+    keys = ((banner_pos[:, None] * n_items + np.arange(n_items)) * width + code_index[respondent_pos]).ravel()
+    counts = np.bincount(keys, weights=None if weights is None else np.repeat(weights[respondent_pos], n_items),
+                         minlength=n_banners * n_items * width)
+    return counts.reshape(n_banners, n_items, width)
+
+
+def group_code_counts(code_index, n_codes, keys, n_cells, weights=None):
+    """
+    ``code_counts`` for the cells of one banner group in a single bincount.
+
+    ``keys`` holds the cell each respondent falls in (``n_cells`` for none);
+    the result has one row per cell, like ``code_counts`` has per banner.
+    """
+    width = n_codes + 1
+    if code_index.ndim == 1:
+        counts = np.bincount(keys * width + code_index, weights=weights, minlength=(n_cells + 1) * width)
+        return counts.reshape(n_cells + 1, width)[:-1]
+
+    n_items = code_index.shape[1]
+    cells = ((keys[:, None] * n_items + np.arange(n_items)) * width + code_index).ravel()
+    counts = np.bincount(cells, weights=None if weights is None else np.repeat(weights, n_items),
+                         minlength=(n_cells + 1) * n_items * width)
+    return counts.reshape(n_cells + 1, n_items, width)[:-1]
+
+
+class BannerLayout:
+    """
+    The banner columns of one table, ready for counting.
+
+    Plain banners are counted from their boolean masks. The cells of a nested
+    or crossed banner never overlap, so each such group is held as one array
+    of group keys: the cell every respondent falls in, or the number of cells
+    for none. Counting a group is one bincount over the respondents however
+    many cells it has, instead of one pass per cell.
+    """
+
+    def __init__(self, n_respondents, plain, masks, groups=()):
+        self.n_respondents = n_respondents
+        # Banner positions counted from ``masks`` (one row each)
+        self.plain = list(plain)
+        self.masks = masks
+        # ``(banner positions, keys)`` of every group
+        self.groups = list(groups)
+        self.n_banners = len(self.plain) + sum(len(positions) for positions, _ in self.groups)
+
+    @classmethod
+    def from_masks(cls, masks):
+        return cls(masks.shape[1], range(masks.shape[0]), masks)
+
+    def sums(self, weights=None):
+        """Respondents in every banner, or the sum of their ``weights``."""
+        if not self.groups:
+            return self.masks.sum(axis=1) if weights is None else self.masks @ weights
+        sums = np.zeros(self.n_banners, dtype=np.int64 if weights is None else np.float64)
+        if self.plain:
+            sums[self.plain] = self.masks.sum(axis=1) if weights is None else self.masks @ weights
+        for positions, keys in self.groups:
+            sums[positions] = np.bincount(keys, weights=weights, minlength=len(positions) + 1)[:-1]
+        return sums
+
+    def code_counts(self, code_index, n_codes, weights=None):
+        """``code_counts`` for every banner: plain banners through their masks, each group in one bincount."""
+        if not self.groups:
+            return code_counts(code_index, n_codes, self.masks, weights)
+        counts = np.zeros((self.n_banners, *code_index.shape[1:], n_codes + 1),
+                          dtype=np.int64 if weights is None else np.float64)
+        if self.plain:
+            counts[self.plain] = code_counts(code_index, n_codes, self.masks, weights)
+        for positions, keys in self.groups:
+            counts[positions] = group_code_counts(code_index, n_codes, keys, len(positions), weights)
+        return counts
+
+    def weight_totals(self, weights):
+        """Per-banner weighted base and Kish effective base."""
+        totals = np.zeros(self.n_banners)
+        effective = np.zeros(self.n_banners)
+        for position, mask in zip(self.plain, self.masks):
+            totals[position] = weights[mask].sum()
+            effective[position] = effective_base(weights[mask])
+        for positions, keys in self.groups:
+            sums = np.bincount(keys, weights=weights, minlength=len(positions) + 1)[:-1]
+            squares = np.bincount(keys, weights=weights ** 2, minlength=len(positions) + 1)[:-1]
+            totals[positions] = sums
+            effective[positions] = np.divide(sums ** 2, squares, out=np.zeros_like(sums), where=squares > 0)
+        return totals.tolist(), effective.tolist()
+
+    def selection_sums(self, selected, weights):
+        """
+        Banners x columns summed ``weights`` of the respondents selected in
+        each row of ``selected`` (a columns x respondents boolean matrix).
+
+        Every column is one bincount per group and one over the plain banners'
+        mask positions, so no banners x respondents matrix of weights is built.
+        """
+        sums = np.zeros((self.n_banners, len(selected)))
+        if self.plain:
+            banner_pos, respondent_pos = np.nonzero(self.masks)
+        for k, hits in enumerate(selected):
+            hit_weights = np.where(hits, weights, 0.0)
+            if self.plain:
+                sums[self.plain, k] = np.bincount(banner_pos, weights=hit_weights[respondent_pos],
+                                                  minlength=len(self.plain))
+            for positions, keys in self.groups:
+                sums[positions, k] = np.bincount(keys, weights=hit_weights, minlength=len(positions) + 1)[:-1]
+        return sums
+
+
+class SingleSelectEngine:
+    """
+    Vectorized counting for ``single`` questions.
+
+    The question column is factorized once into code positions; code rows and
+    NETs for every banner are then read off one count matrix.
+    """
+
+    def __init__(self, display_structure):
+        self.display_structure = display_structure
+        codes = []
+        for row_type, _, payload in display_structure:
+            if row_type == "code":
+                codes.append(payload)
+            elif row_type == "net" and isinstance(payload, list):
+                codes.extend(payload)
+        # Equal codes (e.g. 1 and 1.0) share one slot, just like ``==``/``isin`` would
+        self.codes = list(dict.fromkeys(codes))
+        self.positions = {code: i for i, code in enumerate(self.codes)}
+
+    @staticmethod
+    def supports(question_var, display_structure):
+        return isinstance(question_var, str) and hashable_payloads(display_structure)
+
+    def row_counts(self, values, banners, weights=None):
+        """
+        Return ``(rows, code_total)`` for every banner of a ``BannerLayout``.
+
+        ``rows`` maps display-structure row position to a vector of per-banner
+        counts (rows the legacy loop ignores are left out); ``code_total`` is the
+        per-banner sum over ``code`` rows. With ``weights`` the counts are
+        weighted sums.
+        """
+        counts = banners.code_counts(factorize_codes(values, self.codes), len(self.codes), weights)
+        return self.rows_from_counts(counts)
+
+    def rows_from_counts(self, counts):
+        """``(rows, code_total)`` read off a count array whose last axis is the code slots."""
+        rows = {}
+        code_total = np.zeros(counts.shape[:-1], dtype=counts.dtype)
+        for pos, (row_type, _, payload) in enumerate(self.display_structure):
+            if row_type == "code":
+                rows[pos] = counts[..., self.positions[payload]]
+                code_total += rows[pos]
+            elif row_type == "net" and isinstance(payload, list):
+                rows[pos] = counts[..., self.net_slots(payload)].sum(axis=-1)
+        return rows, code_total
+
+    def net_slots(self, payload):
+        return sorted({self.positions[code] for code in payload})
+
+
+class GridEngine(SingleSelectEngine):
+    """
+    Vectorized counting for ``grid`` questions.
+
+    Every item of a grid is answered on the same scale, so the item columns
+    are stacked into one respondents x items matrix, factorized against the
+    scale once and counted with a single bincount into a banners x items x
+    codes cube; each item's table and the grid summary are read off it.
+    """
+
+    @staticmethod
+    def supports(question_var, display_structure):
+        return hashable_payloads(display_structure)
+
+    def code_index(self, frame, items):
+        """Respondents x items matrix of code positions (missing item columns are all overflow)."""
+        present = [item for item in items if item in frame.columns]
+        index = np.full((len(frame), len(items)), len(self.codes))
+        if present:
+            stacked = frame[present]
+            numeric = all(numeric_answers(dtype, self.codes) for dtype in stacked.dtypes)
+            stacked = stacked.to_numpy(dtype=np.float64, na_value=np.nan) if numeric else stacked.to_numpy(dtype=object)
+            positions = factorize_codes(stacked.ravel(), self.codes).reshape(stacked.shape)
+            index[:, [items.index(item) for item in present]] = positions
+        return index
+
+    def item_counts(self, frame, items, banners, weights=None):
+        """Banners x items x (codes + 1) counts of every code of every item under every banner of a ``BannerLayout``."""
+        return banners.code_counts(self.code_index(frame, items), len(self.codes), weights)
+
+
+# Bits set in every possible byte, for numpy builds without np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def pack_masks(masks):
+    """Pack a rows x respondents boolean matrix into rows x ceil(N/8) bytes."""
+    return np.packbits(np.asarray(masks, dtype=bool), axis=-1)
+
+
+def popcount(packed):
+    """Number of set bits along the last axis of a packed bitset array."""
+    if hasattr(np, "bitwise_count"):
+        bits = np.bitwise_count(packed)
+    else:
+        bits = _BYTE_POPCOUNT[packed]
+    return bits.sum(axis=-1, dtype=np.int64)
+
+
+def selected_bits(series, value=1):
+    """Boolean array of respondents whose answer equals ``value`` (blanks count as False)."""
+    return (series == value).to_numpy(dtype=bool, na_value=False)
+
+
+class MultiResponseEngine:
+    """
+    Bitset counting for ``multi`` questions.
+
+    Each item column is packed into a respondent bitset (bit set when the item
+    is selected), so item counts, respondent-level "any of" NETs and No Answer
+    for every banner come from AND + popcount against the packed banner masks.
+    """
+
+    def __init__(self, display_structure, answer_columns):
+        self.display_structure = display_structure
+        self.answer_columns = list(answer_columns)
+        items = [payload for row_type, _, payload in display_structure if row_type == "code"]
+        for row_type, _, payload in display_structure:
+            if row_type == "net" and isinstance(payload, list):
+                items.extend(payload)
+        items.extend(self.answer_columns)
+        self.items = list(dict.fromkeys(items))
+        self.positions = {item: i for i, item in enumerate(self.items)}
+
+    @staticmethod
+    def supports(display_structure, answer_columns):
+        return bool(answer_columns) and hashable_payloads(display_structure)
+
+    def selected(self, frame):
+        """Items x respondents boolean matrix of selections (missing columns stay empty)."""
+        selected = np.zeros((len(self.items), len(frame)), dtype=bool)
+        for i, item in enumerate(self.items):
+            if isinstance(item, str) and item in frame.columns:
+                selected[i] = selected_bits(frame[item])
+        return selected
+
+    def pack(self, frame):
+        """Pack the question into one respondent bitset per item."""
+        return pack_masks(self.selected(frame))
+
+    def row_counts(self, frame, packed_masks, bases):
+        """
+        Return ``(rows, code_total, no_answer)`` for every banner.
+
+        ``packed_masks`` holds the packed banner masks and ``bases`` their
+        respondent counts; see ``SingleSelectEngine.row_counts`` for ``rows``.
+        """
+        bits = self.pack(frame)
+        counts = popcount(bits[None, :, :] & packed_masks[:, None, :])
+        rows = {}
+        code_total = np.zeros(packed_masks.shape[0], dtype=np.int64)
+        for pos, (row_type, _, payload) in enumerate(self.display_structure):
+            if row_type == "code":
+                rows[pos] = counts[:, self.positions[payload]]
+                code_total += rows[pos]
+            elif row_type == "net" and isinstance(payload, list):
+                rows[pos] = self._any_count(bits, payload, packed_masks)
+        no_answer = bases - self._any_count(bits, self.answer_columns, packed_masks)
+        return rows, code_total, no_answer
+
+    def _any_count(self, bits, items, packed_masks):
+        """Respondents selecting at least one of ``items``, per banner."""
+        if not items:
+            return np.zeros(packed_masks.shape[0], dtype=np.int64)
+        any_bits = np.bitwise_or.reduce(bits[sorted({self.positions[i] for i in items})], axis=0)
+        return popcount(any_bits[None, :] & packed_masks)
+
+    def weighted_row_counts(self, frame, banners, weights, bases):
+        """
+        Weighted ``row_counts`` for every banner of a ``BannerLayout``.
+
+        Bitsets cannot carry weights, so every item, every NET's "any of" and
+        the answered respondents become one selection row, summed by weight
+        under every banner in one ``BannerLayout.selection_sums``; ``bases``
+        are the weighted banner bases.
+        """
+        selected = self.selected(frame)
+        nets = [payload for row_type, _, payload in self.display_structure
+                if row_type == "net" and isinstance(payload, list)]
+        any_rows = [self._any_selected(selected, items) for items in nets + [self.answer_columns]]
+        sums = banners.selection_sums(np.vstack([selected, *any_rows]), weights)
+        rows = {}
+        code_total = np.zeros(banners.n_banners, dtype=np.float64)
+        net_column = len(self.items)
+        for pos, (row_type, _, payload) in enumerate(self.display_structure):
+            if row_type == "code":
+                rows[pos] = sums[:, self.positions[payload]]
+                code_total += rows[pos]
+            elif row_type == "net" and isinstance(payload, list):
+                rows[pos] = sums[:, net_column]
+                net_column += 1
+        no_answer = bases - sums[:, -1]
+        return rows, code_total, no_answer
+
+    def _any_selected(self, selected, items):
+        """Respondents selecting at least one of ``items``."""
+        if not items:
+            return np.zeros(selected.shape[1], dtype=bool)
+        return selected[sorted({self.positions[i] for i in items})].any(axis=0)
@@ -0,0 +1,316 @@
+# data_loader.py
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from expressions import expression_columns
+from profiling import NULL_PROFILER
+from tab_generator import clean_survey_data
+
+try:
+    import pyarrow
+    import pyarrow.parquet  # Parquet engine for the on-disk cache
+except ImportError:
+    pyarrow = None
+
+CACHE_DIR = ".tab_cache"
+# Bump whenever loading/cleaning changes so stale cache files are ignored
+CACHE_VERSION = 2
+INDEX_COLUMNS = ["record", "uuid"]
+# Rows per chunk when a file is tabulated in streaming mode
+CHUNK_ROWS = 100_000
+
+
+class DataFileError(Exception):
+    """Raised when a respondent data file exists but cannot be read."""
+
+
+# ----------------------
+# Column dependencies
+# ----------------------
+def question_columns(question):
+    """Every column one question reads: variables, payloads, mean variable and base filter."""
+    columns = set()
+    question_var = question.get("question_var")
+    if isinstance(question_var, list):
+        columns.update(question_var)
+    elif question_var:
+        columns.add(question_var)
+    for row in question.get("display_structure") or []:
+        payload = row[2] if len(row) > 2 else None
+        if isinstance(payload, str):
+            columns.add(payload)
+        elif isinstance(payload, list):
+            columns.update(p for p in payload if isinstance(p, str))
+    if question.get("mean_var"):
+        columns.add(question["mean_var"])
+    columns.update(expression_columns(question.get("base_filter")))
+    return columns
+
+
+def referenced_columns(questions, banner_config):
+    """Columns a whole tab run needs, including the record/uuid index."""
+    columns = set(INDEX_COLUMNS)
+    for question in questions:
+        columns.update(question_columns(question))
+    for banner in banner_config:
+        columns.update(expression_columns(banner.get("condition")))
+    return columns
+
+
+# ----------------------
+# Reading and preparing
+# ----------------------
+def read_data_file(data_file, columns=None):
+    """
+    Read a CSV, Excel or SPSS respondent file into a raw DataFrame.
+
+    When ``columns`` is given only those columns are read from disk (names
+    the file does not contain are ignored).
+    """
+    usecols = None if columns is None else (lambda c: c in columns)
+    ext = os.path.splitext(data_file)[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(data_file, usecols=usecols)
+    if ext == ".xls":
+        try:
+            return pd.read_excel(data_file, engine='xlrd', usecols=usecols)
+        except ImportError as e:
+            raise ImportError("xlrd package required for .xls files", name="xlrd") from e
+    if ext == ".xlsx":
+        try:
+            return pd.read_excel(data_file, engine='openpyxl', usecols=usecols)
+        except ImportError as e:
+            raise ImportError("openpyxl package required for .xlsx files", name="openpyxl") from e
+    if ext == ".sav":
+        import pyreadstat
+        try:
+            if columns is None:
+                data, _ = pyreadstat.read_sav(data_file)
+            else:
+                _, meta = pyreadstat.read_sav(data_file, metadataonly=True)
+                wanted = [c for c in meta.column_names if c in columns]
+                data, _ = pyreadstat.read_sav(data_file, usecols=wanted)
+        except Exception as e:
+            raise DataFileError(f"Failed to read SPSS file: {str(e)}") from e
+        return data
+    raise ValueError(f"Unsupported file format: {ext}")
+
+
+def read_data_chunks(data_file, columns=None, chunksize=CHUNK_ROWS):
+    """
+    Yield a CSV or SPSS respondent file as raw DataFrames of at most ``chunksize`` rows.
+
+    Only one chunk is held in memory at a time; ``columns`` works as in
+    ``read_data_file``. Excel workbooks cannot be read incrementally.
+    """
+    usecols = None if columns is None else (lambda c: c in columns)
+    ext = os.path.splitext(data_file)[1].lower()
+    if ext == ".csv":
+        with pd.read_csv(data_file, usecols=usecols, chunksize=chunksize) as reader:
+            yield from reader
+    elif ext == ".sav":
+        import pyreadstat
+        try:
+            wanted = None
+            if columns is not None:
+                _, meta = pyreadstat.read_sav(data_file, metadataonly=True)
+                wanted = [c for c in meta.column_names if c in columns]
+            chunks = pyreadstat.read_file_in_chunks(pyreadstat.read_sav, data_file, chunksize=chunksize,
+                                                    usecols=wanted)
+            for chunk, _ in chunks:
+                yield chunk
+        except Exception as e:
+            raise DataFileError(f"Failed to read SPSS file: {str(e)}") from e
+    else:
+        raise ValueError(f"Streaming mode supports CSV and SPSS files, not {ext}")
+
+
+def prepare_data(data):
+    """
+    Index respondents by record/uuid and clean blanks into compact numeric columns.
+
+    Returns ``(data, report)``; see ``clean_survey_data`` for the report.
+    """
+    data = data.set_index(keys=INDEX_COLUMNS).sort_index()
+    return clean_survey_data(data)
+
+
+def iter_prepared_chunks(data_file, columns=None, chunksize=CHUNK_ROWS, profiler=None):
+    """Yield ``(chunk, report)`` for each chunk of ``data_file``, cleaned like ``prepare_data``."""
+    profiler = profiler or NULL_PROFILER
+    chunks = read_data_chunks(data_file, columns, chunksize)
+    while True:
+        with profiler.span("read chunk"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        with profiler.span("clean chunk"):
+            prepared = prepare_data(chunk)
+        yield prepared
+
+
+def combine_cleaning_reports(reports):
+    """Fold per-chunk cleaning reports into one report for the whole file."""
+    reports = list(reports)
+    if not reports:
+        return pd.DataFrame(columns=["dtype_before", "dtype_after", "blanks", "coerced_to_na", "text_only"])
+    combined = pd.concat(reports).groupby(level=0, sort=False).agg(
+        {"dtype_before": "first", "dtype_after": "last", "blanks": "sum", "coerced_to_na": "sum", "text_only": "all"})
+    combined.index.name = "column"
+    return combined
+
+
+# (path, size, mtime) -> content digest, so Streamlit reruns skip re-hashing unchanged files
+_digest_memo = {}
+
+
+def _content_digest(path, size, mtime_ns):
+    key = (path, size, mtime_ns)
+    if key not in _digest_memo:
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _digest_memo[key] = digest.hexdigest()
+    return _digest_memo[key]
+
+
+def file_fingerprint(data_file):
+    """Identify a data file by path, size, modification time and content hash."""
+    path = os.path.abspath(data_file)
+    stat = os.stat(path)
+    return {
+        "path": path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "content": _content_digest(path, stat.st_size, stat.st_mtime_ns),
+        "version": CACHE_VERSION,
+    }
+
+
+def _digest(value, size):
+    return hashlib.blake2b(json.dumps(value, sort_keys=True).encode("utf-8"), digest_size=size).hexdigest()
+
+
+def _find_cached(cache_dir, prefix, columns):
+    """Cached projection of this exact file that holds every requested column, as (parquet, meta)."""
+    if not os.path.isdir(cache_dir):
+        return None, None
+    for name in sorted(os.listdir(cache_dir)):
+        if not (name.startswith(prefix) and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(cache_dir, name), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            cached_columns = meta["columns"]
+        except (OSError, ValueError, KeyError):
+            continue
+        if cached_columns is None or (columns is not None and columns <= set(cached_columns)):
+            return os.path.join(cache_dir, name[:-len(".json")] + ".parquet"), meta
+    return None, None
+
+
+def _remove_stale(cache_dir, path_key, keep_prefix):
+    """Drop cache entries for earlier versions of the same source file."""
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{path_key}-") and not name.startswith(keep_prefix):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                # Removed by another run loading the same file
+                pass
+
+
+def _write_atomically(directory, path, write):
+    """
+    Call ``write`` on a uniquely named temp file in ``directory``, then move it to ``path``.
+
+    Runs in several threads or processes may write the same entry at once;
+    each gets its own temp file, so a reader never sees a half-written one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_json(value):
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+    return write
+
+
+def _read_and_prepare(data_file, columns, profiler):
+    with profiler.span("read file", file=os.path.basename(data_file)):
+        data = read_data_file(data_file, columns)
+    with profiler.span("clean data", rows=len(data), columns=len(data.columns)):
+        return prepare_data(data)
+
+
+def load_data(data_file, columns=None, cache_dir=CACHE_DIR, use_cache=True, profiler=None):
+    """
+    Load a respondent file as a cleaned, record/uuid-indexed DataFrame.
+
+    Returns ``(data, report)`` where ``report`` is the per-column cleaning
+    report from ``clean_survey_data``. ``columns`` (see ``referenced_columns``)
+    limits reading and cleaning to the variables a tab run actually uses;
+    ``None`` loads everything.
+
+    The prepared frame is kept as Parquet under ``cache_dir`` keyed by the
+    file fingerprint, so later runs skip parsing and cleaning entirely. A
+    cached projection is reused whenever it covers the requested columns.
+    Any change to the source file produces a new key and the old entries are
+    removed. Caching is skipped when pyarrow is not installed. A
+    ``profiler`` (see ``profiling``) times reading, cleaning and the cache.
+    """
+    profiler = profiler or NULL_PROFILER
+    columns = None if columns is None else set(columns)
+    if not (use_cache and pyarrow is not None):
+        return _read_and_prepare(data_file, columns, profiler)
+
+    with profiler.span("fingerprint file"):
+        fingerprint = file_fingerprint(data_file)
+    path_key = _digest(fingerprint["path"], 6)
+    prefix = f"{path_key}-{_digest(fingerprint, 10)}-"
+
+    cache_file, meta = _find_cached(cache_dir, prefix, columns)
+    if cache_file is not None:
+        try:
+            with profiler.span("read cache"):
+                if columns is None:
+                    data = pd.read_parquet(cache_file)
+                else:
+                    stored = pyarrow.parquet.read_schema(cache_file).names
+                    data = pd.read_parquet(cache_file, columns=[c for c in stored
+                                                                if c in columns and c not in INDEX_COLUMNS])
+            report = pd.DataFrame(meta["cleaning_report"]).set_index("column")
+            return data, report.loc[report.index.intersection(data.columns, sort=False)]
+        except Exception:
+            pass
+
+    data, report = _read_and_prepare(data_file, columns, profiler)
+    requested = None if columns is None else sorted(columns)
+    cache_file = os.path.join(cache_dir, f"{prefix}{_digest(requested, 6)}.parquet")
+    try:
+        with profiler.span("write cache"):
+            os.makedirs(cache_dir, exist_ok=True)
+            _write_atomically(cache_dir, cache_file, data.to_parquet)
+            _write_atomically(cache_dir, cache_file[:-len(".parquet")] + ".json",
+                              _write_json({"source": fingerprint, "columns": requested,
+                                           "cleaning_report": report.reset_index().to_dict("records")}))
+    except Exception:
+        # Columns Parquet cannot represent (e.g. mixed-type text) just mean no cache
+        return data, report
+
+    _remove_stale(cache_dir, path_key, prefix)
+    return data, report
@@ -1,127 +1,234 @@
 # datamap_parser.py
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+from pandas.io.parsers import TextParser
 
-def parse_datamap_to_json(datamap_file):
+DATAMAP_COLUMNS = ["Question ID", "Type", "Question Label", "Answer Code", "Answer Label", "Variable ID"]
+
+SYSTEM_VARIABLES = ['responseid', 'respid', 'hDummyDP', 'status',
+                    'interview_start', 'interview_end', 'lengthOfIntv']
+
+# "items": one single-select question per grid item; "grid": one grid question (summary plus item tables)
+GRID_MODES = ("items", "grid")
+
+
+# ----------------------
+# Reading
+# ----------------------
+def _cell_value(cell):
+    """A cell as ``pd.read_excel`` sees it: blanks are "", errors NaN and whole numbers int."""
+    if cell.value is None:
+        return ""
+    if cell.data_type == "e":
+        return np.nan
+    if cell.data_type == "n":
+        return int(cell.value) if int(cell.value) == cell.value else float(cell.value)
+    return cell.value
+
+
+def read_datamap(datamap_file, sheet_name="Sheet1"):
+    """
+    The datamap columns of one worksheet as a DataFrame.
+
+    The workbook is streamed in read-only mode and only the columns the
+    parser uses are kept, so wide datamaps with many thousand rows never sit
+    in memory as a whole. Values are typed exactly as ``pd.read_excel``
+    would type them. ``sheet_name=None`` reads the first worksheet.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ImportError("openpyxl package required to read datamaps", name="openpyxl") from e
+
+    wb = load_workbook(datamap_file, read_only=True, data_only=True, keep_links=False)
+    try:
+        if sheet_name is None:
+            ws = wb.worksheets[0]
+        elif sheet_name in wb.sheetnames:
+            ws = wb[sheet_name]
+        else:
+            raise ValueError(f"Worksheet named {sheet_name!r} not found (sheets: {', '.join(wb.sheetnames)})")
+        ws.reset_dimensions()
+        rows = ws.iter_rows()
+        header = [_cell_value(cell) for cell in next(rows, ())]
+        positions = [header.index(name) for name in DATAMAP_COLUMNS if name in header]
+        data = [[header[p] for p in positions]]
+        for row in rows:
+            width = len(row)
+            data.append([_cell_value(row[p]) if p < width else "" for p in positions])
+    finally:
+        wb.close()
+    if "Question ID" not in data[0]:
+        raise ValueError("Datamap has no 'Question ID' column")
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+# ----------------------
+# Building question configs
+# ----------------------
+def _code(value):
+    return int(value) if str(value).isdigit() else value
+
+
+class _Columns(dict):
+    """Datamap columns as arrays of Python objects (NaN for blanks), as ``iterrows`` hands them out."""
+
+    def __init__(self, df):
+        super().__init__((name, df[name].astype(object).to_numpy()) for name in df.columns)
+
+    def __missing__(self, name):
+        raise ValueError(f"Datamap has no {name!r} column")
+
+
+def _question(question_var, question_text, display_structure, question_type):
+    return {
+        "id": None,
+        "question_var": question_var,
+        "question_text": question_text,
+        "base_text": "Total Respondents",
+        "display_structure": display_structure,
+        "base_filter": None,
+        "question_type": question_type,
+        "mean_var": None,
+        "show_sigma": True
+    }
+
+
+def _single(question_id, rows, columns, label):
+    codes = columns['Answer Code'][rows]
+    answers = columns['Answer Label'][rows]
+    keep = pd.notna(codes)
+    display_structure = [["code", text, _code(code)] for text, code in zip(answers[keep], codes[keep])]
+    return [_question(question_id, label, display_structure, "single")]
+
+
+def _multi(question_id, rows, columns, label):
+    multi_vars = [f"{question_id}_{i + 1}" for i in range(len(rows))]
+    labels = columns['Question Label'][rows]
+    display_structure = [["code", text if pd.notna(text) else f"Option {i + 1}", var]
+                         for i, (text, var) in enumerate(zip(labels, multi_vars))]
+    if len(multi_vars) > 1:
+        display_structure.insert(0, ["net", f"Any {question_id} (NET)", multi_vars])
+    return [_question(multi_vars, label, display_structure, "multi")]
+
+
+def _grid_items(question_id, rows):
+    """
+    The item rows of a grid (``<question>_<item>`` variables) as ``(on_item, [(item, members), ...])``.
+
+    ``on_item`` selects the grid's rows that belong to an item; ``members``
+    are positions among those rows, items in order of appearance.
+    """
+    variables = pd.Series(rows, dtype=object)
+    if variables.isna().any():
+        raise ValueError(f"Grid question {question_id!r} has rows without a Variable ID")
+    parts = variables.str.split("_")
+    if (parts.str.len() > 2).any():
+        raise ValueError(f"Grid question {question_id!r} has Variable IDs with more than one '_'")
+    on_item = (parts.str.len() == 2).to_numpy()
+    items = parts[on_item].str[1].to_numpy()
+
+    item_codes, item_names = pd.factorize(items)
+    order = np.argsort(item_codes, kind="stable")
+    starts = np.searchsorted(item_codes[order], np.arange(len(item_names) + 1))
+    return on_item, [(item_num, order[starts[k]:starts[k + 1]]) for k, item_num in enumerate(item_names)]
+
+
+def _grid(question_id, rows, columns, first_label):
+    """One single-select question per grid item (``<question>_<item>`` variables), in order of appearance."""
+    on_item, items = _grid_items(question_id, columns['Variable ID'][rows])
+    labels = columns['Question Label'][rows][on_item]
+    codes = columns['Answer Code'][rows][on_item]
+
+    questions = []
+    for item_num, members in items:
+        display_structure = [["code", text, _code(code)] for text, code in zip(labels[members], codes[members])]
+        question_text = (f"{first_label} - {labels[members[0]]}" if pd.notna(first_label)
+                         else f"{question_id}_{item_num}")
+        questions.append(_question(f"{question_id}_{item_num}", question_text, display_structure, "single"))
+    return questions
+
+
+def _grid_question(question_id, rows, columns, first_label):
+    """
+    One ``grid`` question over all items of a grid.
+
+    The scale is every answer code of the items in order of appearance
+    (labelled from Answer Label, else Question Label). Scales of four or more
+    numeric codes get Top 2 Box and Bottom 2 Box NETs, which the grid summary
+    reports next to the mean.
+    """
+    on_item, items = _grid_items(question_id, columns['Variable ID'][rows])
+    labels = columns['Question Label'][rows][on_item]
+    answers = columns['Answer Label'][rows][on_item]
+    codes = columns['Answer Code'][rows][on_item]
+
+    scale = {}
+    for text, answer, code in zip(labels, answers, codes):
+        if pd.notna(code):
+            scale.setdefault(_code(code), answer if pd.notna(answer) else text)
+    display_structure = [["code", text, code] for code, text in scale.items()]
+    numeric = sorted(code for code in scale if isinstance(code, (int, float)))
+    if len(numeric) >= 4:
+        display_structure.append(["net", "Top 2 Box", numeric[-2:]])
+        display_structure.append(["net", "Bottom 2 Box", numeric[:2]])
+
+    question = _question([f"{question_id}_{item_num}" for item_num, _ in items],
+                         first_label if pd.notna(first_label) else question_id, display_structure, "grid")
+    question["item_labels"] = [labels[members[0]] if pd.notna(labels[members[0]]) else f"{question_id}_{item_num}"
+                               for item_num, members in items]
+    return [question]
+
+
+_BUILDERS = {"single": _single, "multi": _multi}
+
+
+def parse_datamap_to_json(datamap_file, sheet_name="Sheet1", grid_mode="items"):
     """
     Parse a survey datamap Excel file and generate question configurations in JSON format.
-    
+
     Args:
         datamap_file: Path to Excel file or file-like object
-        
+        sheet_name: Worksheet holding the datamap (None for the first sheet)
+        grid_mode: "items" for one single-select question per grid item, "grid"
+            for one grid question per grid (a summary table plus the item tables)
+
     Returns:
         List of question configurations in JSON-compatible format
     """
-    # Read the Excel file
-    df = pd.read_excel(datamap_file, sheet_name='Sheet1')
-    
+    if grid_mode not in GRID_MODES:
+        raise ValueError(f"Unknown grid mode: {grid_mode!r} (expected one of {', '.join(GRID_MODES)})")
+    df = read_datamap(datamap_file, sheet_name=sheet_name)
+
     # Clean the data - remove empty rows if any
-    df = df.dropna(subset=['Question ID'])
-    
+    df = df.dropna(subset=['Question ID']).reset_index(drop=True)
+    if df.empty:
+        return []
+
+    # Group rows by Question ID (sorted, as groupby does) with one stable sort
+    columns = _Columns(df)
+    group_codes, question_ids = pd.factorize(columns['Question ID'], sort=True)
+    order = np.argsort(group_codes, kind="stable")
+    starts = np.searchsorted(group_codes[order], np.arange(len(question_ids) + 1))
+    types = columns['Type']
+    question_labels = columns['Question Label']
+
     questions = []
-    question_counter = 1
-    
-    # Group by Question ID to handle multi-part questions
-    grouped = df.groupby('Question ID')
-    
-    for question_id, group in grouped:
+    for k, question_id in enumerate(question_ids):
         # Skip system variables
-        if question_id in ['responseid', 'respid', 'hDummyDP', 'status', 
-                         'interview_start', 'interview_end', 'lengthOfIntv']:
+        if question_id in SYSTEM_VARIABLES:
             continue
-            
-        first_row = group.iloc[0]
-        question_type = first_row['Type']
-        
-        if question_type == 'single':
-            # Single-select question
-            display_structure = []
-            for _, row in group.iterrows():
-                if pd.notna(row['Answer Code']):
-                    display_structure.append([
-                        "code",
-                        row['Answer Label'],
-                        int(row['Answer Code']) if str(row['Answer Code']).isdigit() else row['Answer Code']
-                    ])
-            
-            questions.append({
-                "id": question_counter,
-                "question_var": question_id,
-                "question_text": first_row['Question Label'] if pd.notna(first_row['Question Label']) else question_id,
-                "base_text": "Total Respondents",
-                "display_structure": display_structure,
-                "base_filter": None,
-                "question_type": "single",
-                "mean_var": None,
-                "show_sigma": True
-            })
-            question_counter += 1
-            
-        elif question_type == 'multi':
-            # Multi-select question
-            multi_vars = [f"{question_id}_{i+1}" for i in range(len(group))]
-            
-            display_structure = []
-            for i, (_, row) in enumerate(group.iterrows()):
-                display_structure.append([
-                    "code",
-                    row['Question Label'] if pd.notna(row['Question Label']) else f"Option {i+1}",
-                    f"{question_id}_{i+1}"
-                ])
-            
-            if len(multi_vars) > 1:
-                display_structure.insert(0, [
-                    "net",
-                    f"Any {question_id} (NET)",
-                    multi_vars
-                ])
-            
-            questions.append({
-                "id": question_counter,
-                "question_var": multi_vars,
-                "question_text": first_row['Question Label'] if pd.notna(first_row['Question Label']) else question_id,
-                "base_text": "Total Respondents",
-                "display_structure": display_structure,
-                "base_filter": None,
-                "question_type": "multi",
-                "mean_var": None,
-                "show_sigma": True
-            })
-            question_counter += 1
-            
-        elif question_type == 'grid':
-            # Grid question
-            grid_options = defaultdict(list)
-            
-            for _, row in group.iterrows():
-                var_id = row['Variable ID']
-                if "_" in var_id:
-                    base_var, item_num = var_id.split("_")
-                    grid_options[item_num].append({
-                        "label": row['Question Label'],
-                        "code": row['Answer Code']
-                    })
-            
-            for item_num, options in grid_options.items():
-                display_structure = []
-                for opt in options:
-                    display_structure.append([
-                        "code",
-                        opt['label'],
-                        int(opt['code']) if str(opt['code']).isdigit() else opt['code']
-                    ])
-                
-                questions.append({
-                    "id": question_counter,
-                    "question_var": f"{question_id}_{item_num}",
-                    "question_text": f"{first_row['Question Label']} - {options[0]['label']}" if pd.notna(first_row['Question Label']) else f"{question_id}_{item_num}",
-                    "base_text": "Total Respondents",
-                    "display_structure": display_structure,
-                    "base_filter": None,
-                    "question_type": "single",
-                    "mean_var": None,
-                    "show_sigma": True
-                })
-                question_counter += 1
-    
-    return questions
\ No newline at end of file
+        rows = order[starts[k]:starts[k + 1]]
+        first_label = question_labels[rows[0]]
+        question_type = types[rows[0]]
+
+        if question_type == 'grid':
+            build = _grid_question if grid_mode == "grid" else _grid
+            questions.extend(build(question_id, rows, columns, first_label))
+        elif question_type in _BUILDERS:
+            label = first_label if pd.notna(first_label) else question_id
+            questions.extend(_BUILDERS[question_type](question_id, rows, columns, label))
+
+    for question_counter, question in enumerate(questions, start=1):
+        question["id"] = question_counter
+    return questions
@@ -0,0 +1,68 @@
+# dataset.py
+import hashlib
+
+import pandas as pd
+
+from banner_masks import BannerMaskCache
+
+
+class DatasetContext:
+    """
+    Read-only handle on the cleaned respondent data for one generation run.
+
+    Many TabGenerator instances can reference the same context: the frame is
+    never copied, banner masks are shared through a single BannerMaskCache, and
+    each table only pulls out the columns it actually reads.
+    """
+
+    def __init__(self, df, mask_cache=None):
+        self.df = df
+        self.masks = mask_cache if mask_cache is not None else BannerMaskCache(df)
+        self._fingerprints = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def columns(self):
+        return self.df.columns
+
+    def has_column(self, name):
+        return isinstance(name, str) and name in self.df.columns
+
+    def column(self, name):
+        """Return one column as a Series (raises KeyError if it is missing)."""
+        return self.df[name]
+
+    def frame(self, columns):
+        """Return only the requested columns that exist in the dataset, in order."""
+        wanted = list(dict.fromkeys(c for c in columns if self.has_column(c)))
+        return self.df[wanted]
+
+    def _column_hash(self, name):
+        if name not in self._fingerprints:
+            if name is None:
+                values = self.df.index.to_frame(index=False)
+            elif self.has_column(name):
+                values = self.df[name].to_frame()
+            else:
+                self._fingerprints[name] = "missing"
+                return self._fingerprints[name]
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+            digest.update(str(values.dtypes.tolist()).encode("utf-8"))
+            self._fingerprints[name] = digest.hexdigest()
+        return self._fingerprints[name]
+
+    def fingerprint(self, columns):
+        """
+        Content hash of the given columns plus the respondent index.
+
+        Columns the dataset does not contain hash as missing. Per-column hashes
+        are memoized, so fingerprinting many tables costs one pass per column.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self._column_hash(None).encode("utf-8"))
+        for name in sorted(str(c) for c in set(columns)):
+            digest.update(f";{name}={self._column_hash(name)}".encode("utf-8"))
+        return digest.hexdigest()
@@ -0,0 +1,356 @@
+# expressions.py
+import ast
+import io
+import operator
+import re
+import tokenize
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+class ExpressionError(ValueError):
+    """Raised when a banner condition or base filter cannot be parsed or refers to unknown columns."""
+
+
+# ----------------------
+# Parsing
+# ----------------------
+# `S6r1..S6r9` expands to S6r1, S6r2, ..., S6r9 (zero padding is kept: Q01..Q12)
+_RANGE = re.compile(r"\b([A-Za-z_]\w*?)(\d+)\s*\.\.\s*([A-Za-z_]\w*?)(\d+)\b")
+_BACKTICK = re.compile(r"`([^`]+)`")
+
+_COMPARE = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt,
+    ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+}
+# Used to put constants on the right: ``1 == x`` is stored as ``x == 1``
+_FLIPPED = {ast.Eq: ast.Eq, ast.NotEq: ast.NotEq, ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE}
+_ARITHMETIC = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+_REDUCERS = {
+    "any": lambda m: m.any(axis=0),
+    "all": lambda m: m.all(axis=0),
+    "count": lambda m: m.sum(axis=0),
+}
+# Series methods with a node of their own; any other public Series method
+# (``a.str.startswith("x")``, ``a.abs()``) is called on the column as a Series
+_MISSING_METHODS = {"isna": False, "isnull": False, "notna": True, "notnull": True}
+_BETWEEN = {"both": (ast.GtE, ast.LtE), "neither": (ast.Gt, ast.Lt), "left": (ast.GtE, ast.Lt),
+            "right": (ast.Gt, ast.LtE)}
+
+
+def _expand_range(match):
+    prefix, start, end_prefix, end = match.groups()
+    if prefix != end_prefix or int(start) > int(end):
+        raise ExpressionError(f"Invalid column range {match.group(0)!r}")
+    width = len(start) if start.startswith("0") else 0
+    names = ", ".join(repr(f"{prefix}{i:0{width}d}") for i in range(int(start), int(end) + 1))
+    return f"__range__({names})"
+
+
+def _python_source(expression):
+    """
+    Rewrite ``query`` syntax into Python: backtick names become placeholders,
+    column ranges become ``__range__`` calls and ``&``/``|`` become
+    ``and``/``or`` (binding looser than comparisons, as in ``DataFrame.query``).
+    """
+    quoted = {}
+
+    def placeholder(match):
+        name = f"__quoted{len(quoted)}__"
+        quoted[name] = match.group(1)
+        return name
+
+    source = _RANGE.sub(_expand_range, _BACKTICK.sub(placeholder, expression))
+    tokens = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+            if tok.type == tokenize.OP and tok.string in ("&", "|"):
+                tok = tok._replace(string=" and " if tok.string == "&" else " or ")
+            tokens.append((tok.type, tok.string))
+    except (tokenize.TokenError, IndentationError, SyntaxError) as e:
+        raise ExpressionError(f"Cannot parse expression {expression!r}: {e}") from e
+    return tokenize.untokenize(tokens), quoted
+
+
+class _Compiler:
+    """
+    Turn a Python AST into nested tuples. Equal subexpressions become equal
+    tuples, so the tuples double as keys for sharing results between
+    expressions; ``and``/``or`` operands are flattened and sorted so that
+    ``a and b`` and ``b and a`` are recognised as the same mask.
+    """
+
+    def __init__(self, expression, quoted):
+        self.expression = expression
+        self.quoted = quoted
+        self.columns = set()
+        self.reducing = 0
+
+    def fail(self, message):
+        raise ExpressionError(f"{message} in expression {self.expression!r}")
+
+    def column(self, name):
+        name = self.quoted.get(name, name)
+        self.columns.add(name)
+        return ("col", name)
+
+    def literal(self, node):
+        try:
+            value = ast.literal_eval(node)
+        except ValueError:
+            self.fail(f"Unsupported value {ast.unparse(node)!r}")
+        return tuple(value) if isinstance(value, (list, tuple, set)) else value
+
+    def build(self, node):
+        if isinstance(node, ast.Name):
+            return self.column(node.id)
+        if isinstance(node, ast.Constant):
+            return ("const", node.value)
+        if isinstance(node, ast.BoolOp):
+            kind = "and" if isinstance(node.op, ast.And) else "or"
+            operands = set()
+            for value in node.values:
+                child = self.build(value)
+                operands.update(child[1] if child[0] == kind else [child])
+            return (kind, tuple(sorted(operands, key=repr)))
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, (ast.Not, ast.Invert)):
+                return ("not", self.build(node.operand))
+            if isinstance(node.op, ast.USub):
+                if isinstance(node.operand, ast.Constant):
+                    return ("const", -node.operand.value)
+                return ("neg", self.build(node.operand))
+            return self.build(node.operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            return ("arith", type(node.op), self.build(node.left), self.build(node.right))
+        if isinstance(node, ast.Compare):
+            parts = []
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                parts.append(self.comparison(left, op, right))
+                left = right
+            return parts[0] if len(parts) == 1 else ("and", tuple(sorted(set(parts), key=repr)))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            return self.call(node)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return self.method(node)
+        self.fail(f"Unsupported syntax {ast.unparse(node)!r}")
+
+    def comparison(self, left, op, right):
+        if isinstance(op, (ast.In, ast.NotIn)) or (
+                isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(right, (ast.List, ast.Tuple, ast.Set))):
+            # ``x in [1, 2]`` and query's ``x == [1, 2]`` are membership tests
+            negate = isinstance(op, (ast.NotIn, ast.NotEq))
+            return ("isin", negate, self.build(left), self.literal(right))
+        if type(op) not in _COMPARE:
+            self.fail(f"Unsupported comparison {type(op).__name__}")
+        left_node, right_node = self.build(left), self.build(right)
+        if left_node[0] == "const" and right_node[0] != "const":
+            return ("cmp", _FLIPPED[type(op)], right_node, left_node)
+        return ("cmp", type(op), left_node, right_node)
+
+    def call(self, node):
+        name = node.func.id
+        if name == "__range__":
+            if not self.reducing:
+                self.fail("A column range must be used inside any(), all() or count()")
+            return ("range", tuple(self.column(arg.value)[1] for arg in node.args))
+        if name not in _REDUCERS:
+            self.fail(f"Unknown function {name!r} (expected one of {', '.join(_REDUCERS)})")
+        if not node.args or node.keywords:
+            self.fail(f"{name}() needs one or more conditions")
+        self.reducing += 1
+        args = tuple(self.build(arg) for arg in node.args)
+        self.reducing -= 1
+        return ("reduce", name, args)
+
+    def method(self, node):
+        """``column.method(...)`` as ``DataFrame.query`` runs it on a Series."""
+        path = []
+        func = node.func
+        while isinstance(func, ast.Attribute):
+            path.insert(0, func.attr)
+            func = func.value
+        receiver = self.build(func)
+        name = path[-1]
+        if len(path) == 1 and name in _MISSING_METHODS:
+            if node.args or node.keywords:
+                self.fail(f"{name}() takes no arguments")
+            return ("isna", _MISSING_METHODS[name], receiver)
+        if len(path) == 1 and name == "isin" and len(node.args) == 1 and not node.keywords:
+            return ("isin", False, receiver, self.literal(node.args[0]))
+        if len(path) == 1 and name == "between" and len(node.args) == 2:
+            options = {keyword.arg: self.literal(keyword.value) for keyword in node.keywords}
+            inclusive = options.pop("inclusive", "both")
+            if options or inclusive not in _BETWEEN:
+                self.fail(f"Unsupported between() options {ast.unparse(node)!r}")
+            low, high = (self.build(arg) for arg in node.args)
+            low_op, high_op = _BETWEEN[inclusive]
+            return ("and", tuple(sorted({("cmp", low_op, receiver, low), ("cmp", high_op, receiver, high)},
+                                        key=repr)))
+
+        owner = pd.Series
+        for attr in path:
+            if attr.startswith("_") or not hasattr(owner, attr):
+                self.fail(f"Unknown method {'.'.join(path)!r}")
+            owner = getattr(owner, attr)
+        args = tuple(self.literal(arg) for arg in node.args)
+        keywords = tuple(sorted((keyword.arg, self.literal(keyword.value)) for keyword in node.keywords))
+        return ("method", tuple(path), receiver, args, keywords)
+
+
+class Expression:
+    """A banner condition or base filter parsed once into a tree of shared subexpressions."""
+
+    def __init__(self, text, tree, columns):
+        self.text = text
+        self.tree = tree
+        self.columns = frozenset(columns)
+
+    def __repr__(self):
+        return f"Expression({self.text!r})"
+
+    def evaluate(self, column, memo=None):
+        """
+        Evaluate against arrays supplied by ``column(name)``.
+
+        ``memo`` maps subexpression trees to their results; pass the same dict
+        for every expression evaluated on one dataset so shared subexpressions
+        (``vboost == 1`` in several banners, say) are computed only once.
+        """
+        return _evaluate(self.tree, column, {} if memo is None else memo)
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(text):
+    """Parse a ``DataFrame.query``-style expression (memoized, so each string is parsed once)."""
+    source, quoted = _python_source(text)
+    try:
+        tree = ast.parse(source.strip(), mode="eval").body
+    except SyntaxError as e:
+        raise ExpressionError(f"Cannot parse expression {text!r}: {e.msg}") from e
+    compiler = _Compiler(text, quoted)
+    return Expression(text, compiler.build(tree), compiler.columns)
+
+
+# ----------------------
+# Evaluation
+# ----------------------
+def _isin(values, items):
+    values = np.asarray(values)
+    flat = pd.Series(values.ravel(), dtype=values.dtype if values.dtype != bool else object)
+    return flat.isin(list(items)).to_numpy().reshape(values.shape)
+
+
+def _series_method(values, path, args, keywords):
+    """Call ``path`` (e.g. ``("str", "contains")``) on ``values`` as a Series; blanks in a boolean result are False."""
+    result = pd.Series(values)
+    for attr in path:
+        result = getattr(result, attr)
+    result = result(*args, **dict(keywords))
+    if not isinstance(result, pd.Series):
+        return result
+    if pd.api.types.is_bool_dtype(result.dtype) or (
+            result.dtype == object and result.notna().any() and result.dropna().isin([True, False]).all()):
+        return result.to_numpy(dtype=bool, na_value=False)
+    if pd.api.types.is_extension_array_dtype(result.dtype) and pd.api.types.is_numeric_dtype(result.dtype):
+        return result.to_numpy(dtype="float64", na_value=np.nan)
+    return result.to_numpy()
+
+
+def _evaluate(node, column, memo):
+    kind = node[0]
+    if kind == "const":
+        return node[1]
+    if node in memo:
+        return memo[node]
+    if kind == "col":
+        result = column(node[1])
+    elif kind == "range":
+        result = np.vstack([column(name) for name in node[1]])
+    elif kind == "cmp":
+        result = _COMPARE[node[1]](_evaluate(node[2], column, memo), _evaluate(node[3], column, memo))
+    elif kind == "isin":
+        result = _isin(_evaluate(node[2], column, memo), node[3])
+        if node[1]:
+            result = ~result
+    elif kind == "and":
+        result = np.logical_and.reduce([_evaluate(child, column, memo) for child in node[1]])
+    elif kind == "or":
+        result = np.logical_or.reduce([_evaluate(child, column, memo) for child in node[1]])
+    elif kind == "isna":
+        result = pd.isna(_evaluate(node[2], column, memo))
+        if node[1]:
+            result = ~result
+    elif kind == "method":
+        path, values, args, keywords = node[1], _evaluate(node[2], column, memo), node[3], node[4]
+        try:
+            if np.ndim(values) == 2:
+                result = np.vstack([_series_method(row, path, args, keywords) for row in values])
+            else:
+                result = _series_method(values, path, args, keywords)
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ExpressionError(f"Cannot evaluate {'.'.join(node[1])}(): {e}") from e
+    elif kind == "not":
+        result = np.logical_not(_evaluate(node[1], column, memo))
+    elif kind == "neg":
+        result = -_evaluate(node[1], column, memo)
+    elif kind == "arith":
+        result = _ARITHMETIC[node[1]](_evaluate(node[2], column, memo), _evaluate(node[3], column, memo))
+    else:  # reduce
+        parts = [np.asarray(_evaluate(child, column, memo), dtype=bool) for child in node[2]]
+        result = _REDUCERS[node[1]](np.vstack(parts))
+    memo[node] = result
+    return result
+
+
+# ----------------------
+# Column dependencies and validation
+# ----------------------
+def expression_columns(expression):
+    """
+    Columns an expression reads, including every column of a ``A1..A9`` range.
+
+    Expressions that do not parse fall back to every name-like token (a
+    superset), so column projection never drops something a query needs.
+    """
+    if not expression:
+        return set()
+    try:
+        return set(compile_expression(expression).columns)
+    except ExpressionError:
+        return set(_BACKTICK.findall(expression)) | set(re.findall(r"[A-Za-z_]\w*", expression))
+
+
+def run_expressions(banner_config, questions=()):
+    """Every banner condition and base filter a tab run evaluates."""
+    expressions = [banner.get("condition") for banner in banner_config]
+    expressions.extend(question.get("base_filter") for question in questions)
+    return [e for e in dict.fromkeys(expressions) if e]
+
+
+def validate_expressions(expressions, columns):
+    """
+    Compile every expression and check that the columns it reads exist.
+
+    All problems are collected into one ``ExpressionError`` so a run fails
+    before any table is generated rather than halfway through.
+    """
+    available = set(columns)
+    problems = []
+    for text in expressions:
+        try:
+            compiled = compile_expression(text)
+        except ExpressionError as e:
+            problems.append(str(e))
+            continue
+        missing = sorted(compiled.columns - available)
+        if missing:
+            problems.append(f"Unknown column(s) {', '.join(missing)} in expression {text!r}")
+    if problems:
+        raise ExpressionError("Invalid banner conditions or base filters:\n" + "\n".join(problems))
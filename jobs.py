@@ -0,0 +1,196 @@
+# jobs.py
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tab_cli import JobError, run_study
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been asked to stop."""
+
+
+class GenerationJob:
+    """
+    One background table-generation run and its live state.
+
+    ``spec`` is a validated batch job (see ``tab_cli.validate_job``). The
+    worker thread moves the job from queued to running to done, failed or
+    cancelled and updates ``stage``, ``done`` and ``total`` as tables are
+    written; the app only reads them. Cancelling is cooperative: the run stops
+    at the next progress report (after the data is loaded or the current
+    table is written) and its partial output is removed.
+    """
+
+    def __init__(self, job_id, spec, label=None, owner=None, profiler=None):
+        self.id = job_id
+        self.spec = spec
+        self.label = label or spec["study_name"]
+        self.owner = owner
+        self.profiler = profiler
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.done = 0
+        self.total = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.summary = None
+        self.error = None
+        self._tables_started = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def output(self):
+        return self.spec["output"]
+
+    @property
+    def is_finished(self):
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Ask the job to stop; a job still waiting in the queue is dropped at once."""
+        if self.is_finished:
+            return False
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED)
+        return True
+
+    def fraction(self):
+        """Share of tables written, 0.0 to 1.0."""
+        return self.done / self.total if self.total else 0.0
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def eta(self):
+        """Estimated seconds until the last table is written, or None before the first one."""
+        if self.is_finished or self._tables_started is None or not self.done or not self.total:
+            return None
+        rate = (time.time() - self._tables_started) / self.done
+        return rate * (self.total - self.done)
+
+    def _progress(self, stage, done, total):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+        if stage == "tables" and self._tables_started is None:
+            self._tables_started = time.time()
+        self.stage, self.done, self.total = stage, done, total
+
+    def _finish(self, status):
+        self.status = status
+        self.stage = status
+        self.finished = time.time()
+
+    def _run(self):
+        if self._cancel.is_set():
+            self._finish(CANCELLED)
+            return
+        self.started = time.time()
+        self.status = RUNNING
+        try:
+            self.summary = run_study(self.spec, progress=self._progress, profiler=self.profiler)
+        except JobCancelled:
+            self._finish(CANCELLED)
+        except Exception as e:
+            self.error = e
+            self._finish(FAILED)
+        else:
+            self._finish(DONE)
+        finally:
+            if self.profiler is not None:
+                self.profiler.close()
+
+
+class JobRegistry:
+    """
+    Background generation jobs shared by every session of one app server.
+
+    At most ``max_running`` jobs run at once, each in a worker thread (a job
+    may still spread its tables over worker processes); later jobs wait in
+    submission order. Jobs live here rather than in a Streamlit session, so
+    they keep running through reruns and page reloads, and several analysts
+    can queue runs without blocking each other's scripts. The ``keep`` most
+    recent finished jobs are kept for their results.
+    """
+
+    def __init__(self, max_running=2, keep=50):
+        self.max_running = max_running
+        self.keep = keep
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="tab-job")
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, spec, label=None, owner=None, profiler=None):
+        """
+        Queue a validated batch job; returns its ``GenerationJob``.
+
+        Raises ``JobError`` when an unfinished job already writes the same
+        output file.
+        """
+        with self._lock:
+            for other in self._jobs.values():
+                if not other.is_finished and other.output == spec["output"]:
+                    raise JobError(f"{other.output} is already being generated (job {other.id})")
+            job = GenerationJob(next(self._ids), spec, label, owner, profiler)
+            self._jobs[job.id] = job
+            job._future = self._executor.submit(job._run)
+            self._prune()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, owner=None):
+        """Jobs newest first, optionally only those submitted by ``owner``."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if owner is None or job.owner == owner]
+
+    def queued_ahead(self, job):
+        """Unfinished jobs submitted before ``job``; 0 once it is running."""
+        if job.status != QUEUED:
+            return 0
+        return sum(1 for other in self.jobs() if other.id < job.id and not other.is_finished)
+
+    def active(self):
+        """Number of queued and running jobs."""
+        return sum(1 for job in self.jobs() if not job.is_finished)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        return job is not None and job.cancel()
+
+    def forget(self, job_id):
+        """Drop a finished job from the list."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.is_finished:
+                del self._jobs[job_id]
+                return True
+        return False
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[job_id]
+
+    def shutdown(self, cancel=True):
+        """Stop accepting jobs; with ``cancel`` every unfinished job is cancelled first."""
+        if cancel:
+            for job in self.jobs():
+                job.cancel()
+        self._executor.shutdown(wait=True)
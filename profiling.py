@@ -0,0 +1,188 @@
+# profiling.py
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+
+class Profiler:
+    """
+    Wall time, and optionally peak memory, of every stage of a tab run.
+
+    ``span`` times a block and records it under a category: ``"stage"`` for
+    the steps of a run (loading, cleaning, banner evaluation, writing),
+    ``"table"`` for each ``generate_crosstab`` call, ``"step"`` for the parts
+    of a table (counting, stats, rendering), ``"write"`` for each table
+    written and ``"banner"`` for per-banner detail (evaluating each banner
+    condition, and each banner of tables counted banner by banner), which is
+    only recorded with ``banners=True``. Spans nest and may carry details such as the
+    question variable; spans recorded in worker processes are merged in with
+    ``extend``.
+
+    ``memory=True`` records each span's peak traced allocation above what was
+    allocated when it started (numpy and pandas report to ``tracemalloc``).
+    Tracing slows the run down noticeably, so it is off by default.
+    """
+
+    enabled = True
+
+    def __init__(self, memory=False, banners=False):
+        self.memory = memory
+        self.banners = banners
+        self.spans = []
+        # [allocated at start, highest peak seen] for each open span, innermost last
+        self._memory_stack = []
+        self._tracing = False
+
+    @contextmanager
+    def span(self, name, category="stage", **details):
+        """Time the enclosed block and record it, even when it raises."""
+        if self.memory:
+            self._memory_enter()
+        start = time.time()
+        tick = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - tick
+            record = {"name": name, "category": category, "start": start, "seconds": seconds,
+                      "pid": os.getpid(), **details}
+            if self.memory:
+                record["peak_bytes"] = self._memory_exit()
+            self.spans.append(record)
+
+    def _memory_enter(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._memory_stack.append([current, current])
+
+    def _memory_exit(self):
+        _, peak = tracemalloc.get_traced_memory()
+        start, highest = self._memory_stack.pop()
+        peak = max(peak, highest)
+        # The enclosing span saw this peak too; resetting keeps siblings apart
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        return peak - start
+
+    def extend(self, spans):
+        """Add spans recorded by another profiler, e.g. in a worker process."""
+        self.spans.extend(spans)
+
+    def drain(self):
+        """Return the recorded spans and start a fresh list."""
+        spans, self.spans = self.spans, []
+        return spans
+
+    def close(self):
+        """Stop ``tracemalloc`` if this profiler started it."""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # ----------------------
+    # Reports
+    # ----------------------
+    def frame(self, category=None):
+        """Recorded spans as a DataFrame, slowest first, optionally of one category."""
+        spans = [s for s in self.spans if category is None or s["category"] == category]
+        df = pd.DataFrame(spans)
+        if df.empty:
+            return df
+        if "peak_bytes" in df.columns:
+            df["peak_mb"] = df.pop("peak_bytes") / 2 ** 20
+        return df.drop(columns=["start", "pid"]).sort_values("seconds", ascending=False, kind="stable")
+
+    def summary(self):
+        """Count, total, mean and max seconds (and peak MB when tracked) per category and span name."""
+        df = self.frame()
+        if df.empty:
+            return df
+        grouped = df.groupby(["category", "name"], sort=False)
+        summary = grouped["seconds"].agg(count="count", total="sum", mean="mean", max="max")
+        if "peak_mb" in df.columns:
+            summary["peak_mb"] = grouped["peak_mb"].max()
+        return summary.sort_values("total", ascending=False)
+
+    def slowest(self, category="table", by="table", n=10):
+        """
+        The ``n`` slowest ``category`` spans, summed per ``by`` detail.
+
+        A table tabulated chunk by chunk, for example, adds up to one row.
+        """
+        df = self.frame(category)
+        if df.empty or by not in df.columns:
+            return df
+        grouped = df.groupby(by, sort=False)
+        # Keep the details that describe the group as a whole, such as a table's question
+        details = [c for c in df.columns if c not in (by, "name", "category", "seconds", "peak_mb")
+                   and (grouped[c].nunique(dropna=False) <= 1).all()]
+        aggregations = {"seconds": ("seconds", "sum"), "spans": ("seconds", "count"),
+                        **{c: (c, "first") for c in details}}
+        if "peak_mb" in df.columns:
+            aggregations["peak_mb"] = ("peak_mb", "max")
+        return grouped.agg(**aggregations).sort_values("seconds", ascending=False).head(n)
+
+    def trace(self):
+        """
+        The spans as a Chrome trace (the JSON format ``chrome://tracing`` and Perfetto open).
+
+        Every span is a complete ("X") event in microseconds, with its details
+        and peak memory as event arguments.
+        """
+        origin = min((s["start"] for s in self.spans), default=0.0)
+        events = []
+        for s in self.spans:
+            args = {k: v for k, v in s.items() if k not in ("name", "category", "start", "seconds", "pid")}
+            events.append({"name": s["name"], "cat": s["category"], "ph": "X", "pid": s["pid"], "tid": s["pid"],
+                           "ts": round((s["start"] - origin) * 1e6, 1), "dur": round(s["seconds"] * 1e6, 1),
+                           "args": args})
+        return {"traceEvents": sorted(events, key=lambda e: e["ts"]), "displayTimeUnit": "ms",
+                "otherData": {"memory": self.memory, "banners": self.banners}}
+
+    def export_json(self, path=None):
+        """The Chrome trace as JSON text, also written to ``path`` if given."""
+        text = json.dumps(self.trace(), default=str)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+
+class _NullProfiler:
+    """Stand-in used when a run is not profiled; every span is a no-op."""
+
+    enabled = False
+    memory = False
+    banners = False
+
+    def span(self, name, category="stage", **details):
+        return _NULL_SPAN
+
+    def extend(self, spans):
+        pass
+
+
+_NULL_SPAN = nullcontext()
+NULL_PROFILER = _NullProfiler()
+
+
+def question_label(question_var):
+    """A question variable as span detail: multi-select item lists are joined with commas."""
+    return ",".join(map(str, question_var)) if isinstance(question_var, list) else str(question_var)
@@ -0,0 +1,249 @@
+# question_store.py
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+QUESTION_DB = "questions_master.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    question_var TEXT NOT NULL DEFAULT '',
+    question_text TEXT NOT NULL DEFAULT '',
+    config TEXT NOT NULL
+)
+"""
+# Store-wide settings, e.g. whether the store was seeded from questions_master.json
+_META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+)
+"""
+
+
+class QuestionStoreError(ValueError):
+    """Raised when questions cannot be imported or a question does not exist."""
+
+
+def _search_var(question_var):
+    return ",".join(question_var) if isinstance(question_var, list) else str(question_var or "")
+
+
+def _row(question):
+    """Column values for one question; everything except the id is kept as JSON in ``config``."""
+    config = {k: v for k, v in question.items() if k != "id"}
+    return (_search_var(question.get("question_var")), str(question.get("question_text") or ""),
+            json.dumps(config, ensure_ascii=False))
+
+
+def _question(row):
+    question_id, config = row
+    return {"id": question_id, **json.loads(config)}
+
+
+class QuestionStore:
+    """
+    Question configs in a SQLite database, one row per question.
+
+    Edits, deletes and imports touch only the rows involved, each inside its
+    own transaction, so several sessions can work on the same store without
+    overwriting each other's changes. Questions are looked up through the id
+    primary key and listed a page at a time, optionally filtered by a search
+    on the variable name or question text. New ids continue from the highest
+    id in use, as the JSON file did; questions are listed in id order, which
+    is also the table order.
+    """
+
+    def __init__(self, path=QUESTION_DB):
+        self.path = path
+        with self._transaction(write=True) as conn:
+            new = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions'"
+                               ).fetchone() is None
+            conn.execute(_SCHEMA)
+            conn.execute(_META_SCHEMA)
+            if new:
+                # Only a store created here still waits to be seeded; older stores count as seeded
+                conn.execute("INSERT INTO meta (key, value) VALUES ('seeded', '0')")
+
+    @contextmanager
+    def _transaction(self, write=False):
+        """
+        A connection inside one transaction, committed on success.
+
+        Writes take the database lock up front (``BEGIN IMMEDIATE``) so that
+        reading the highest id and inserting after it cannot interleave with
+        another session doing the same.
+        """
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            # WAL lets readers carry on while another session writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _where(search):
+        if not search:
+            return "", ()
+        # The term is matched literally: ``_`` and ``%`` in variable names are not wildcards
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        return ("WHERE question_var LIKE ? ESCAPE '\\' OR question_text LIKE ? ESCAPE '\\' OR CAST(id AS TEXT) = ?",
+                (pattern, pattern, search.strip()))
+
+    # ----------------------
+    # Reading
+    # ----------------------
+    def count(self, search=None):
+        where, params = self._where(search)
+        with self._transaction() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM questions {where}", params).fetchone()[0]
+
+    def get(self, question_id):
+        """The question with ``question_id``, or None."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT id, config FROM questions WHERE id = ?", (question_id,)).fetchone()
+        return _question(row) if row else None
+
+    def page(self, offset=0, limit=50, search=None):
+        """
+        ``limit`` questions from ``offset`` on as ``(id, question_var, question_text)`` tuples.
+
+        Only the columns a question list shows are read, so paging through a
+        large store never parses the full configs.
+        """
+        where, params = self._where(search)
+        with self._transaction() as conn:
+            return conn.execute(f"SELECT id, question_var, question_text FROM questions {where} "
+                                f"ORDER BY id LIMIT ? OFFSET ?", (*params, limit, offset)).fetchall()
+
+    def all(self):
+        """Every question, in table order."""
+        with self._transaction() as conn:
+            return [_question(row) for row in conn.execute("SELECT id, config FROM questions ORDER BY id")]
+
+    def __len__(self):
+        return self.count()
+
+    def seeded(self):
+        """False until a new store has been seeded (see ``open_question_store``)."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'seeded'").fetchone()
+        return row is None or row[0] == "1"
+
+    def mark_seeded(self):
+        with self._transaction(write=True) as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seeded', '1')")
+
+    # ----------------------
+    # Writing
+    # ----------------------
+    def add(self, question):
+        """Store a new question (any ``id`` in it is ignored) and return its id."""
+        return self.add_many([question])[0]
+
+    def add_many(self, questions):
+        """Store new questions in one transaction, numbered after the highest existing id; returns the ids."""
+        with self._transaction(write=True) as conn:
+            cursor = conn.execute("SELECT COALESCE(MAX(id), 0) FROM questions")
+            start_id = cursor.fetchone()[0] + 1
+            ids = list(range(start_id, start_id + len(questions)))
+            conn.executemany("INSERT INTO questions (id, question_var, question_text, config) VALUES (?, ?, ?, ?)",
+                             [(question_id, *_row(q)) for question_id, q in zip(ids, questions)])
+        return ids
+
+    def update(self, question_id, question):
+        """
+        Replace one question's config with the edited ``question``.
+
+        Nothing of the stored config is kept, so keys the edit dropped (e.g.
+        ``item_labels`` after a grid became a single) do not linger. Raises
+        ``QuestionStoreError`` when the question no longer exists.
+        """
+        question = {**question, "id": question_id}
+        with self._transaction(write=True) as conn:
+            if conn.execute("SELECT 1 FROM questions WHERE id = ?", (question_id,)).fetchone() is None:
+                raise QuestionStoreError(f"Question ID {question_id} no longer exists")
+            conn.execute("UPDATE questions SET question_var = ?, question_text = ?, config = ? WHERE id = ?",
+                         (*_row(question), question_id))
+        return question
+
+    def delete(self, question_id):
+        """Delete one question; returns False when it was already gone."""
+        with self._transaction(write=True) as conn:
+            return conn.execute("DELETE FROM questions WHERE id = ?", (question_id,)).rowcount > 0
+
+    # ----------------------
+    # JSON import / export
+    # ----------------------
+    def import_questions(self, questions, replace=False):
+        """
+        Import a list of question dicts (the ``questions_master.json`` format).
+
+        With ``replace`` the store is emptied first and the ids in the list are
+        kept; otherwise the questions are appended with new ids. Either way the
+        import is all or nothing. Returns the number of questions imported.
+        """
+        if not isinstance(questions, list) or not all(isinstance(q, dict) for q in questions):
+            raise QuestionStoreError("Question JSON must be a list of question objects")
+        if not replace:
+            return len(self.add_many(questions))
+
+        ids = [q.get("id") for q in questions]
+        if not all(isinstance(i, int) for i in ids) or len(set(ids)) != len(ids):
+            raise QuestionStoreError("Every question needs a unique integer id to replace the store")
+        with self._transaction(write=True) as conn:
+            conn.execute("DELETE FROM questions")
+            conn.executemany("INSERT INTO questions (id, question_var, question_text, config) VALUES (?, ?, ?, ?)",
+                             [(q["id"], *_row(q)) for q in questions])
+        return len(questions)
+
+    def import_json(self, source, replace=False):
+        """Import questions from a JSON file path, file object or string (see ``import_questions``)."""
+        try:
+            if hasattr(source, "read"):
+                questions = json.load(source)
+            elif isinstance(source, str) and os.path.exists(source):
+                with open(source, "r", encoding="utf-8") as f:
+                    questions = json.load(f)
+            else:
+                questions = json.loads(source)
+        except (TypeError, ValueError) as e:
+            raise QuestionStoreError(f"Invalid question JSON: {e}") from e
+        return self.import_questions(questions, replace=replace)
+
+    def export_json(self, path=None):
+        """All questions as ``questions_master.json``-style JSON text, also written to ``path`` if given."""
+        text = json.dumps(self.all(), indent=4, ensure_ascii=False)
+        if path is not None:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        return text
+
+
+def open_question_store(path=QUESTION_DB, json_file=None):
+    """
+    Open the store at ``path``, seeding a newly created store from ``json_file``.
+
+    This migrates an existing ``questions_master.json`` the first time the
+    app runs with the database, keeping its ids. Seeding happens once: a
+    store whose questions were all deleted later stays empty. A seed that
+    fails (e.g. invalid JSON) is tried again the next time.
+    """
+    store = QuestionStore(path)
+    if not store.seeded():
+        if json_file and os.path.exists(json_file):
+            store.import_json(json_file, replace=True)
+        store.mark_seeded()
+    return store
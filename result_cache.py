@@ -0,0 +1,111 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+from expressions import expression_columns
+from data_loader import CACHE_DIR, question_columns
+
+# Bump whenever crosstab output changes so cached tables are recomputed
+RESULT_VERSION = 8
+
+
+class ResultCache:
+    """
+    On-disk cache of finished crosstabs for incremental regeneration.
+
+    A table's key hashes its question config (without the id, which only sets
+    the table number), the banner config, the run's table options (weight,
+    significance level) and a fingerprint of every dataset column the
+    question, its base filter, the banners and the weight read. Editing one question or changing one variable
+    in the data therefore only invalidates the tables that depend on it.
+    """
+
+    def __init__(self, directory=os.path.join(CACHE_DIR, "results"), max_entries=20000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, question, banner_config, dataset, table_options=None):
+        columns = question_columns(question)
+        for banner in banner_config:
+            columns.update(expression_columns(banner.get("condition")))
+        spec = {
+            "version": RESULT_VERSION,
+            "question": {k: v for k, v in question.items() if k != "id"},
+            "banners": banner_config,
+        }
+        options = {k: v for k, v in (table_options or {}).items() if v is not None}
+        if options:
+            spec["options"] = options
+        if options.get("weight_var"):
+            columns.add(options["weight_var"])
+        spec["data"] = dataset.fingerprint(columns)
+        payload = json.dumps(spec, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """Cached crosstabs of a question (see ``TabGenerator.generate_tables``) for ``key``, or None."""
+        path = self._path(key)
+        try:
+            table = pd.read_pickle(path)
+            os.utime(path)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        self.hits += 1
+        return table
+
+    def put(self, key, crosstabs):
+        """
+        Store a question's freshly computed crosstabs (counted as a miss).
+
+        Several jobs may share the cache directory, even from threads of one
+        process, so every write goes through its own temp file. A write that
+        loses a race is dropped: the table is simply not cached this time.
+        """
+        self.misses += 1
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            os.close(fd)
+            pd.to_pickle(crosstabs, tmp_path)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def prune(self):
+        """Drop the least recently used tables beyond ``max_entries``."""
+        if not os.path.isdir(self.directory):
+            return 0
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pkl"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        # Other jobs may prune the same directory at the same time
+                        pass
+        if len(entries) <= self.max_entries:
+            return 0
+        entries.sort()
+        stale = [path for _, path in entries[:len(entries) - self.max_entries]]
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return len(stale)
@@ -0,0 +1,258 @@
+# result_cube.py
+"""
+Numeric results of a tab run, saved so reports can be laid out again later.
+
+A ``ResultCube`` holds every table's aggregates (see ``table_partials``) as
+tables x rows x banners arrays: row counts, respondent and weighted bases,
+the code total, No Answer and the mean variable's moments and value
+histogram. It is saved as a compressed NumPy archive (``.npz``) together
+with the questions, banners and run details as JSON, and rendered to CSV or
+XLSX without the respondent data, so changing decimal places, significance
+testing, extra statistics or the banners shown only costs the layout:
+
+    python result_cube.py results.npz tables.xlsx --banners A B C --decimals 1
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from stats_engine import StatsAggregate
+from tab_runner import render_partials
+from table_partials import GridPartial, TablePartial
+from table_writer import OUTPUT_FORMATS, open_table_writer
+
+CUBE_VERSION = 1
+CUBE_EXTENSION = ".npz"
+# Table options a cube may be rendered with; the weighting is fixed by the counts
+RENDER_OPTIONS = ("sig_level", "extra_stats", "decimals")
+
+
+class CubeError(ValueError):
+    """Raised when a result cube cannot be read or rendered as asked."""
+
+
+class ResultCube:
+    """
+    Every table's aggregates for one run, with what is needed to lay them out.
+
+    ``partials`` maps table number (1-based question position) to the
+    ``TablePartial`` or ``GridPartial`` of that question over all respondents,
+    e.g. from ``tab_runner.question_partials`` or ``tab_runner.chunk_partials``.
+    """
+
+    def __init__(self, questions, banner_config, run_info, partials, table_options=None):
+        self.questions = questions
+        self.banner_config = banner_config
+        self.run_info = run_info
+        self.partials = partials
+        self.table_options = {k: v for k, v in (table_options or {}).items() if v is not None}
+
+    @property
+    def weighted(self):
+        return bool(self.table_options.get("weight_var"))
+
+    # ----------------------
+    # Archive
+    # ----------------------
+    def arrays(self):
+        """
+        The cube as named arrays, T tables x R rows x B banners.
+
+        ``counts`` holds each table's row counts by display-structure position
+        (a grid's banners x items x codes counts flattened item by item), NaN
+        where a table has no row. Stats are ``stat_moments`` (T x 4 x B:
+        totals, means, squared deviations, squared weights) plus each table's
+        distinct values and banner histogram, concatenated along the value
+        axis and delimited by ``stat_offsets``.
+        """
+        partials = [self.partials[n] for n in range(1, len(self.questions) + 1)]
+        n_banners = len(self.banner_config)
+        n_rows = max((_row_count(p) for p in partials), default=0)
+        counts = np.full((len(partials), n_rows, n_banners), np.nan)
+        bases = np.zeros((len(partials), n_banners), dtype=np.int64)
+        weight_totals = np.full((len(partials), n_banners, 2), np.nan)
+        code_total = np.full((len(partials), n_banners), np.nan)
+        no_answer = np.full((len(partials), n_banners), np.nan)
+        moments = np.full((len(partials), 4, n_banners), np.nan)
+        levels, histograms, offsets = [], [], [0]
+        for t, partial in enumerate(partials):
+            bases[t] = partial.bases
+            if partial.weight_totals is not None:
+                weight_totals[t] = partial.weight_totals
+            if isinstance(partial, GridPartial):
+                counts[t, :partial.counts[0].size] = partial.counts.reshape(n_banners, -1).T
+            else:
+                for pos, row in partial.rows.items():
+                    counts[t, pos] = row
+                code_total[t] = partial.code_total
+                if partial.no_answer is not None:
+                    no_answer[t] = partial.no_answer
+            stats = partial.stats
+            if stats is not None:
+                moments[t] = [stats.totals, stats.means, stats.m2, stats.weight_squares]
+                levels.append(stats.levels)
+                histograms.append(stats.histogram)
+            offsets.append(offsets[-1] + (0 if stats is None else len(stats.levels)))
+
+        arrays = {"counts": counts, "bases": bases, "code_total": code_total, "no_answer": no_answer,
+                  "stat_moments": moments, "stat_offsets": np.array(offsets, dtype=np.int64),
+                  "stat_levels": np.concatenate(levels) if levels else np.zeros(0),
+                  "stat_histogram": np.hstack(histograms) if histograms else np.zeros((n_banners, 0))}
+        if self.weighted:
+            arrays["weight_totals"] = weight_totals
+        return arrays
+
+    def save(self, path):
+        """Write the cube to ``path`` as a compressed ``.npz`` archive; returns the path."""
+        tables = []
+        for n, question in enumerate(self.questions, start=1):
+            partial = self.partials[n]
+            table = {"kind": "grid" if isinstance(partial, GridPartial) else "table",
+                     "no_answer": getattr(partial, "no_answer", None) is not None,
+                     "stats": partial.stats is not None}
+            if isinstance(partial, GridPartial):
+                table["shape"] = list(partial.counts.shape[1:])
+            tables.append(table)
+        meta = {"version": CUBE_VERSION, "questions": self.questions, "banners": self.banner_config,
+                "run_info": self.run_info, "table_options": self.table_options, "tables": tables}
+        # Written aside and moved into place, so a failed save never leaves a truncated cube
+        tmp_path = f"{path}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, meta=np.array(json.dumps(meta, default=str)), **self.arrays())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read a cube written by ``save``; raises ``CubeError`` when it is not one."""
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                arrays = {name: archive[name] for name in archive.files}
+            meta = json.loads(str(arrays.pop("meta")))
+        except (OSError, ValueError, KeyError) as e:
+            raise CubeError(f"Cannot read result cube {path}: {e}") from e
+        if meta.get("version") != CUBE_VERSION:
+            raise CubeError(f"{path} is a version {meta.get('version')} result cube (expected {CUBE_VERSION})")
+
+        weighted = "weight_totals" in arrays
+        number = float if weighted else np.int64
+        offsets = arrays["stat_offsets"]
+        partials = {}
+        for t, table in enumerate(meta["tables"]):
+            bases = arrays["bases"][t]
+            weight_totals = arrays["weight_totals"][t] if weighted else None
+            stats = None
+            if table["stats"]:
+                values = slice(offsets[t], offsets[t + 1])
+                stats = StatsAggregate(*arrays["stat_moments"][t].copy(), arrays["stat_levels"][values],
+                                       arrays["stat_histogram"][:, values])
+            counts = arrays["counts"][t]
+            if table["kind"] == "grid":
+                n_items, width = table["shape"]
+                cube = counts[:n_items * width].T.reshape(len(bases), n_items, width).astype(number)
+                partials[t + 1] = GridPartial(bases, weight_totals, cube, stats)
+            else:
+                rows = {int(pos): counts[pos].astype(number) for pos in np.flatnonzero(~np.isnan(counts[:, 0]))}
+                no_answer = arrays["no_answer"][t].astype(number) if table["no_answer"] else None
+                partials[t + 1] = TablePartial(bases, weight_totals, rows, arrays["code_total"][t].astype(number),
+                                               no_answer, stats)
+        return cls(meta["questions"], meta["banners"], meta["run_info"], partials, meta["table_options"])
+
+    # ----------------------
+    # Layout
+    # ----------------------
+    def select(self, banner_ids):
+        """A cube with only the banners in ``banner_ids``, in that order (significance letters follow them)."""
+        positions = {banner["id"]: b for b, banner in enumerate(self.banner_config)}
+        unknown = [banner_id for banner_id in banner_ids if banner_id not in positions]
+        if unknown:
+            raise CubeError(f"Unknown banner id(s): {', '.join(unknown)} (the cube has {', '.join(positions)})")
+        keep = [positions[banner_id] for banner_id in banner_ids]
+        partials = {n: _select_banners(partial, keep) for n, partial in self.partials.items()}
+        return ResultCube(self.questions, [self.banner_config[b] for b in keep], self.run_info, partials,
+                          self.table_options)
+
+    def iter_tables(self, table_options=None, profiler=None):
+        """
+        Yield the full layout of every table, as ``tab_runner.iter_tables`` does.
+
+        ``table_options`` override the run's ``sig_level``, ``extra_stats``
+        and ``decimals``.
+        """
+        unknown = sorted(set(table_options or {}) - set(RENDER_OPTIONS))
+        if unknown:
+            raise CubeError(f"A cube cannot be rendered with different {', '.join(unknown)}")
+        options = {**self.table_options, **(table_options or {})}
+        return render_partials(self.partials, self.questions, self.banner_config, table_options=options,
+                               profiler=profiler, **self.run_info)
+
+    def render(self, output, output_format="csv", table_options=None, xlsx_layout="sheets"):
+        """Write every table to ``output`` (see ``table_writer``); returns the number of tables written."""
+        writer_options = {"layout": xlsx_layout} if output_format == "xlsx" else {}
+        with open_table_writer(output, output_format, **writer_options) as writer:
+            for full_table in self.iter_tables(table_options):
+                writer.write_table(full_table)
+        return writer.tables
+
+
+def _row_count(partial):
+    if isinstance(partial, GridPartial):
+        return partial.counts[0].size
+    return max(partial.rows, default=-1) + 1
+
+
+def _select_banners(partial, keep):
+    weight_totals = None if partial.weight_totals is None else partial.weight_totals[keep]
+    stats = partial.stats
+    if stats is not None:
+        stats = StatsAggregate(stats.totals[keep], stats.means[keep], stats.m2[keep], stats.weight_squares[keep],
+                               stats.levels, stats.histogram[keep])
+    if isinstance(partial, GridPartial):
+        return GridPartial(partial.bases[keep], weight_totals, partial.counts[keep], stats)
+    no_answer = None if partial.no_answer is None else partial.no_answer[keep]
+    return TablePartial(partial.bases[keep], weight_totals, {pos: row[keep] for pos, row in partial.rows.items()},
+                        partial.code_total[keep], no_answer, stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lay out the tables of a saved result cube")
+    parser.add_argument("cube", help=f"result cube ({CUBE_EXTENSION}) written by a tab run")
+    parser.add_argument("output", help="CSV or XLSX file to write")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), help="output format (default: from the extension)")
+    parser.add_argument("--xlsx-layout", default="sheets", choices=["sheets", "single"])
+    parser.add_argument("--banners", nargs="+", help="banner ids to show, in order (default: all)")
+    parser.add_argument("--decimals", type=int, help="decimal places of percentages and stats (default 2)")
+    parser.add_argument("--sig-level", type=float, help="confidence level for significance letters, e.g. 0.95")
+    parser.add_argument("--no-sig", action="store_true", help="leave out the significance letters")
+    parser.add_argument("--extra-stats", help="stat rows after the median, e.g. min,p25,p75,max")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or args.output.rsplit(".", 1)[-1].lower()
+    if output_format not in OUTPUT_FORMATS:
+        parser.error(f"cannot tell the output format of {args.output}; pass --format")
+    options = {"decimals": args.decimals, "sig_level": args.sig_level, "extra_stats": args.extra_stats}
+    options = {k: v for k, v in options.items() if v is not None}
+    if args.no_sig:
+        options["sig_level"] = None
+    try:
+        cube = ResultCube.load(args.cube)
+        if args.banners:
+            cube = cube.select(args.banners)
+        tables = cube.render(args.output, output_format, options, args.xlsx_layout)
+    except (CubeError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"{tables} table(s) written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
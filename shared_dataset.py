@@ -0,0 +1,103 @@
+# shared_dataset.py
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Nullable pandas arrays are stored as their values + NA mask buffers
+MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SharedDataset:
+    """
+    Publish a cleaned respondent frame to worker processes through shared memory.
+
+    Numeric and nullable-numeric columns are copied once into a single shared
+    memory block; workers map them back into a DataFrame without copying.
+    Text columns and the index are small enough to travel inside the manifest.
+    Use as a context manager so the block is always released.
+    """
+
+    def __init__(self, df):
+        buffers = []
+        columns = []
+        offset = 0
+        for name in df.columns:
+            values = df[name].array
+            if isinstance(values, MASKED_ARRAYS):
+                parts = [values._data, values._mask]
+                kind = type(values).__name__
+            else:
+                array = df[name].to_numpy()
+                if array.dtype.kind not in "biuf":
+                    columns.append({"name": name, "kind": "pickled", "series": df[name].reset_index(drop=True)})
+                    continue
+                parts = [array]
+                kind = "numpy"
+            specs = []
+            for part in parts:
+                part = np.ascontiguousarray(part)
+                offset = _aligned(offset)
+                specs.append({"dtype": part.dtype.str, "offset": offset, "length": len(part)})
+                buffers.append((offset, part))
+                offset += part.nbytes
+            columns.append({"name": name, "kind": kind, "dtype": str(df[name].dtype), "parts": specs})
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for start, part in buffers:
+            target = np.ndarray(part.shape, dtype=part.dtype, buffer=self.shm.buf, offset=start)
+            target[...] = part
+        self.manifest = {"shm_name": self.shm.name, "index": df.index, "columns": columns}
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_shared_dataset(manifest):
+    """
+    Rebuild the published frame inside a worker without copying column data.
+
+    Returns ``(df, shm)``; keep ``shm`` referenced for as long as ``df`` is used.
+    The shared arrays are read-only.
+    """
+    if sys.version_info >= (3, 13):
+        # Only the publishing process owns (and unlinks) the block
+        shm = shared_memory.SharedMemory(name=manifest["shm_name"], track=False)
+    else:
+        # Pool workers share the parent's resource tracker, so attaching again is harmless
+        shm = shared_memory.SharedMemory(name=manifest["shm_name"])
+
+    arrays = {}
+    for i, column in enumerate(manifest["columns"]):
+        if column["kind"] == "pickled":
+            arrays[i] = column["series"].array
+            continue
+        parts = []
+        for spec in column["parts"]:
+            part = np.ndarray(spec["length"], dtype=np.dtype(spec["dtype"]), buffer=shm.buf, offset=spec["offset"])
+            part.flags.writeable = False
+            parts.append(part)
+        if column["kind"] == "numpy":
+            arrays[i] = parts[0]
+        else:
+            arrays[i] = getattr(pd.arrays, column["kind"])(*parts)
+
+    df = pd.DataFrame(arrays, copy=False)
+    df.columns = [column["name"] for column in manifest["columns"]]
+    df.index = manifest["index"]
+    return df, shm
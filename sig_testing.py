@@ -0,0 +1,97 @@
+# sig_testing.py
+from statistics import NormalDist
+
+import numpy as np
+
+# Columns with a smaller (effective) base are neither tested nor tested against
+MIN_BASE = 30
+
+
+def z_critical(confidence):
+    """Two-tailed critical value of the standard normal at ``confidence`` (e.g. 0.95)."""
+    if not 0 < confidence < 1:
+        raise ValueError(f"Confidence level must be between 0 and 1, got {confidence!r}")
+    return NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+
+
+def t_critical(confidence, df):
+    """
+    Two-tailed critical values of Student's t for an array of degrees of freedom.
+
+    Uses the Cornish-Fisher expansion around the normal quantile, which is
+    accurate to about 1e-4 from 5 degrees of freedom up; no SciPy needed.
+    """
+    z = z_critical(confidence)
+    df = np.asarray(df, dtype=np.float64)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return z + g1 / df + g2 / df ** 2 + g3 / df ** 3 + g4 / df ** 4
+
+
+def _testable_pairs(ns, min_base):
+    """B x B mask of column pairs where both bases are large enough (never a column against itself)."""
+    ok = np.asarray(ns, dtype=np.float64) >= max(min_base, 1)
+    return ok[:, None] & ok[None, :] & ~np.eye(len(ok), dtype=bool)
+
+
+def proportion_tests(counts, bases, confidence=0.95, effective_bases=None, min_base=MIN_BASE):
+    """
+    Pairwise two-proportion z-tests between every pair of banner columns.
+
+    ``counts`` is a rows x banners matrix and ``bases`` the banner bases the
+    percentages are taken on. Weighted tables pass their weighted counts and
+    bases plus ``effective_bases``, which then stand in for the sample sizes.
+    Returns a rows x banners x banners boolean array whose ``[r, i, j]`` is
+    True when column ``i`` is significantly higher than column ``j`` on row ``r``.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    bases = np.asarray(bases, dtype=np.float64)
+    ns = bases if effective_bases is None else np.asarray(effective_bases, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(bases > 0, counts / bases, 0.0)
+        pi, pj = p[:, :, None], p[:, None, :]
+        ni, nj = ns[None, :, None], ns[None, None, :]
+        pooled = (pi * ni + pj * nj) / (ni + nj)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / ni + 1 / nj))
+        z = np.where(se > 0, (pi - pj) / se, 0.0)
+    return (z > z_critical(confidence)) & _testable_pairs(ns, min_base)[None, :, :]
+
+
+def mean_tests(means, stds, ns, confidence=0.95, min_base=MIN_BASE):
+    """
+    Pairwise Welch t-tests on banner column means.
+
+    ``ns`` are the (effective) numbers of valid answers behind each mean.
+    Returns a banners x banners boolean array whose ``[i, j]`` is True when
+    the mean of column ``i`` is significantly higher than that of column ``j``.
+    """
+    means = np.asarray(means, dtype=np.float64)
+    ns = np.asarray(ns, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = np.asarray(stds, dtype=np.float64) ** 2 / ns
+        vi, vj = var[:, None], var[None, :]
+        se = np.sqrt(vi + vj)
+        t = np.where(se > 0, (means[:, None] - means[None, :]) / se, 0.0)
+        df = (vi + vj) ** 2 / (vi ** 2 / (ns[:, None] - 1) + vj ** 2 / (ns[None, :] - 1))
+        sig = t > t_critical(confidence, df)
+    return sig & np.isfinite(t) & _testable_pairs(ns, max(min_base, 2))
+
+
+def significance_letters(sig, letters):
+    """
+    Turn a ``[..., i, j]`` significance array into letter strings.
+
+    Each column ``i`` gets the letters of every column ``j`` it beats, so the
+    result has the shape of ``sig`` without its last axis. Single-character
+    letters are run together ("ACD"); when any letter is longer they are
+    separated by spaces ("N1 N12"), so the columns can still be told apart.
+    """
+    separator = " " if any(len(letter) > 1 for letter in letters) else ""
+    letters = np.asarray(letters, dtype=object)
+    out = np.full(sig.shape[:-1], "", dtype=object)
+    for j, letter in enumerate(letters):
+        out = np.where(sig[..., j], np.where(out == "", letter, out + separator + letter), out)
+    return out
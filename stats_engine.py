@@ -0,0 +1,133 @@
+# stats_engine.py
+import re
+
+import numpy as np
+
+from crosstab_engine import group_code_counts
+from weighting import weighted_quantile
+
+# Rows every table with a mean variable reports, in display order
+STAT_LABELS = ["Mean", "Std.dev", "Std.err", "Median"]
+
+_PERCENTILE = re.compile(r"p(\d+(?:\.\d+)?)")
+
+
+def parse_extra_stats(names):
+    """
+    Optional stat rows as ``[(label, quantile), ...]``, smallest quantile first.
+
+    ``names`` is a list or comma-separated string of ``min``, ``max`` and
+    percentiles written ``p<n>`` (``p25``, ``p90``, ``p2.5``).
+    """
+    if not names:
+        return []
+    if isinstance(names, str):
+        names = names.split(",")
+    stats = []
+    for name in names:
+        key = str(name).strip().lower()
+        match = _PERCENTILE.fullmatch(key)
+        if key == "min":
+            stats.append(("Min", 0.0))
+        elif key == "max":
+            stats.append(("Max", 1.0))
+        elif match and 0 < float(match.group(1)) < 100:
+            stats.append((f"P{match.group(1)}", float(match.group(1)) / 100))
+        else:
+            raise ValueError(f"Unknown statistic {name!r} (expected min, max or p<n> with 0 < n < 100)")
+    return sorted(dict.fromkeys(stats), key=lambda stat: stat[1])
+
+
+class StatsAggregate:
+    """
+    Mergeable per-banner summary of a table's mean variable.
+
+    Holds the (weighted) count, mean and sum of squared deviations of the
+    answers in each banner, which combine across chunks with the parallel
+    variance formula and so avoid the cancellation of a raw sum of squares.
+    A histogram of (weighted) counts per distinct value gives the exact
+    median, percentiles and extremes; survey answers have few distinct
+    values, so it stays small.
+    """
+
+    def __init__(self, totals, means, m2, weight_squares, levels, histogram):
+        self.totals = totals
+        self.means = means
+        self.m2 = m2
+        self.weight_squares = weight_squares
+        self.levels = levels
+        self.histogram = histogram
+
+    @classmethod
+    def from_values(cls, values, banners, weights=None):
+        """
+        Aggregate ``values`` (float64, NaN for blanks) under every banner of a ``BannerLayout``.
+
+        The values are factorized once into distinct levels; each banner (or
+        each nested banner group) is then a single bincount of the level codes
+        it selects, giving a
+        banners x levels histogram of (weighted) counts from which the count,
+        sum and squared deviations of every banner follow with a small matrix
+        product. Weighted tables also sum the squared weights, for the
+        effective base.
+        """
+        keep = ~np.isnan(values)
+        if weights is not None:
+            keep &= weights > 0
+        levels, level_pos = np.unique(values[keep], return_inverse=True)
+        # Blanks (and zero weights) go to an overflow slot past the last level
+        codes = np.full(len(values), len(levels))
+        codes[keep] = level_pos
+        width = len(levels) + 1
+
+        histogram = np.zeros((banners.n_banners, len(levels)))
+        weight_squares = np.zeros(banners.n_banners)
+        squared = None if weights is None else np.where(keep, weights, 0.0) ** 2
+        for b, mask in zip(banners.plain, banners.masks):
+            banner_weights = None if weights is None else weights[mask]
+            histogram[b] = np.bincount(codes[mask], weights=banner_weights, minlength=width)[:-1]
+            if weights is not None:
+                weight_squares[b] = squared[mask].sum()
+        for positions, keys in banners.groups:
+            histogram[positions] = group_code_counts(codes, len(levels), keys, len(positions), weights)[:, :-1]
+            if weights is not None:
+                weight_squares[positions] = np.bincount(keys, weights=squared, minlength=len(positions) + 1)[:-1]
+
+        totals = histogram.sum(axis=1)
+        means = np.divide(histogram @ levels, totals, out=np.zeros_like(totals), where=totals > 0)
+        m2 = (histogram * (levels[None, :] - means[:, None]) ** 2).sum(axis=1)
+        if weights is None:
+            weight_squares = totals.copy()
+        return cls(totals, means, m2, weight_squares, levels, histogram)
+
+    def merge(self, other):
+        totals = self.totals + other.totals
+        delta = other.means - self.means
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(totals > 0, other.totals / totals, 0.0)
+            self.means = self.means + delta * share
+            self.m2 = self.m2 + other.m2 + delta ** 2 * self.totals * share
+        self.totals = totals
+        self.weight_squares = self.weight_squares + other.weight_squares
+
+        levels = np.union1d(self.levels, other.levels)
+        histogram = np.zeros((len(totals), len(levels)))
+        histogram[:, np.searchsorted(levels, self.levels)] += self.histogram
+        histogram[:, np.searchsorted(levels, other.levels)] += other.histogram
+        self.levels, self.histogram = levels, histogram
+        return self
+
+    def summary(self):
+        """Per-banner ``(means, stds, sems, medians, effective_ns)`` as float arrays (NaN where undefined)."""
+        totals = self.totals
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = np.where(totals > 0, self.means, np.nan)
+            stds = np.where(totals > 1, np.sqrt(self.m2 / (totals - 1)), np.nan)
+            effective = np.where(self.weight_squares > 0, totals ** 2 / self.weight_squares, 0.0)
+            sems = stds / np.sqrt(effective)
+        return means, stds, sems, self.quantiles([0.5])[:, 0], effective
+
+    def quantiles(self, qs):
+        """Banners x ``len(qs)`` weighted quantiles (0 is the minimum, 1 the maximum)."""
+        return np.array([[weighted_quantile(self.levels, row, q) for q in qs]
+                         for row in self.histogram]).reshape(len(self.histogram), len(qs))
@@ -0,0 +1,367 @@
+# tab_cli.py
+"""
+Generate output tables without the Streamlit app.
+
+A job file lists the studies to run; each study names its data file,
+question store and banner spec, and everything else the Generate Tables tab
+asks for. Studies run concurrently in a bounded process pool and a JSON run
+summary is printed (or written with ``--summary``) when all have finished:
+
+    python tab_cli.py jobs.json --jobs 4 --summary run_summary.json
+
+The exit status is 0 when every study succeeded, 1 when any failed and 2
+when the job file itself is invalid.
+
+Job file::
+
+    {
+        "defaults": {"client_name": "PEERLESS INSIGHTS", "questions": "questions_master.db",
+                     "banners": "banners.json", "output_format": "xlsx", "output_dir": "output"},
+        "studies": [
+            {"study_name": "DTV-010 Feature Prioritization", "data_file": "Final_CE_10042023_V3.csv"},
+            {"study_name": "DTV-011 Pricing", "data_file": "pricing.sav", "weight_var": "wt"}
+        ]
+    }
+
+A bare list of studies works too. Relative paths are taken relative to the
+job file. A study with ``"cube"`` (a path, or ``true`` for one next to the
+output) also saves its numeric results as a ``result_cube.ResultCube``,
+which ``python result_cube.py`` lays out again without the data.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+from datetime import datetime
+
+from data_loader import CHUNK_ROWS, combine_cleaning_reports, iter_prepared_chunks, load_data, referenced_columns
+from profiling import NULL_PROFILER
+from question_store import QuestionStore
+from result_cache import ResultCache
+from result_cube import CUBE_EXTENSION, ResultCube
+from tab_runner import (chunk_partials, iter_chunked_tables, iter_tables, load_banner_config, question_partials,
+                        table_count)
+from table_writer import OUTPUT_FORMATS, open_table_writer
+from weighting import parse_rim_targets, rim_weights
+
+# Every key a study may set, with its default (None = required or unset)
+JOB_KEYS = {
+    "study_name": None,
+    "client_name": None,
+    "data_file": None,
+    "questions": "questions_master.db",
+    "banners": None,
+    "output_format": "csv",
+    "output": None,
+    "output_dir": ".",
+    "xlsx_layout": "sheets",
+    "weight_var": None,
+    "rim_targets": None,
+    "sig_level": None,
+    "extra_stats": None,
+    "workers": 1,
+    "streaming": False,
+    "chunk_rows": CHUNK_ROWS,
+    "use_data_cache": True,
+    "reuse_tables": True,
+    "cube": None,
+    "month": None,
+    "year": None,
+}
+REQUIRED_KEYS = ("study_name", "client_name", "data_file")
+PATH_KEYS = ("data_file", "questions", "banners", "output", "output_dir", "cube")
+
+
+class JobError(ValueError):
+    """Raised when a job file or one of its studies is invalid."""
+
+
+# ----------------------
+# Job files
+# ----------------------
+def _resolve(value, base_dir):
+    """A relative path made relative to ``base_dir``; inline banner JSON and other values pass through."""
+    if isinstance(value, str) and value and not value.lstrip().startswith("[") and not os.path.isabs(value):
+        return os.path.normpath(os.path.join(base_dir, value))
+    return value
+
+
+def output_path(job):
+    """Where a study's tables go: ``output`` or a dated file named after the study in ``output_dir``."""
+    if job["output"]:
+        return job["output"]
+    extension = OUTPUT_FORMATS[job["output_format"]][0]
+    today = datetime.today().strftime('%m%d%Y')
+    return os.path.join(job["output_dir"], f"{job['study_name'].replace(' ', '_')}_Output_Tables_{today}{extension}")
+
+
+def validate_job(study, defaults=None, base_dir="."):
+    """
+    One study merged over the job file's ``defaults``, with every key set.
+
+    Paths become relative to ``base_dir`` and the output path is filled in.
+    Raises ``JobError`` for missing or unknown keys and invalid values.
+    """
+    if not isinstance(study, dict):
+        raise JobError(f"Every study must be a JSON object, got {study!r}")
+    job = {**JOB_KEYS, **(defaults or {}), **study}
+    unknown = sorted(set(job) - set(JOB_KEYS))
+    if unknown:
+        raise JobError(f"Unknown job key(s): {', '.join(unknown)}")
+    missing = [key for key in REQUIRED_KEYS if not job[key]]
+    if missing:
+        raise JobError(f"Study {job['study_name'] or '?'!r} is missing {', '.join(missing)}")
+    if job["output_format"] not in OUTPUT_FORMATS:
+        raise JobError(f"Unsupported output format: {job['output_format']} (expected csv or xlsx)")
+    if job["weight_var"] and job["rim_targets"]:
+        raise JobError(f"Study {job['study_name']!r} sets both weight_var and rim_targets")
+    if job["rim_targets"] and job["streaming"]:
+        raise JobError(f"Study {job['study_name']!r}: rim weighting needs the whole file in memory")
+    if not isinstance(job["workers"], int) or job["workers"] < 1:
+        raise JobError(f"Study {job['study_name']!r}: workers must be a positive integer")
+    for key in PATH_KEYS:
+        job[key] = _resolve(job[key], base_dir)
+    job["output"] = output_path(job)
+    if job["cube"] is True:
+        job["cube"] = os.path.splitext(job["output"])[0] + CUBE_EXTENSION
+    return job
+
+
+def load_job_file(path):
+    """Every study of a job file, validated (see ``validate_job``)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise JobError(f"Cannot read job file {path}: {e}") from e
+    if isinstance(spec, list):
+        spec = {"studies": spec}
+    if not isinstance(spec, dict) or not isinstance(spec.get("studies"), list) or not spec["studies"]:
+        raise JobError("A job file must hold a non-empty list of studies")
+    unknown = sorted(set(spec) - {"defaults", "studies"})
+    if unknown:
+        raise JobError(f"Unknown job file key(s): {', '.join(unknown)}")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = [validate_job(study, spec.get("defaults"), base_dir) for study in spec["studies"]]
+    outputs = [job["output"] for job in jobs]
+    duplicates = sorted({p for p in outputs if outputs.count(p) > 1})
+    if duplicates:
+        raise JobError(f"Several studies write to the same output: {', '.join(duplicates)}")
+    return jobs
+
+
+def load_questions(source):
+    """
+    Question configs from a question store (``.db``) or a ``questions_master.json`` file.
+
+    A list is taken as the question configs themselves, e.g. a snapshot of
+    the store taken when a job was queued.
+    """
+    if isinstance(source, list):
+        return source
+    if not os.path.exists(source):
+        raise JobError(f"Question source not found: {source}")
+    if os.path.splitext(source)[1].lower() == ".json":
+        with open(source, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return QuestionStore(source).all()
+
+
+# ----------------------
+# Running studies
+# ----------------------
+def run_study(job, progress=None, profiler=None):
+    """
+    Generate one study's tables as the Generate Tables tab does; returns its summary.
+
+    ``progress(stage, done, total)`` is called as the run advances: with
+    ``"loading"`` before the data is read (``"reading"`` after each chunk in
+    streaming mode, ``done`` counting chunks) and with ``"tables"`` once
+    tabulation starts and after each table is written. An exception raised from it, e.g. to cancel the run,
+    stops the run and leaves no partial output behind. A ``profiler`` (see
+    ``profiling``) times every stage. Errors propagate; ``run_jobs`` turns
+    them into failed summaries. With a ``cube`` path every table is
+    aggregated first, saved as a result cube and then laid out from it,
+    serially and without table reuse.
+    """
+    start = time.perf_counter()
+    profiler = profiler or NULL_PROFILER
+    if not os.path.exists(job["data_file"]):
+        raise JobError(f"Data file not found: {job['data_file']}")
+    questions = load_questions(job["questions"])
+    if not questions:
+        raise JobError(f"No questions in {job['questions']}")
+    banner_config = load_banner_config(job["banners"])
+    total = table_count(questions)
+
+    def report(stage, done=0):
+        if progress is not None:
+            progress(stage, done, total)
+
+    columns = referenced_columns(questions, banner_config)
+    rim_targets = parse_rim_targets(job["rim_targets"]) if job["rim_targets"] else None
+    if job["weight_var"]:
+        columns.add(job["weight_var"])
+    elif rim_targets:
+        columns.update(rim_targets)
+
+    now = datetime.now()
+    run_info = {"client_name": job["client_name"], "study_name": job["study_name"],
+                "month": job["month"] or now.strftime("%B"), "year": job["year"] or now.year}
+    summary = {}
+    run_weight = job["weight_var"]
+    report("loading")
+    if not job["streaming"]:
+        with profiler.span("load data"):
+            data, cleaning_report = load_data(job["data_file"], columns=columns, use_cache=job["use_data_cache"],
+                                              profiler=profiler)
+        if rim_targets:
+            with profiler.span("rim weighting"):
+                weights, weight_report = rim_weights(data, rim_targets)
+            data = data.assign(rim_weight=weights)
+            run_weight = "rim_weight"
+            summary["rim_weights"] = weight_report
+        elif run_weight and run_weight not in data.columns:
+            raise JobError(f"Weight variable '{run_weight}' not found in the data")
+
+    table_options = {"weight_var": run_weight, "sig_level": job["sig_level"], "extra_stats": job["extra_stats"]}
+    result_cache = ResultCache() if job["reuse_tables"] and not (job["streaming"] or job["cube"]) else None
+    if job["streaming"]:
+        reports = []
+
+        def prepared_chunks():
+            for chunk, chunk_report in iter_prepared_chunks(job["data_file"], columns, int(job["chunk_rows"]),
+                                                            profiler):
+                reports.append(chunk_report)
+                report("reading", len(reports))
+                yield chunk
+
+        if job["cube"]:
+            partials = chunk_partials(prepared_chunks(), questions, banner_config, table_options=table_options,
+                                      profiler=profiler, **run_info)
+        else:
+            tables = iter_chunked_tables(prepared_chunks(), questions, banner_config, table_options=table_options,
+                                         profiler=profiler, **run_info)
+    elif job["cube"]:
+        with profiler.span("aggregate tables"):
+            partials = question_partials(data, questions, banner_config, table_options=table_options,
+                                         profiler=profiler, **run_info)
+    else:
+        tables = iter_tables(data, questions, banner_config, workers=job["workers"], result_cache=result_cache,
+                             table_options=table_options, profiler=profiler, **run_info)
+
+    if job["cube"]:
+        cube = ResultCube(questions, banner_config, run_info, partials, table_options)
+        if os.path.dirname(job["cube"]):
+            os.makedirs(os.path.dirname(job["cube"]), exist_ok=True)
+        with profiler.span("save result cube"):
+            cube.save(job["cube"])
+        summary["cube"] = job["cube"]
+        tables = cube.iter_tables(profiler=profiler)
+
+    if os.path.dirname(job["output"]):
+        os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+    writer_options = {"layout": job["xlsx_layout"]} if job["output_format"] == "xlsx" else {}
+    report("tables", 0)
+    # closing() shuts a process pool down at once when the run stops early
+    with profiler.span("generate and write tables"), closing(tables):
+        with open_table_writer(job["output"], job["output_format"], **writer_options) as writer:
+            for full_table in tables:
+                with profiler.span(f"Table {writer.tables + 1}", "write", table=writer.tables + 1):
+                    writer.write_table(full_table)
+                report("tables", writer.tables)
+
+    if job["streaming"]:
+        cleaning_report = combine_cleaning_reports(reports)
+    coerced = cleaning_report[cleaning_report["coerced_to_na"] > 0]
+    summary.update(tables=writer.tables, rows=writer.rows,
+                   coerced_columns={column: int(n) for column, n in coerced["coerced_to_na"].items()})
+    if result_cache is not None:
+        summary.update(reused_tables=result_cache.hits, computed_tables=result_cache.misses)
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def _run_job(job):
+    """``run_study`` with its outcome, including any error, as a JSON-ready summary."""
+    start = time.perf_counter()
+    result = {"study_name": job["study_name"], "data_file": job["data_file"], "output": job["output"]}
+    try:
+        result.update(status="ok", **run_study(job))
+    except Exception as e:
+        result.update(status="failed", error_type=type(e).__name__, error=str(e),
+                      seconds=round(time.perf_counter() - start, 3))
+    return result
+
+
+def run_jobs(jobs, max_jobs=1, on_result=None):
+    """
+    Run every study, at most ``max_jobs`` at a time; returns their summaries in job order.
+
+    Studies run in separate processes when ``max_jobs > 1``. Each study may
+    also spread its tables over ``workers`` processes of its own, so a run
+    uses up to ``max_jobs`` x ``workers`` processes. ``on_result`` is called
+    with each summary as its study finishes.
+    """
+    results = [None] * len(jobs)
+    if max_jobs <= 1 or len(jobs) <= 1:
+        for i, job in enumerate(jobs):
+            results[i] = _run_job(job)
+            if on_result is not None:
+                on_result(results[i])
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(max_jobs, len(jobs)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(_run_job, job): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if on_result is not None:
+                on_result(results[futures[future]])
+    return results
+
+
+def run_summary(results, started, seconds):
+    failed = sum(result["status"] != "ok" for result in results)
+    return {"started": started, "seconds": round(seconds, 3), "studies": len(results),
+            "succeeded": len(results) - failed, "failed": failed, "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate output tables for the studies in a job file")
+    parser.add_argument("job_file", help="JSON job file listing the studies to run")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="studies to run at the same time (default 1)")
+    parser.add_argument("--summary", help="write the JSON run summary to this file instead of stdout")
+    parser.add_argument("--quiet", "-q", action="store_true", help="do not report each study on stderr")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_job_file(args.job_file)
+    except JobError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    def report(result):
+        if not args.quiet:
+            detail = result["output"] if result["status"] == "ok" else f"{result['error_type']}: {result['error']}"
+            print(f"[{result['status']}] {result['study_name']} ({result['seconds']}s) {detail}", file=sys.stderr)
+
+    started = datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+    results = run_jobs(jobs, max(1, args.jobs), on_result=report)
+    summary = json.dumps(run_summary(results, started, time.perf_counter() - start), indent=2, default=str)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(summary)
+    else:
+        print(summary)
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
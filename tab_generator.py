@@ -1,6 +1,14 @@
 
 import pandas as pd
 import numpy as np
+from dataset import DatasetContext
+from crosstab_engine import GridEngine, MultiResponseEngine, SingleSelectEngine
+from profiling import NULL_PROFILER
+from sig_testing import mean_tests, proportion_tests, significance_letters
+from stats_engine import STAT_LABELS, StatsAggregate, parse_extra_stats
+from table_partials import GridPartial, TablePartial
+from table_writer import NumberCell
+from weighting import weight_vector
 
 
 #make data type dymamic (csv,sav,excel) ----->added
@@ -8,20 +16,120 @@ import numpy as np
 #use datamap to create tabs
 
 
-def clean_blank_and_convert_to_numeric(first_data):    
-    exclude_cols = ['date','markers','record','uuid']
-    cols_to_convert = first_data.columns.difference(exclude_cols)
-    first_data[cols_to_convert] = first_data[cols_to_convert].replace({' ':np.nan,'':np.nan})
-    first_data[cols_to_convert] = first_data[cols_to_convert].apply(pd.to_numeric,errors='coerce')
-    return first_data
+EXCLUDE_FROM_CLEANING = ['date','markers','record','uuid']
+INTEGER_DTYPES = [("Int8", np.int8), ("Int16", np.int16), ("Int32", np.int32), ("Int64", np.int64)]
+
+
+def _integer_array(values, missing, lo, hi):
+    """Smallest nullable integer array that holds ``values`` (float64 or int) exactly."""
+    for name, np_type in INTEGER_DTYPES:
+        info = np.iinfo(np_type)
+        if info.min <= lo and hi <= info.max:
+            data = np.where(missing, 0, values).astype(np_type)
+            return pd.arrays.IntegerArray(data, missing)
+    return None
+
+
+def compact_numeric(series):
+    """Downcast a numeric Series to the smallest nullable Int/Float dtype that fits every value."""
+    if pd.api.types.is_integer_dtype(series.dtype):
+        missing = series.isna().to_numpy()
+        values = series.to_numpy(dtype=np.int64, na_value=0)
+        lo, hi = (values[~missing].min(), values[~missing].max()) if (~missing).any() else (0, 0)
+        return pd.Series(_integer_array(values, missing, lo, hi), index=series.index, name=series.name)
+
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    missing = np.isnan(values)
+    present = values[~missing]
+    if np.isfinite(present).all() and (present == np.floor(present)).all():
+        lo, hi = (present.min(), present.max()) if present.size else (0, 0)
+        if -2**63 <= lo and hi < 2**63:
+            return pd.Series(_integer_array(values, missing, lo, hi), index=series.index, name=series.name)
+    as_float32 = values.astype(np.float32)
+    if np.array_equal(as_float32.astype(np.float64), values, equal_nan=True):
+        return pd.Series(pd.arrays.FloatingArray(as_float32, missing), index=series.index, name=series.name)
+    return pd.Series(pd.arrays.FloatingArray(values, missing), index=series.index, name=series.name)
+
+
+def clean_survey_data(first_data, exclude_cols=EXCLUDE_FROM_CLEANING):
+    """
+    Turn blanks into NA, convert answers to numbers and store them compactly.
+
+    Returns ``(data, report)``. Numeric columns skip string parsing and are only
+    downcast; text columns have blank/whitespace cells masked in one pass and
+    are parsed with ``pd.to_numeric``. Columns where no non-blank value is
+    numeric are left untouched. ``report`` has one row per column with the
+    dtype before/after, blank count and how many values were lost to coercion.
+    """
+    columns = {}
+    report = []
+    for col in first_data.columns:
+        series = first_data[col]
+        dtype_before = str(series.dtype)
+        blanks = coerced = 0
+        text_only = False
+        if col in exclude_cols or pd.api.types.is_bool_dtype(series.dtype):
+            pass
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            blanks = int(series.isna().sum())
+            series = compact_numeric(series)
+        elif pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+            as_text = series.astype(object)
+            try:
+                blank = as_text.str.strip().eq("").to_numpy(dtype=bool, na_value=False)
+            except AttributeError:
+                # No strings at all in this column
+                blank = np.zeros(len(series), dtype=bool)
+            blank = blank | series.isna().to_numpy()
+            numbers = pd.to_numeric(as_text.where(~blank), errors='coerce')
+            lost = numbers.isna().to_numpy() & ~blank
+            blanks = int(blank.sum())
+            if lost.sum() and lost.sum() == (~blank).sum():
+                text_only = True
+            else:
+                coerced = int(lost.sum())
+                series = compact_numeric(numbers)
+        columns[col] = series
+        report.append({"column": col, "dtype_before": dtype_before, "dtype_after": str(series.dtype),
+                       "blanks": blanks, "coerced_to_na": coerced, "text_only": text_only})
+
+    cleaned = pd.DataFrame(columns, index=first_data.index, copy=False)
+    cleaned.columns = first_data.columns
+    return cleaned, pd.DataFrame(report, columns=["column", "dtype_before", "dtype_after", "blanks",
+                                                   "coerced_to_na", "text_only"]).set_index("column")
+
+
+def clean_blank_and_convert_to_numeric(first_data):
+    """Compact-dtype cleaning without the coercion report (see ``clean_survey_data``)."""
+    return clean_survey_data(first_data)[0]
 
 import pandas as pd
 
+
+def grid_item_labels(question_var, item_labels=None):
+    """Row labels of a grid's items: ``item_labels`` where given, else the item variables."""
+    items = question_var if isinstance(question_var, list) else [question_var]
+    labels = list(item_labels or [])
+    return [str(labels[i]) if i < len(labels) and labels[i] else str(item) for i, item in enumerate(items)]
+
+
 class TabGenerator:
+    # "vectorized" counts every banner in one pass where the question shape allows it
+    # and falls back to the per-banner loop otherwise; "legacy" always loops.
+    ENGINES = ("vectorized", "legacy")
+
     def __init__(self, first_data, question_var, question_text, base_text, display_structure,
                  table_number, study_name, client_name, month, year, question_type, mean_var,
-                 filter_condition=None, show_sigma=True):
-        self.df = first_data.copy()
+                 filter_condition=None, show_sigma=True, mask_cache=None, engine="vectorized",
+                 weight_var=None, sig_level=None, extra_stats=None, profiler=None, item_labels=None, decimals=None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown crosstab engine: {engine!r} (expected one of {', '.join(self.ENGINES)})")
+        # Reference the shared dataset instead of copying it for every table
+        if isinstance(first_data, DatasetContext):
+            self.data = first_data
+        else:
+            self.data = DatasetContext(first_data, mask_cache)
+        self.df = self.data.df
         self.question_var = question_var
         self.question_text = question_text
         self.base_text = base_text
@@ -36,131 +144,475 @@ class TabGenerator:
         self.month = month
         self.year = year
         self.question_type = question_type
+        # Grid questions: one item variable per row of the summary, all answered on the display structure's scale
+        self.grid_items = question_var if isinstance(question_var, list) else [question_var]
+        self.item_labels = grid_item_labels(question_var, item_labels)
         self.mean = mean_var
         self.filter_condition = filter_condition
         self.show_sigma = show_sigma
+        self.masks = self.data.masks
+        self.engine = engine
+        self.weight_var = weight_var or None
+        # Confidence level for column significance letters (e.g. 0.95); None turns testing off
+        self.sig_level = sig_level
+        # Stat rows shown after the median, e.g. ["min", "p25", "p75", "max"]
+        self.extra_stats = parse_extra_stats(extra_stats)
+        # Decimal places of percentages, stats and weighted figures
+        self.decimals = 2 if decimals is None else int(decimals)
+        # Times the steps of each table (and each legacy-engine banner) when the run is profiled
+        self.profiler = profiler or NULL_PROFILER
+
+    def _table_columns(self, display_structure):
+        """Columns the counts read: question variable(s) and code/net payloads (stats read the mean variable)."""
+        columns = list(self.question_var) if isinstance(self.question_var, list) else [self.question_var]
+        for row_type, label, payload in display_structure:
+            if isinstance(payload, str):
+                columns.append(payload)
+            elif isinstance(payload, list):
+                columns.extend(p for p in payload if isinstance(p, str))
+        return columns
 
     def _get_multi_columns(self):
         if self.multi_vars:
             return self.multi_vars
         return [k for k in self.codes_dict.keys() if isinstance(k, str)]
 
-    def calculate_sigma_and_no_answer(self, df_filtered, base_n, total_count, question_type):
+    def _weights(self):
+        """Respondent weights for the whole dataset, or None when the table is unweighted."""
+        if self.weight_var is None:
+            return None
+        return weight_vector(self.data.column(self.weight_var))
+
+    @staticmethod
+    def _tally(hits, weights=None):
+        """Number of True ``hits``, or their summed weight when ``weights`` is given."""
+        if weights is None:
+            return int(hits.sum())
+        return float(weights[hits.to_numpy(dtype=bool, na_value=False)].sum())
+
+    def calculate_sigma_and_no_answer(self, df_filtered, base_n, total_count, question_type, no_answer_count=None,
+                                      weights=None):
         result = {}
-        if base_n == 0:
-            no_answer_count = 0
-        elif question_type == "single":
-            no_answer_count = max(0, base_n - int(total_count))
-        elif question_type == "multi":
-            multi_cols = self._get_multi_columns()
-            if not multi_cols:
-                answered_mask = df_filtered.notna().any(axis=1)
+        # The vectorized engines count No Answer themselves and pass it in
+        if no_answer_count is None:
+            if base_n == 0:
+                no_answer_count = 0
+            elif question_type in ("single", "grid"):
+                no_answer_count = max(0, base_n - total_count)
+            elif question_type == "multi":
+                multi_cols = self._get_multi_columns()
+                if not multi_cols:
+                    answered_mask = df_filtered.notna().any(axis=1)
+                else:
+                    answered_mask = (df_filtered[multi_cols] == 1).any(axis=1)
+                no_answer_count = base_n - self._tally(answered_mask, weights)
             else:
-                answered_mask = (df_filtered[multi_cols] == 1).any(axis=1)
-            no_answer_count = int(base_n - int(answered_mask.sum()))
-
-        else:
-            no_answer_count = 0
+                no_answer_count = 0
 
-        no_answer_percent = (no_answer_count / base_n) * 100 if base_n > 0 else 0
-        if no_answer_count > 0:
-            result["No Answer"] = [no_answer_count, f"{no_answer_percent:.2f}%"]
+        # Weighted counts carry float rounding, so ignore anything below display precision
+        if no_answer_count > 1e-9:
+            result["No Answer"] = self._count_cell(no_answer_count, base_n)
 
-        sigma_count = total_count + no_answer_count
-        sigma_percent = (sigma_count / base_n) * 100 if base_n > 0 else 0
-        result["Sigma"] = [sigma_count, f"{sigma_percent:.2f}%"]
+        result["Sigma"] = self._count_cell(total_count + max(no_answer_count, 0), base_n)
         return result
     
-    def calculate_stats(self, df_filtered):
-        result = {}
-        if self.mean and self.mean in df_filtered.columns:
-            mean = df_filtered[self.mean].mean()
-            std_val = df_filtered[self.mean].std()
-            sem_val = df_filtered[self.mean].sem()
-            median_val = df_filtered[self.mean].median()
-            result["Mean"] = [f"{mean:.2f}", ""]
-            result["Std.err"] = [f"{std_val:.2f}", ""]
-            result["Std.dev"] = [f"{sem_val:.2f}", ""]
-            result["Median"] = [f"{median_val:.2f}", ""]
-        return result
+    def _table_stats(self, banners, weights=None):
+        """The mean variable summarised under every banner in one pass (None without a mean variable)."""
+        if not (self.mean and self.data.has_column(self.mean)):
+            return None
+        # Compact nullable columns are summarised in float64, as before cleaning downcast them
+        values = self.data.column(self.mean).to_numpy(dtype="float64", na_value=np.nan)
+        return StatsAggregate.from_values(values, banners, weights)
 
-    def generate_crosstab(self, banner_segments, display_structure=None):
-        if display_structure is None:
-            display_structure = self.display_structure
+    def _stat_labels(self):
+        return STAT_LABELS + [label for label, _ in self.extra_stats]
+
+    def _add_stats(self, banner_segments, banner_data, stats):
+        """
+        Add the mean variable's stat rows to every banner's cells.
+
+        Returns the per-banner ``(means, stds, effective_ns)`` the mean
+        significance test needs, or None when the table has no mean variable.
+        """
+        if stats is None:
+            return None
+        means, stds, sems, medians, effective = stats.summary()
+        columns = [means, stds, sems, medians]
+        if self.extra_stats:
+            columns.extend(stats.quantiles([q for _, q in self.extra_stats]).T)
+        for b, seg in enumerate(banner_segments):
+            banner_data[seg["id"]].update({label: [self._number(values[b]), ""]
+                                           for label, values in zip(self._stat_labels(), columns)})
+        return means, stds, effective
+
+    def _count_cell(self, count, base_n):
+        pct = (count / base_n * 100) if base_n > 0 else 0
+        return [count, NumberCell(pct, self.decimals, percent=True)]
+
+    def _number(self, value):
+        return NumberCell(value, self.decimals)
+
+    def _display_count(self, value):
+        """Weighted counts are shown to ``decimals`` places; everything else as it is."""
+        if self.weight_var is not None and isinstance(value, (int, float)):
+            return self._number(value)
+        return value
+
+    def _add_sigma(self, cells, df_filtered, base_n, total_count, no_answer_count=None, weights=None):
+        if self.show_sigma:
+            cells.update(self.calculate_sigma_and_no_answer(df_filtered, base_n, total_count, self.question_type,
+                                                            no_answer_count, weights))
+
+    def _banner_layout(self, banner_segments):
+        return self.masks.layout(self.filter_condition, banner_segments)
+
+    def _use_vectorized_engine(self, display_structure):
+        if self.engine != "vectorized":
+            return False
+        if self.question_type == "single":
+            return SingleSelectEngine.supports(self.question_var, display_structure)
+        if self.question_type == "multi":
+            return MultiResponseEngine.supports(display_structure, self._get_multi_columns())
+        return False
+
+    def _engine_counts(self, df_table, banner_segments, display_structure, banners, weights, pct_bases):
+        """``(rows, code_total, no_answer)`` from the vectorized engine for this question type."""
+        if self.question_type == "single":
+            rows, code_total = SingleSelectEngine(display_structure).row_counts(df_table[self.question_var], banners,
+                                                                               weights)
+            return rows, code_total, None
+        if self.question_type == "multi":
+            engine = MultiResponseEngine(display_structure, self._get_multi_columns())
+            if weights is None:
+                packed = np.vstack([self.masks.packed(self.filter_condition, banner.get("condition"))
+                                    for banner in banner_segments])
+                return engine.row_counts(df_table, packed, pct_bases)
+            return engine.weighted_row_counts(df_table, banners, weights, pct_bases)
+        # Other question types only report Sigma and the mean variable's stats
+        return {}, np.zeros(banners.n_banners, dtype=np.int64 if weights is None else np.float64), None
+
+    def _vectorized_banner_data(self, df_table, banner_segments, display_structure):
+        """
+        All banners x all rows in one pass: single-select questions are factorized
+        into a code count matrix, multi-select questions are counted as bitsets
+        (or, when weighted, as weighted selection sums per banner).
+        """
+        weights = self._weights()
+        banners = self._banner_layout(banner_segments)
+        bases = banners.sums()
+        # Percentages are taken on the weighted base when the table is weighted
+        pct_bases = bases if weights is None else banners.sums(weights)
+        number = int if weights is None else float
+        rows, code_total, no_answer = self._engine_counts(df_table, banner_segments, display_structure, banners,
+                                                          weights, pct_bases)
 
         banner_data = {}
         base_ns = {}
-        labels = [label for _, label, _ in display_structure]
-        used_labels = set(labels)
+        for b, banner in enumerate(banner_segments):
+            base_n = number(pct_bases[b])
+            cells = {}
+            for pos, (row_type, label_text, payload) in enumerate(display_structure):
+                if pos in rows:
+                    cells[label_text] = self._count_cell(number(rows[pos][b]), base_n)
+            self._add_sigma(cells, None, base_n, number(code_total[b]),
+                            None if no_answer is None else number(no_answer[b]))
+            banner_data[banner["id"]] = cells
+            base_ns[banner["id"]] = int(bases[b])
+        return banner_data, base_ns
 
+    def _legacy_banner_data(self, df_table, banner_segments, display_structure):
+        weights = self._weights()
+        banner_data = {}
+        base_ns = {}
         for banner in banner_segments:
             condition = banner.get("condition")
             banner_id = banner["id"]
+            with self._banner_span(banner_id):
+                mask = self.masks.combined(self.filter_condition, condition)
+                df_filtered = df_table[mask]
+                w = None if weights is None else weights[mask]
 
-            if self.filter_condition:
-                df_base_filter = self.df.query(self.filter_condition)
-            else:
-                df_base_filter = self.df
+                base_ns[banner_id] = len(df_filtered)
+                base_n = len(df_filtered) if w is None else float(w.sum())
+                banner_data[banner_id] = {}
+                total_count = 0
+
+                for row_type, label_text, payload in display_structure:
+                    if self.question_type == "single":
+                        if row_type == "code":
+                            code = payload
+                            count = self._tally(df_filtered[self.question_var] == code, w)
+                            banner_data[banner_id][label_text] = self._count_cell(count, base_n)
+                            total_count += count
+                        elif row_type == "net" and isinstance(payload, list):
+                            count = self._tally(df_filtered[self.question_var].isin(payload), w)
+                            banner_data[banner_id][label_text] = self._count_cell(count, base_n)
+
+                    elif self.question_type == "multi":
+                        if row_type == "code":
+                            col = payload
+                            count = self._tally(df_filtered[col] == 1, w) if col in df_filtered.columns else 0
+                            banner_data[banner_id][label_text] = self._count_cell(count, base_n)
+                            total_count += count
+                        elif row_type == "net" and isinstance(payload, list):
+                            # NETs count respondents who picked any of the items, not mentions
+                            present = [c for c in payload if c in df_filtered.columns]
+                            count = self._tally((df_filtered[present] == 1).any(axis=1), w) if present else 0
+                            banner_data[banner_id][label_text] = self._count_cell(count, base_n)
+
+                self._add_sigma(banner_data[banner_id], df_filtered, base_n, total_count, weights=w)
+        return banner_data, base_ns
 
-            if condition:
-                df_filtered = df_base_filter.query(condition)
+    def _banner_span(self, banner_id):
+        """Span around one banner of a legacy-engine table, recorded only for per-banner profiling."""
+        if not self.profiler.banners:
+            return NULL_PROFILER.span(banner_id)
+        return self.profiler.span(f"Banner {banner_id}", "banner", table=self.table_number, banner=banner_id)
+
+    def _weight_totals(self, banner_segments):
+        """Per-banner weighted and Kish effective bases."""
+        return self._banner_layout(banner_segments).weight_totals(self._weights())
+
+    def _significance(self, banner_segments, banner_data, base_ns, display_structure, used_labels,
+                      weight_totals=None, mean_summaries=None):
+        """
+        Significance letters per row label: each cell lists the banners it is
+        significantly higher than. Column proportions are z-tested over the
+        whole rows x banners count matrix at once and the mean row is t-tested.
+        """
+        letters = [seg["id"] for seg in banner_segments]
+        labels = list(dict.fromkeys(label for _, label, _ in display_structure))
+        if weight_totals is None:
+            bases = [base_ns[seg["id"]] for seg in banner_segments]
+            effective = None
+        else:
+            bases, effective = weight_totals
+
+        counts = np.array([[banner_data[seg["id"]].get(label, [0, ""])[0] for seg in banner_segments]
+                           for label in labels], dtype=np.float64).reshape(len(labels), len(banner_segments))
+        sig = proportion_tests(counts, bases, self.sig_level, effective_bases=effective)
+        result = dict(zip(labels, significance_letters(sig, letters).tolist()))
+        if "Mean" in used_labels and mean_summaries is not None:
+            means, stds, ns = mean_summaries
+            result["Mean"] = significance_letters(mean_tests(means, stds, ns, self.sig_level), letters).tolist()
+        return result
+
+    def generate_crosstab(self, banner_segments, display_structure=None):
+        if display_structure is None:
+            display_structure = self.display_structure
+        if self.question_type == "grid":
+            # A grid's crosstab is its summary table
+            return self.generate_tables(banner_segments, display_structure)[0]
+
+        profiler, table = self.profiler, self.table_number
+        with profiler.span("count", "step", table=table):
+            df_table = self.data.frame(self._table_columns(display_structure))
+            if self._use_vectorized_engine(display_structure):
+                banner_data, base_ns = self._vectorized_banner_data(df_table, banner_segments, display_structure)
             else:
-                df_filtered = df_base_filter
-
-            base_n = len(df_filtered)
-            base_ns[banner_id] = base_n
-            banner_data[banner_id] = {}
-            total_count = 0
-
-            for row_type, label_text, payload in display_structure:
-                if self.question_type == "single":
-                    if row_type == "code":
-                        code = payload
-                        count = int((df_filtered[self.question_var] == code).sum())
-                        pct = (count / base_n * 100) if base_n > 0 else 0
-                        banner_data[banner_id][label_text] = [count, f"{pct:.2f}%"]
-                        total_count += count
-                    elif row_type == "net" and isinstance(payload, list):
-                        count = int(df_filtered[self.question_var].isin(payload).sum())
-                        pct = (count / base_n * 100) if base_n > 0 else 0
-                        banner_data[banner_id][label_text] = [count, f"{pct:.2f}%"]
-                        used_labels.add(label_text)
-
-                elif self.question_type == "multi":
-                    if row_type == "code":
-                        col = payload
-                        count = int((df_filtered[col] == 1).sum()) if col in df_filtered.columns else 0
-                        pct = (count / base_n * 100) if base_n > 0 else 0
-                        banner_data[banner_id][label_text] = [count, f"{pct:.2f}%"]
-                        total_count += count
-                    elif row_type == "net" and isinstance(payload, list):
-                        present = [c for c in payload if c in df_filtered.columns]
-                        count = int(df_filtered[present].sum().sum()) if present else 0
-                        pct = (count / base_n * 100) if base_n > 0 else 0
-                        banner_data[banner_id][label_text] = [count, f"{pct:.2f}%"]
-                        used_labels.add(label_text)
+                banner_data, base_ns = self._legacy_banner_data(df_table, banner_segments, display_structure)
+
+        with profiler.span("stats", "step", table=table):
+            weight_totals = self._weight_totals(banner_segments) if self.weight_var is not None else None
+            stats = self._table_stats(self._banner_layout(banner_segments), self._weights())
+            mean_summaries = self._add_stats(banner_segments, banner_data, stats)
+        with profiler.span("render", "step", table=table):
+            return self._render(banner_segments, display_structure, banner_data, base_ns, weight_totals,
+                                mean_summaries)
+
+    def generate_tables(self, banner_segments, display_structure=None):
+        """
+        Every table this question produces: its crosstab or, for a grid, the
+        summary followed by one table per item, all from one counting pass.
+        """
+        if display_structure is None:
+            display_structure = self.display_structure
+        if self.question_type != "grid":
+            return [self.generate_crosstab(banner_segments, display_structure)]
+
+        with self.profiler.span("count", "step", table=self.table_number):
+            partial = self._grid_partial(banner_segments, display_structure)
+        with self.profiler.span("render", "step", table=self.table_number):
+            return self.render_tables(partial, banner_segments, display_structure)
+
+    def _grid_partial(self, banner_segments, display_structure):
+        """The grid's ``GridPartial``: every item x code x banner count, plus bases and stats."""
+        if not GridEngine.supports(self.question_var, display_structure):
+            raise ValueError(f"Grid question {self.question_var!r} needs codes that can be compared with ==")
+        engine = GridEngine(display_structure)
+        df_table = self.data.frame(self._table_columns(display_structure))
+        weights = self._weights()
+        banners = self._banner_layout(banner_segments)
+        weight_totals = None if weights is None else np.column_stack([banners.sums(weights),
+                                                                      banners.sums(weights ** 2)])
+        if self.engine == "vectorized":
+            counts = engine.item_counts(df_table, self.grid_items, banners, weights)
+        else:
+            counts = self._legacy_grid_counts(df_table, banner_segments, engine, weights)
+        return GridPartial(banners.sums(), weight_totals, counts, self._table_stats(banners, weights))
+
+    def _legacy_grid_counts(self, df_table, banner_segments, engine, weights):
+        """The grid's count cube banner by banner and item by item, comparing every code with ``==``."""
+        counts = np.zeros((len(banner_segments), len(self.grid_items), len(engine.codes) + 1),
+                          dtype=np.int64 if weights is None else np.float64)
+        for b, banner in enumerate(banner_segments):
+            with self._banner_span(banner["id"]):
+                mask = self.masks.combined(self.filter_condition, banner.get("condition"))
+                df_filtered = df_table[mask]
+                w = None if weights is None else weights[mask]
+                for i, item in enumerate(self.grid_items):
+                    if item in df_filtered.columns:
+                        for code, slot in engine.positions.items():
+                            counts[b, i, slot] = self._tally(df_filtered[item] == code, w)
+        return counts
+
+    def partial(self, banner_segments, display_structure=None):
+        """
+        Mergeable aggregates of this table over the respondents in this
+        generator's data, typically one chunk of a file too large for memory.
+        Merge the partials of every chunk and pass them to ``render_tables``.
+        """
+        if display_structure is None:
+            display_structure = self.display_structure
+        if self.question_type == "grid":
+            return self._grid_partial(banner_segments, display_structure)
+        if self.question_type in ("single", "multi") and not self._use_vectorized_engine(display_structure):
+            raise ValueError(f"Question {self.question_var!r} cannot be tabulated from partial aggregates "
+                             f"(streaming mode or a result cube)")
 
+        df_table = self.data.frame(self._table_columns(display_structure))
+        weights = self._weights()
+        banners = self._banner_layout(banner_segments)
+        bases = banners.sums()
+        weight_totals = None if weights is None else np.column_stack([banners.sums(weights),
+                                                                      banners.sums(weights ** 2)])
+        pct_bases = bases if weights is None else weight_totals[:, 0]
+        rows, code_total, no_answer = self._engine_counts(df_table, banner_segments, display_structure, banners,
+                                                          weights, pct_bases)
+        stats = self._table_stats(banners, weights)
+        return TablePartial(bases, weight_totals, rows, code_total, no_answer, stats)
+
+    def render_partial(self, partial, banner_segments, display_structure=None):
+        """Crosstab from merged ``partial`` aggregates, laid out exactly like ``generate_crosstab``."""
+        if display_structure is None:
+            display_structure = self.display_structure
+        weighted = partial.weight_totals is not None
+        number = float if weighted else int
+        pct_bases = partial.weight_totals[:, 0] if weighted else partial.bases
+
+        banner_data = {}
+        base_ns = {}
+        for b, banner in enumerate(banner_segments):
+            base_n = number(pct_bases[b])
+            cells = {}
+            for pos, (row_type, label_text, payload) in enumerate(display_structure):
+                if pos in partial.rows:
+                    cells[label_text] = self._count_cell(number(partial.rows[pos][b]), base_n)
             if self.show_sigma:
-                sigma_data = self.calculate_sigma_and_no_answer(df_filtered, base_n, total_count, self.question_type)
-                for lbl, vals in sigma_data.items():
-                    banner_data[banner_id][lbl] = vals
-                    used_labels.add(lbl)
-            stats_data = self.calculate_stats(df_filtered)
-            for lbl, vals in stats_data.items():
-                banner_data[banner_id][lbl] = vals
-                used_labels.add(lbl)
+                no_answer = None if partial.no_answer is None else number(partial.no_answer[b])
+                cells.update(self.calculate_sigma_and_no_answer(None, base_n, number(partial.code_total[b]),
+                                                                self.question_type, no_answer))
+            banner_data[banner["id"]] = cells
+            base_ns[banner["id"]] = int(partial.bases[b])
+
+        mean_summaries = self._add_stats(banner_segments, banner_data, partial.stats)
+        return self._render(banner_segments, display_structure, banner_data, base_ns,
+                            self._partial_weight_totals(partial), mean_summaries)
+
+    @staticmethod
+    def _partial_weight_totals(partial):
+        """Per-banner weighted and effective bases of a weighted partial (None when unweighted)."""
+        if partial.weight_totals is None:
+            return None
+        sums, squares = partial.weight_totals[:, 0], partial.weight_totals[:, 1]
+        effective = np.divide(sums ** 2, squares, out=np.zeros_like(sums), where=squares > 0)
+        return sums.tolist(), effective.tolist()
+
+    def render_tables(self, partial, banner_segments, display_structure=None):
+        """Every table from merged partial aggregates, in the order ``generate_tables`` returns them."""
+        if display_structure is None:
+            display_structure = self.display_structure
+        if not isinstance(partial, GridPartial):
+            return [self.render_partial(partial, banner_segments, display_structure)]
+
+        engine = GridEngine(display_structure)
+        tables = [self._render_grid_summary(partial, banner_segments, engine)]
+        for i in range(len(self.grid_items)):
+            rows, code_total = engine.rows_from_counts(partial.counts[:, i, :])
+            item = TablePartial(partial.bases, partial.weight_totals, rows, code_total, stats=partial.stats)
+            tables.append(self.render_partial(item, banner_segments, display_structure))
+        return tables
+
+    def _render_grid_summary(self, partial, banner_segments, engine):
+        """
+        The grid summary: items as rows and, under every banner, a column per
+        NET (percentage of the banner base, as in the item tables) and the mean
+        of the numeric code rows among respondents who gave one of them.
+        """
+        weighted = partial.weight_totals is not None
+        number = float if weighted else int
+        pct_bases = partial.weight_totals[:, 0] if weighted else partial.bases
+        counts = partial.counts
+
+        names, measures = [], []
+        for row_type, label_text, payload in engine.display_structure:
+            if row_type == "net" and isinstance(payload, list):
+                hits = counts[..., engine.net_slots(payload)].sum(axis=-1)
+                names.append(label_text)
+                measures.append([[self._count_cell(number(hits[b, i]), number(pct_bases[b]))[1]
+                                  for i in range(counts.shape[1])] for b in range(counts.shape[0])])
+        # Equal codes share a slot, so each slot enters the mean once
+        scale = {engine.positions[payload]: float(payload) for row_type, _, payload in engine.display_structure
+                 if row_type == "code" and isinstance(payload, (int, float)) and not isinstance(payload, bool)}
+        if scale:
+            slots, values = list(scale), np.array(list(scale.values()))
+            answered = counts[..., slots].sum(axis=-1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                means = np.where(answered > 0, (counts[..., slots] @ values) / answered, np.nan)
+            names.append("Mean")
+            measures.append([[self._number(mean) for mean in banner_means] for banner_means in means])
+        if not names:
+            raise ValueError(f"Grid question {self.question_var!r} has no NET or numeric code rows to summarise")
+
+        header = ["Label"] + [f"{seg['id']} ({seg['label']}) {name}" for seg in banner_segments for name in names]
+        output = [[""] + names * len(banner_segments)]
+        output.append(["Base"] + [int(partial.bases[b]) for b in range(len(banner_segments)) for _ in names])
+        weight_totals = self._partial_weight_totals(partial)
+        if weight_totals is not None:
+            weighted_bases, effective_bases = weight_totals
+            output.append(["Weighted Base"] + [self._number(w) for w in weighted_bases for _ in names])
+            output.append(["Effective Base"] + [self._number(e) for e in effective_bases for _ in names])
+        for i, label in enumerate(self.item_labels):
+            output.append([label] + [measure[b][i] for b in range(len(banner_segments)) for measure in measures])
+        return pd.DataFrame(output, columns=header)
+
+    def _render(self, banner_segments, display_structure, banner_data, base_ns, weight_totals=None,
+                mean_summaries=None):
+        """Lay the per-banner cells out as the crosstab DataFrame."""
+        used_labels = {label for _, label, _ in display_structure}
+        for cells in banner_data.values():
+            used_labels.update(cells)
 
         final_labels = [label for _, label, _ in display_structure]
         if self.show_sigma and "No Answer" in used_labels:
             final_labels.append("No Answer")
         if self.show_sigma and "Sigma" in used_labels:
             final_labels.append("Sigma")
-        for stat in ["Mean", "Std.err", "Std.dev", "Median"]:
+        for stat in self._stat_labels():
             if stat in used_labels:
                 final_labels.append(stat)
 
+        sig_rows = {}
+        if self.sig_level is not None and banner_segments:
+            sig_rows = self._significance(banner_segments, banner_data, base_ns, display_structure, used_labels,
+                                          weight_totals, mean_summaries)
+
         header = ["Label"] + [f"{seg['id']} ({seg['label']})" for seg in banner_segments]
         output = [["Base"] + [base_ns[seg["id"]] for seg in banner_segments]]
+        if weight_totals is not None:
+            weighted_bases, effective_bases = weight_totals
+            output.append(["Weighted Base"] + [self._number(w) for w in weighted_bases])
+            output.append(["Effective Base"] + [self._number(e) for e in effective_bases])
 
         for label in final_labels:
             count_row = [label]
@@ -168,16 +620,14 @@ class TabGenerator:
             has_percent = False
             for seg in banner_segments:
                 values = banner_data[seg["id"]].get(label, [0, ""])
-                count_row.append(values[0])
+                count_row.append(self._display_count(values[0]))
                 percent_row.append(values[1])
                 if values[1]:
                     has_percent = True
             output.append(count_row)
             if has_percent:
                 output.append(percent_row)
+            if label in sig_rows and (has_percent or label == "Mean"):
+                output.append([""] + sig_rows[label])
 
         return pd.DataFrame(output, columns=header)
-
-    
-
-    
\ No newline at end of file
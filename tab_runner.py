@@ -0,0 +1,435 @@
+# tab_runner.py
+import itertools
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from dataset import DatasetContext
+from profiling import NULL_PROFILER, Profiler, question_label
+from shared_dataset import SharedDataset, attach_shared_dataset
+from tab_generator import TabGenerator, grid_item_labels
+
+# Banners used when a run does not name its own
+DEFAULT_BANNER_CONFIG = [
+    {"id": "A", "label": "Total", "condition": None},
+    {"id": "B", "label": "Gen Pop Sample", "condition": "vboost == 1"},
+    {"id": "C", "label": "MVPD Users", "condition": "hMVPD == 2"},
+    {"id": "D", "label": "vMVPD Users", "condition": "S6r1 == 1 or S6r2 == 1 or S6r3 == 1 or S6r4 == 1 or S6r5 == 1 or S6r6 == 1 or S6r7 == 1 or S6r8 == 1 or S6r9 == 1"},
+    {"id": "E", "label": "Male", "condition": "hGender == 1 and vboost == 1"},
+    {"id": "F", "label": "Female", "condition": "hGender == 2 and vboost == 1"},
+]
+
+
+def _column_reference(name):
+    """A column name as written in a banner condition, backticked unless it is a plain identifier."""
+    return name if name.isidentifier() else f"`{name}`"
+
+
+def _nest_levels(banner):
+    """The levels of a nested banner as ``[(var, [(code, label), ...]), ...]``, outermost first."""
+    levels = []
+    for level in banner["nest"]:
+        if not isinstance(level, dict) or not level.get("var") or not level.get("codes"):
+            raise ValueError(f"Every level of nested banner {banner['id']!r} needs a var and a list of codes")
+        codes = []
+        for code in level["codes"]:
+            # [code, label] pairs, or bare codes labelled with themselves
+            code, label = code if isinstance(code, list) and len(code) == 2 else (code, code)
+            if isinstance(code, (list, dict)):
+                raise ValueError(f"Invalid code {code!r} in nested banner {banner['id']!r}")
+            codes.append((code, str(label)))
+        if len({code for code, _ in codes}) != len(codes):
+            raise ValueError(f"Nested banner {banner['id']!r} lists a code of {level['var']} more than once")
+        levels.append((str(level["var"]), codes))
+    return levels
+
+
+def nest_banner_cells(banner):
+    """
+    Expand a nested banner into one banner per combination of its levels' codes.
+
+    ``{"id": "G", "label": "Gender x Age", "nest": [{"var": "hGender",
+    "codes": [[1, "Male"], [2, "Female"]]}, {"var": "hAGE", "codes": ...}]}``
+    gives cells ``G1``, ``G2``, ... labelled ``"Male / 18-34"`` and so on, the
+    outer level varying slowest. An optional ``condition`` restricts every
+    cell. The cells share the banner's id as their ``group``, so they are
+    counted together from one array of group keys instead of cell by cell.
+    """
+    if not isinstance(banner["nest"], list) or not banner["nest"]:
+        raise ValueError(f"Nested banner {banner['id']!r} needs a non-empty list of levels")
+    levels = _nest_levels(banner)
+    cells = []
+    for k, combination in enumerate(itertools.product(*(codes for _, codes in levels)), start=1):
+        terms = [f"({banner['condition']})"] if banner.get("condition") else []
+        terms += [f"{_column_reference(var)} == {code!r}" for (var, _), (code, _) in zip(levels, combination)]
+        cells.append({"id": f"{banner['id']}{k}", "label": " / ".join(label for _, label in combination),
+                      "condition": " and ".join(terms), "group": str(banner["id"])})
+    return cells
+
+
+def load_banner_config(spec=None):
+    """
+    A banner config from a list of banners, JSON text or the path of a JSON file.
+
+    Every banner needs an ``id`` and a ``label``; a missing or empty
+    ``condition`` selects every respondent. A banner with a ``nest`` list is
+    expanded into its cells (see ``nest_banner_cells``). ``None`` gives the
+    default banners. Raises ValueError when the spec is malformed.
+    """
+    if spec is None:
+        return [dict(banner) for banner in DEFAULT_BANNER_CONFIG]
+    if isinstance(spec, str):
+        try:
+            if spec.lstrip().startswith("["):
+                spec = json.loads(spec)
+            else:
+                with open(spec, "r", encoding="utf-8") as f:
+                    spec = json.load(f)
+        except OSError as e:
+            raise ValueError(f"Cannot read banner file: {e}") from e
+        except ValueError as e:
+            raise ValueError(f"Invalid banner JSON: {e}") from e
+    if not isinstance(spec, list) or not spec or not all(isinstance(b, dict) for b in spec):
+        raise ValueError("A banner config must be a non-empty list of banner objects")
+    banners = []
+    for banner in spec:
+        if not banner.get("id") or not banner.get("label"):
+            raise ValueError(f"Every banner needs an id and a label: {banner}")
+        if "nest" in banner:
+            banners.extend(nest_banner_cells(banner))
+            continue
+        cell = {"id": str(banner["id"]), "label": str(banner["label"]), "condition": banner.get("condition") or None}
+        if banner.get("group") is not None:
+            # An expanded nested banner cell, e.g. from a job file the app wrote
+            cell["group"] = str(banner["group"])
+        banners.append(cell)
+    ids = [banner["id"] for banner in banners]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Banner ids must be unique: {', '.join(ids)}")
+    return banners
+
+
+def make_tab_generator(dataset, question, table_number, client_name, study_name, month, year, table_options=None,
+                       profiler=None):
+    """
+    TabGenerator for one question.
+
+    ``table_options`` are extra TabGenerator keyword arguments applied to every
+    table of the run, such as ``weight_var`` or ``sig_level``.
+    """
+    return TabGenerator(
+        client_name=client_name,
+        study_name=study_name,
+        month=month,
+        year=year,
+        first_data=dataset,
+        question_var=question["question_var"],
+        question_text=question["question_text"],
+        base_text=question["base_text"],
+        display_structure=question["display_structure"],
+        question_type=question["question_type"],
+        table_number=table_number,
+        mean_var=question["mean_var"],
+        filter_condition=question["base_filter"],
+        show_sigma=question["show_sigma"],
+        item_labels=question.get("item_labels"),
+        profiler=profiler,
+        **(table_options or {})
+    )
+
+
+def _table_span(profiler, tg, question, table_number, **details):
+    return profiler.span(f"Table {table_number}", "table", table=table_number,
+                         question=question_label(question["question_var"]), question_type=question["question_type"],
+                         engine=tg.engine, **details)
+
+
+def build_crosstab(dataset, question, table_number, banner_config, client_name, study_name, month, year,
+                   table_options=None, profiler=None):
+    """Run one question through TabGenerator."""
+    profiler = profiler or NULL_PROFILER
+    tg = make_tab_generator(dataset, question, table_number, client_name, study_name, month, year, table_options,
+                            profiler)
+    with _table_span(profiler, tg, question, table_number):
+        return tg.generate_crosstab(banner_config, tg.display_structure)
+
+
+def build_crosstabs(dataset, question, table_number, banner_config, client_name, study_name, month, year,
+                    table_options=None, profiler=None):
+    """Every crosstab of one question (see ``question_tables``), in one TabGenerator pass."""
+    profiler = profiler or NULL_PROFILER
+    tg = make_tab_generator(dataset, question, table_number, client_name, study_name, month, year, table_options,
+                            profiler)
+    with _table_span(profiler, tg, question, table_number):
+        return tg.generate_tables(banner_config, tg.display_structure)
+
+
+def question_tables(question, table_number):
+    """
+    ``(table number, question)`` for every table a question produces.
+
+    Most questions give one table. A grid gives its summary as table ``n``
+    and then one table per item, numbered ``n.1``, ``n.2``, ..., each titled
+    with the question text and the item label.
+    """
+    if question["question_type"] != "grid":
+        return [(table_number, question)]
+    text = question["question_text"]
+    tables = [(table_number, {**question, "question_text": f"{text} - Summary"})]
+    for k, label in enumerate(grid_item_labels(question["question_var"], question.get("item_labels")), start=1):
+        tables.append((f"{table_number}.{k}", {**question, "question_text": f"{text} - {label}"}))
+    return tables
+
+
+def table_count(questions):
+    """Number of tables a run over ``questions`` writes."""
+    return sum(len(question_tables(question, n)) for n, question in enumerate(questions, start=1))
+
+
+def layout_table(cross_tab_df, question, table_number, banner_config, client_name, study_name, month, year):
+    """Lay a crosstab out with its metadata block and banner rows."""
+    padding = [""] * (len(cross_tab_df.columns) - 1)
+    # Grid summaries have several columns per banner; the banner heads the first of them
+    span = max(1, (len(cross_tab_df.columns) - 1) // max(1, len(banner_config)))
+
+    # Metadata rows, a spacer, then the banner label/id rows above the crosstab
+    metadata = [
+        [""],
+        ["#page"],
+        [client_name],
+        [study_name],
+        [f"{month} {year}"],
+        [f"Table {table_number}"],
+        [question["question_text"]],
+        [f"Base: {question['base_text']}"],
+        [""],
+    ]
+    banner_labels = [""] + [cell for seg in banner_config for cell in [seg["label"]] + [""] * (span - 1)]
+    banner_ids = [""] + [cell for seg in banner_config for cell in [seg["id"]] + [""] * (span - 1)]
+
+    rows = [row + padding for row in metadata] + [banner_labels, banner_ids]
+    rows.extend(cross_tab_df.astype(object).values.tolist())
+    return pd.DataFrame(rows, columns=cross_tab_df.columns, dtype=object)
+
+
+def build_table(dataset, question, table_number, banner_config, client_name, study_name, month, year,
+                table_options=None):
+    """Run one question through TabGenerator and lay it out with its metadata and banner rows."""
+    run_info = {"client_name": client_name, "study_name": study_name, "month": month, "year": year}
+    cross_tab_df = build_crosstab(dataset, question, table_number, banner_config, table_options=table_options,
+                                  **run_info)
+    return layout_table(cross_tab_df, question, table_number, banner_config, **run_info)
+
+
+# ----------------------
+# Process-pool workers
+# ----------------------
+_worker_state = {}
+
+
+def _init_worker(manifest, banner_config, run_info, table_options, profile_options=None):
+    df, shm = attach_shared_dataset(manifest)
+    dataset = DatasetContext(df)
+    # Workers of a profiled run keep their own profiler and hand its spans back with each table
+    profiler = Profiler(**profile_options) if profile_options is not None else None
+    dataset.masks.prime(banner_config, profiler=profiler)
+    _worker_state.update(shm=shm, dataset=dataset, banner_config=banner_config, run_info=run_info,
+                         table_options=table_options, profiler=profiler)
+
+
+def _crosstab_in_worker(task):
+    table_number, question = task
+    profiler = _worker_state["profiler"]
+    crosstabs = build_crosstabs(_worker_state["dataset"], question, table_number, _worker_state["banner_config"],
+                                table_options=_worker_state["table_options"], profiler=profiler,
+                                **_worker_state["run_info"])
+    return crosstabs if profiler is None else (crosstabs, profiler.drain())
+
+
+def _iter_crosstabs(dataset, tasks, banner_config, run_info, workers, table_options=None, profiler=NULL_PROFILER):
+    """Each task's list of crosstabs in order, computed serially or in a shared-memory process pool."""
+    if workers <= 1 or len(tasks) <= 1:
+        dataset.masks.prime(banner_config, [question for _, question in tasks], profiler=profiler)
+        for table_number, question in tasks:
+            yield build_crosstabs(dataset, question, table_number, banner_config, table_options=table_options,
+                                  profiler=profiler, **run_info)
+        return
+
+    workers = min(workers, len(tasks))
+    chunksize = max(1, len(tasks) // (workers * 4))
+    profile_options = {"memory": profiler.memory, "banners": profiler.banners} if profiler.enabled else None
+    with SharedDataset(dataset.df) as shared:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(shared.manifest, banner_config, run_info, table_options, profile_options),
+        )
+        try:
+            for result in pool.map(_crosstab_in_worker, tasks, chunksize=chunksize):
+                if profile_options is None:
+                    yield result
+                else:
+                    crosstabs, spans = result
+                    profiler.extend(spans)
+                    yield crosstabs
+        finally:
+            # A run stopped early (cancelled or failed) drops the tables not started yet
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_tables(data, questions, banner_config, client_name, study_name, month, year, workers=1,
+                result_cache=None, table_options=None, profiler=None):
+    """
+    Yield the full layout of every table, in table-number order (a grid
+    question yields several, see ``question_tables``).
+
+    With ``workers > 1`` questions are spread over a process pool whose workers
+    attach to ``data`` through shared memory instead of receiving a pickled copy;
+    the tables come back in the same order and with the same content as the
+    serial path. With a ``result_cache`` only questions whose config, banners
+    or underlying data changed are recomputed; the rest are read back from the
+    cache. ``table_options`` (e.g. ``{"weight_var": "wt", "sig_level": 0.95}``)
+    are passed to every TabGenerator. Banner conditions and base filters are
+    checked against the data first, so a typo fails the run before any table
+    is generated (``expressions.ExpressionError``). A ``profiler`` (see
+    ``profiling``) times every stage and table, in worker processes too.
+    """
+    profiler = profiler or NULL_PROFILER
+    run_info = {"client_name": client_name, "study_name": study_name, "month": month, "year": year}
+    dataset = data if isinstance(data, DatasetContext) else DatasetContext(data)
+    with profiler.span("validate expressions"):
+        dataset.masks.validate(banner_config, questions)
+    tasks = list(enumerate(questions, start=1))
+
+    keys = {}
+    if result_cache is not None:
+        with profiler.span("result cache keys"):
+            keys = {table_number: result_cache.key(question, banner_config, dataset, table_options)
+                    for table_number, question in tasks}
+    dirty = [(n, q) for n, q in tasks if n not in keys or keys[n] not in result_cache]
+    computed = _iter_crosstabs(dataset, dirty, banner_config, run_info, workers, table_options, profiler)
+    dirty_numbers = {n for n, _ in dirty}
+
+    try:
+        for table_number, question in tasks:
+            crosstabs = None
+            if table_number not in dirty_numbers:
+                with profiler.span(f"Table {table_number}", "table", table=table_number,
+                                   question=question_label(question["question_var"]), cached=True):
+                    crosstabs = result_cache.get(keys[table_number])
+            if crosstabs is None:
+                if table_number in dirty_numbers:
+                    crosstabs = next(computed)
+                else:
+                    # Cache entry vanished since the dirty check; compute it here
+                    crosstabs = build_crosstabs(dataset, question, table_number, banner_config,
+                                                table_options=table_options, profiler=profiler, **run_info)
+                if result_cache is not None:
+                    result_cache.put(keys[table_number], crosstabs)
+            yield from _layout_tables(crosstabs, question, table_number, banner_config, run_info, profiler)
+    finally:
+        # Also runs when the caller stops early, so a process pool shuts down right away
+        computed.close()
+    if result_cache is not None:
+        result_cache.prune()
+
+
+def _layout_tables(crosstabs, question, table_number, banner_config, run_info, profiler):
+    for cross_tab_df, (number, table_question) in zip(crosstabs, question_tables(question, table_number)):
+        with profiler.span(f"Table {number}", "layout", table=number):
+            full_table = layout_table(cross_tab_df, table_question, number, banner_config, **run_info)
+        yield full_table
+
+
+def question_partials(data, questions, banner_config, client_name, study_name, month, year, table_options=None,
+                      profiler=None):
+    """
+    Every question's mergeable aggregates over in-memory data, as ``{table number: partial}``.
+
+    The partials are what ``render_partials`` (or a saved ``result_cube.ResultCube``)
+    lays out, without going back to the respondent data.
+    """
+    profiler = profiler or NULL_PROFILER
+    run_info = {"client_name": client_name, "study_name": study_name, "month": month, "year": year}
+    dataset = data if isinstance(data, DatasetContext) else DatasetContext(data)
+    with profiler.span("validate expressions"):
+        dataset.masks.validate(banner_config, questions)
+    dataset.masks.prime(banner_config, questions, profiler=profiler)
+    partials = {}
+    for table_number, question in enumerate(questions, start=1):
+        tg = make_tab_generator(dataset, question, table_number, table_options=table_options, **run_info)
+        with _table_span(profiler, tg, question, table_number):
+            partials[table_number] = tg.partial(banner_config)
+    return partials
+
+
+def chunk_partials(chunks, questions, banner_config, client_name, study_name, month, year, table_options=None,
+                   profiler=None):
+    """
+    ``question_partials`` over a stream of data chunks, merged chunk by chunk.
+
+    ``chunks`` yields cleaned, record/uuid-indexed DataFrames (see
+    ``data_loader.iter_prepared_chunks``). Banners and filters are evaluated
+    on each chunk alone, so peak memory follows the chunk size instead of the
+    file size. Table spans of a ``profiler`` are recorded per chunk
+    (``chunk`` detail).
+    """
+    profiler = profiler or NULL_PROFILER
+    run_info = {"client_name": client_name, "study_name": study_name, "month": month, "year": year}
+    tasks = list(enumerate(questions, start=1))
+    partials = {}
+    dataset = None
+    for chunk_number, chunk in enumerate(chunks, start=1):
+        first = dataset is None
+        dataset = DatasetContext(chunk)
+        if first:
+            with profiler.span("validate expressions"):
+                dataset.masks.validate(banner_config, questions)
+        dataset.masks.prime(banner_config, questions, profiler=profiler)
+        for table_number, question in tasks:
+            tg = make_tab_generator(dataset, question, table_number, table_options=table_options, **run_info)
+            with _table_span(profiler, tg, question, table_number, chunk=chunk_number):
+                partial = tg.partial(banner_config)
+                partials[table_number] = (partials[table_number].merge(partial) if table_number in partials
+                                          else partial)
+    if dataset is None:
+        raise ValueError("The data file has no rows to tabulate")
+    return partials
+
+
+def render_partials(partials, questions, banner_config, client_name, study_name, month, year, table_options=None,
+                    profiler=None):
+    """
+    Yield the full layout of every table from ``{table number: partial}``, as ``iter_tables`` lays them out.
+
+    No respondent data is needed: the generators run on an empty frame.
+    """
+    profiler = profiler or NULL_PROFILER
+    run_info = {"client_name": client_name, "study_name": study_name, "month": month, "year": year}
+    dataset = DatasetContext(pd.DataFrame())
+    for table_number, question in enumerate(questions, start=1):
+        tg = make_tab_generator(dataset, question, table_number, table_options=table_options, **run_info)
+        with _table_span(profiler, tg, question, table_number, chunk="render"):
+            crosstabs = tg.render_tables(partials[table_number], banner_config)
+        yield from _layout_tables(crosstabs, question, table_number, banner_config, run_info, profiler)
+
+
+def iter_chunked_tables(chunks, questions, banner_config, client_name, study_name, month, year,
+                        table_options=None, profiler=None):
+    """
+    Yield the full layout of every table from a stream of data chunks.
+
+    Every table's ``TablePartial`` is merged over the chunks (see
+    ``chunk_partials``), so peak memory follows the chunk size instead of the
+    file size. The tables match ``iter_tables`` on the whole file; they are
+    yielded once the last chunk has been read. Table spans of a ``profiler``
+    are recorded per chunk (``chunk`` detail) plus once for rendering.
+    """
+    run_info = {"client_name": client_name, "study_name": study_name, "month": month, "year": year}
+    partials = chunk_partials(chunks, questions, banner_config, table_options=table_options, profiler=profiler,
+                              **run_info)
+    yield from render_partials(partials, questions, banner_config, table_options=table_options, profiler=profiler,
+                               **run_info)
@@ -0,0 +1,64 @@
+# table_partials.py
+
+
+def _add_counts(a, b):
+    return None if a is None else a + b
+
+
+class TablePartial:
+    """
+    Mergeable aggregates of one table over a slice of respondents.
+
+    Everything a crosstab needs is a per-banner sum: respondent bases,
+    weighted bases and squared weights (for the effective base), row counts,
+    the code total, No Answer and the mean variable's ``StatsAggregate``. A
+    file can therefore be tabulated chunk by chunk and the partials merged;
+    ``TabGenerator.render_partial`` turns the result into the same crosstab
+    ``generate_crosstab`` builds from the whole file in memory.
+    """
+
+    def __init__(self, bases, weight_totals, rows, code_total, no_answer=None, stats=None):
+        self.bases = bases
+        # banners x 2: sum of weights and sum of squared weights (None when unweighted)
+        self.weight_totals = weight_totals
+        self.rows = rows
+        self.code_total = code_total
+        self.no_answer = no_answer
+        self.stats = stats
+
+    def merge(self, other):
+        """Fold ``other`` (same table, other respondents) into this partial and return it."""
+        self.bases = self.bases + other.bases
+        self.weight_totals = _add_counts(self.weight_totals, other.weight_totals)
+        self.rows = {pos: counts + other.rows[pos] for pos, counts in self.rows.items()}
+        self.code_total = self.code_total + other.code_total
+        self.no_answer = _add_counts(self.no_answer, other.no_answer)
+        if self.stats is not None:
+            self.stats.merge(other.stats)
+        return self
+
+
+class GridPartial:
+    """
+    Mergeable aggregates of a ``grid`` question over a slice of respondents.
+
+    ``counts`` is the banners x items x codes cube (see
+    ``crosstab_engine.GridEngine``); every item table and the grid summary
+    are derived from it by ``TabGenerator.render_tables``. Bases, weight
+    totals and the mean variable's stats are those of ``TablePartial``.
+    """
+
+    def __init__(self, bases, weight_totals, counts, stats=None):
+        self.bases = bases
+        self.weight_totals = weight_totals
+        self.counts = counts
+        self.stats = stats
+
+    def merge(self, other):
+        """Fold ``other`` (same grid, other respondents) into this partial and return it."""
+        self.bases = self.bases + other.bases
+        self.weight_totals = _add_counts(self.weight_totals, other.weight_totals)
+        self.counts = self.counts + other.counts
+        if self.stats is not None:
+            self.stats.merge(other.stats)
+        return self
@@ -0,0 +1,242 @@
+# table_writer.py
+import csv
+import math
+import os
+
+
+class NumberCell(str):
+    """
+    A number as shown in a table (``"12.35"``, ``"12.35%"``) that keeps the
+    value it was formatted from.
+
+    It is the display string everywhere a string is expected (CSV output is
+    unchanged); ``XlsxTableWriter`` writes ``number`` as a real number with a
+    format of ``decimals`` places instead. Percentages hold the percentage
+    (0-100).
+
+    The number is first rounded to ``SIGNIFICANT_DIGITS``. Weighted sums
+    taken in a different order (a file read in chunks, merged partials) differ
+    in their last few bits, and weights with a few decimals often put a sum
+    exactly on a rounding boundary; snapped, every order shows the same value.
+    """
+
+    SIGNIFICANT_DIGITS = 12
+
+    def __new__(cls, number, decimals, percent=False):
+        number = float(f"{number:.{cls.SIGNIFICANT_DIGITS}g}")
+        self = super().__new__(cls, f"{number:.{decimals}f}{'%' if percent else ''}")
+        self.number = number
+        self.decimals = decimals
+        self.percent = percent
+        return self
+
+    def __getnewargs__(self):
+        return self.number, self.decimals, self.percent
+
+
+def _csv_value(value):
+    """Render a cell the way DataFrame.to_csv does (blank for missing values)."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value
+
+
+class CsvTableWriter:
+    """
+    Stream finished tables straight into the output CSV.
+
+    Each table's rows are appended as soon as it is computed, so memory stays
+    flat no matter how many tables a run produces. Rows go to ``<path>.part``
+    and the file is moved into place when the writer closes cleanly; a failed
+    run never leaves a truncated report behind. The output is byte-identical
+    to ``pd.concat(tables).to_csv(path, index=False, header=False)``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.part"
+        self.tables = 0
+        self.rows = 0
+        self._file = open(self.tmp_path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file, lineterminator=os.linesep)
+
+    def write_table(self, full_table):
+        """Append one laid-out table (metadata, banner header and crosstab rows)."""
+        for row in full_table.itertuples(index=False, name=None):
+            self._writer.writerow([_csv_value(v) for v in row])
+        self.rows += len(full_table)
+        self.tables += 1
+        self._file.flush()
+
+    @property
+    def bytes_written(self):
+        return self._file.tell() if self._file else os.path.getsize(self.path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# Layout produced by tab_runner.build_table: 9 metadata rows (the table name
+# is row 5, the question text row 6), banner labels, banner ids, then the crosstab
+TABLE_NAME_ROW = 5
+TITLE_ROW = 6
+BANNER_ROWS = (9, 10)
+HEADER_ROWS = 11
+
+
+class XlsxTableWriter:
+    """
+    Stream finished tables into a formatted Excel report.
+
+    Uses xlsxwriter's constant-memory mode, so rows are flushed to disk as
+    they are written and the workbook is never held in RAM. Tables go on their
+    own sheet (``layout="sheets"``) or one after another on a single sheet with
+    page breaks (``layout="single"``); a Contents sheet links to every table.
+    Banner headers are bold; counts, stats and percentages (``NumberCell``)
+    are written as real numbers formatted to the table's decimal places.
+    """
+
+    LAYOUTS = ("sheets", "single")
+
+    def __init__(self, path, layout="sheets"):
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"Unknown XLSX layout: {layout!r} (expected one of {', '.join(self.LAYOUTS)})")
+        try:
+            import xlsxwriter
+        except ImportError as e:
+            raise ImportError("xlsxwriter package required for Excel output", name="xlsxwriter") from e
+
+        self.path = path
+        self.tmp_path = f"{path}.part"
+        self.layout = layout
+        self.tables = 0
+        self.rows = 0
+        self._book = xlsxwriter.Workbook(self.tmp_path, {"constant_memory": True})
+        self._bold = self._book.add_format({"bold": True})
+        self._title = self._book.add_format({"bold": True, "font_size": 12})
+        self._number_formats = {}
+        self._link = self._book.add_format({"font_color": "blue", "underline": 1})
+
+        self._contents = self._book.add_worksheet("Contents")
+        self._contents.set_column(0, 0, 12)
+        self._contents.set_column(1, 1, 100)
+        self._contents.write_row(0, 0, ["Table", "Question"], self._bold)
+        self._single_sheet = None
+        self._single_row = 0
+        self._page_breaks = []
+
+    def _number_format(self, decimals, percent):
+        key = (decimals, percent)
+        if key not in self._number_formats:
+            num_format = "0" + ("." + "0" * decimals if decimals > 0 else "") + ("%" if percent else "")
+            self._number_formats[key] = self._book.add_format({"num_format": num_format})
+        return self._number_formats[key]
+
+    def _value(self, value):
+        """Cell value and format for a crosstab value (``NumberCell`` values are written as numbers)."""
+        if isinstance(value, NumberCell) and math.isfinite(value.number):
+            number = value.number / 100 if value.percent else value.number
+            return number, self._number_format(value.decimals, value.percent)
+        return value, None
+
+    def write_table(self, full_table):
+        rows = full_table.values.tolist()
+        table_name = str(rows[TABLE_NAME_ROW][0])
+
+        if self.layout == "sheets":
+            sheet = self._book.add_worksheet(table_name[:31])
+            sheet.set_column(0, 0, 40)
+            sheet.set_column(1, len(full_table.columns) - 1, 14)
+            start = 0
+            target = f"internal:'{sheet.name}'!A1"
+        else:
+            if self._single_sheet is None:
+                self._single_sheet = self._book.add_worksheet("Tables")
+                self._single_sheet.set_column(0, 0, 40)
+                self._single_sheet.set_column(1, len(full_table.columns) - 1, 14)
+            sheet = self._single_sheet
+            start = self._single_row
+            if start:
+                self._page_breaks.append(start)
+            target = f"internal:'Tables'!A{start + 1}"
+
+        for i, row in enumerate(rows):
+            r = start + i
+            if i == TITLE_ROW:
+                sheet.write_string(r, 0, str(row[0]), self._title)
+            elif i in BANNER_ROWS:
+                sheet.write_row(r, 0, row, self._bold)
+            elif i < HEADER_ROWS:
+                sheet.write_row(r, 0, row)
+            else:
+                sheet.write(r, 0, row[0], self._bold if row[0] else None)
+                for c, value in enumerate(row[1:], start=1):
+                    value, fmt = self._value(value)
+                    if value != "":
+                        sheet.write(r, c, value, fmt)
+
+        self.tables += 1
+        self.rows += len(rows)
+        if self.layout == "single":
+            self._single_row = start + len(rows)
+        self._contents.write_url(self.tables, 0, target, self._link, table_name)
+        self._contents.write_string(self.tables, 1, str(rows[TITLE_ROW][0]))
+
+    def close(self):
+        if self._book is not None:
+            if self._single_sheet is not None and self._page_breaks:
+                self._single_sheet.set_h_pagebreaks(self._page_breaks)
+            self._book.close()
+            self._book = None
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self._book is not None:
+            try:
+                self._book.close()
+            finally:
+                self._book = None
+                if os.path.exists(self.tmp_path):
+                    os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+OUTPUT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def open_table_writer(path, output_format="csv", **options):
+    """Streaming writer for ``output_format`` ("csv" or "xlsx")."""
+    if output_format == "csv":
+        return CsvTableWriter(path)
+    if output_format == "xlsx":
+        return XlsxTableWriter(path, **options)
+    raise ValueError(f"Unsupported output format: {output_format}")
@@ -0,0 +1,73 @@
+# tests/test_expressions.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from banner_masks import BannerMaskCache
+from expressions import ExpressionError, compile_expression, validate_expressions
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(1)
+    n = 400
+    df = pd.DataFrame({
+        "a": pd.array(rng.choice([1, 2, 3, None], n), dtype="Int64"),
+        "b": rng.integers(0, 5, n).astype(float),
+        "my col": rng.integers(1, 4, n),
+        "s": pd.Series(rng.choice(["apple", "banana", "cherry"], n), dtype=object),
+        **{f"S6r{i}": pd.array(rng.choice([0, 1, None], n), dtype="Int8") for i in range(1, 10)},
+    })
+    df.loc[rng.random(n) < 0.1, "b"] = np.nan
+    return df
+
+
+@pytest.fixture(scope="module")
+def masks(frame):
+    return BannerMaskCache(frame)
+
+
+@pytest.fixture(scope="module")
+def numeric_view(frame, masks):
+    """What ``DataFrame.query`` evaluated before: nullable numbers as float64 with NaN blanks."""
+    return pd.DataFrame({name: masks._column(name) for name in frame.columns})
+
+
+@pytest.mark.parametrize("expression", [
+    "a == 1", "b > 2", "a != 2", "`my col` == 3", "a in [1, 3]", "b not in [0, 4]", "1 < b <= 3",
+    "a + b > 3", "b * 2 == 4", "a == [2, 3]", "-b < -1", "2 == a", "b % 2 == 1",
+    "(a == 1 or b > 2) and not (S6r3 == 1)", "~(a == 2) & (b >= 1) | (`my col` == 1)",
+    "a.isna()", "b.notnull() and a == 1", "b.between(1, 3)", "b.between(1, 3, inclusive='left')",
+    "a.isin([1, 2])", "s.str.startswith('b')", "s.str.len() > 5", "b.abs() == 2",
+])
+def test_compiled_masks_match_query(expression, masks, numeric_view):
+    expected = numeric_view.eval(expression).to_numpy(dtype=bool)
+    np.testing.assert_array_equal(masks.mask(expression), expected)
+
+
+def test_range_reducers_match_their_expansion(masks, numeric_view):
+    any_of = " or ".join(f"S6r{i} == 1" for i in range(1, 10))
+    np.testing.assert_array_equal(masks.mask("any(S6r1..S6r9 == 1)"), numeric_view.eval(any_of).to_numpy())
+    np.testing.assert_array_equal(masks.mask("all(S6r1..S6r9 == 1)"),
+                                  numeric_view.eval(any_of.replace(" or ", " and ")).to_numpy())
+    selected = sum((numeric_view[f"S6r{i}"] == 1).astype(int) for i in range(1, 10))
+    np.testing.assert_array_equal(masks.mask("count(S6r1..S6r9 == 1) >= 3"), (selected >= 3).to_numpy())
+    np.testing.assert_array_equal(masks.mask("any(S6r1..S6r3.isna())"),
+                                  numeric_view[["S6r1", "S6r2", "S6r3"]].isna().any(axis=1).to_numpy())
+
+
+def test_equal_subexpressions_share_a_tree():
+    assert compile_expression("a == 1 and b > 2").tree == compile_expression("b > 2 & (a == 1)").tree
+    assert compile_expression("1 <= b").tree == compile_expression("b >= 1").tree
+
+
+@pytest.mark.parametrize("expression", ["a ==", "foo(a)", "S6r1..S6r3 == 1", "S6r9..S6r1", "a.nosuchmethod()",
+                                        "a._values()", "a.isna(1)"])
+def test_invalid_expressions_raise(expression):
+    with pytest.raises(ExpressionError):
+        compile_expression(expression)
+
+
+def test_validation_reports_every_unknown_column():
+    with pytest.raises(ExpressionError, match="x, y.*\n.*z"):
+        validate_expressions(["x == 1 and y == 2", "z.isna()"], columns=["a"])
@@ -0,0 +1,31 @@
+# tests/test_question_store.py
+import pytest
+
+from question_store import QuestionStore, QuestionStoreError
+
+
+def _question(question_var, question_type="single", **extra):
+    return {"question_var": question_var, "question_text": f"{question_var} text", "base_text": "Total",
+            "display_structure": [["code", "Yes", 1]], "base_filter": None, "question_type": question_type,
+            "mean_var": None, "show_sigma": True, **extra}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return QuestionStore(str(tmp_path / "questions.db"))
+
+
+def test_search_matches_underscore_and_percent_literally(store):
+    store.add_many([_question("S6_1"), _question("S601"), _question("S6X1"), _question("Q10%"), _question("Q100")])
+    assert [var for _, var, _ in store.page(search="S6_1")] == ["S6_1"]
+    assert [var for _, var, _ in store.page(search="10%")] == ["Q10%"]
+    assert store.count("s6") == 3
+    assert store.count("2") == 1  # the id
+
+
+def test_update_replaces_the_stored_config(store):
+    question_id = store.add(_question(["G1", "G2"], "grid", item_labels=["First", "Second"]))
+    store.update(question_id, _question("G1"))
+    assert store.get(question_id) == {"id": question_id, **_question("G1")}
+    with pytest.raises(QuestionStoreError):
+        store.update(question_id + 1, _question("G1"))
@@ -0,0 +1,95 @@
+# tests/test_result_cube.py
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_survey
+from data_loader import load_data
+from result_cube import CubeError, ResultCube
+from table_partials import GridPartial
+from tab_runner import iter_tables, question_partials
+
+RUN_INFO = {"client_name": "C", "study_name": "S", "month": "October", "year": 2026}
+
+
+@pytest.fixture(scope="module", params=[None, "wt"])
+def run(request, tmp_path_factory):
+    """Data, questions, banners and table options of a small survey with singles, multis and grids."""
+    directory = tmp_path_factory.mktemp("cube")
+    data, questions, banner_config, _ = make_survey(respondents=3000, singles=4, multis=2, grids=2, banners=6,
+                                                    seed=9, grid_mode="grid")
+    data["wt"] = np.round(np.random.default_rng(9).lognormal(0, 0.4, len(data)), 4)
+    data.to_csv(directory / "data.csv", index=False)
+    data, _ = load_data(str(directory / "data.csv"), use_cache=False)
+    table_options = {"weight_var": request.param, "sig_level": 0.95}
+    return directory, data, questions, banner_config, table_options
+
+
+@pytest.fixture(scope="module")
+def cube(run):
+    directory, data, questions, banner_config, table_options = run
+    partials = question_partials(data, questions, banner_config, table_options=table_options, **RUN_INFO)
+    return ResultCube(questions, banner_config, RUN_INFO, partials, table_options)
+
+
+def _assert_same_partial(loaded, saved):
+    assert type(loaded) is type(saved)
+    np.testing.assert_array_equal(loaded.bases, saved.bases)
+    if saved.weight_totals is None:
+        assert loaded.weight_totals is None
+    else:
+        np.testing.assert_array_equal(loaded.weight_totals, saved.weight_totals)
+    if isinstance(saved, GridPartial):
+        np.testing.assert_array_equal(loaded.counts, saved.counts)
+    else:
+        assert loaded.rows.keys() == saved.rows.keys()
+        for pos, counts in saved.rows.items():
+            np.testing.assert_array_equal(loaded.rows[pos], counts)
+        np.testing.assert_array_equal(loaded.code_total, saved.code_total)
+    if saved.stats is None:
+        assert loaded.stats is None
+    else:
+        for name in ("totals", "means", "m2", "weight_squares", "levels", "histogram"):
+            np.testing.assert_array_equal(getattr(loaded.stats, name), getattr(saved.stats, name))
+
+
+def test_save_load_round_trip_keeps_every_aggregate(run, cube):
+    path = cube.save(str(run[0] / "results.npz"))
+    loaded = ResultCube.load(path)
+    assert loaded.questions == cube.questions and loaded.banner_config == cube.banner_config
+    assert loaded.run_info == cube.run_info and loaded.table_options == cube.table_options
+    assert loaded.partials.keys() == cube.partials.keys()
+    for table_number, partial in cube.partials.items():
+        _assert_same_partial(loaded.partials[table_number], partial)
+
+
+def test_loaded_cube_lays_out_the_tables_of_a_fresh_run(run, cube):
+    directory, data, questions, banner_config, table_options = run
+    loaded = ResultCube.load(cube.save(str(directory / "layout.npz")))
+    fresh = list(iter_tables(data, questions, banner_config, table_options=table_options, **RUN_INFO))
+    from_cube = list(loaded.iter_tables())
+    assert len(from_cube) == len(fresh)
+    for table, expected in zip(from_cube, fresh):
+        assert table.equals(expected)
+
+
+def test_render_options_and_banner_selection(run, cube):
+    directory, data, questions, banner_config, table_options = run
+    keep = [banner_config[2]["id"], banner_config[0]["id"]]
+    selected = cube.select(keep)
+    options = {**table_options, "decimals": 1, "sig_level": None}
+    fresh = list(iter_tables(data, questions, [banner_config[2], banner_config[0]], table_options=options,
+                             **RUN_INFO))
+    for table, expected in zip(selected.iter_tables({"decimals": 1, "sig_level": None}), fresh):
+        assert table.equals(expected)
+
+    with pytest.raises(CubeError, match="Unknown banner"):
+        cube.select(["nope"])
+    with pytest.raises(CubeError, match="weight_var"):
+        list(cube.iter_tables({"weight_var": "other"}))
+
+
+def test_files_that_are_not_cubes_are_rejected(tmp_path):
+    path = tmp_path / "bad.npz"
+    path.write_bytes(b"not a cube")
+    with pytest.raises(CubeError):
+        ResultCube.load(str(path))
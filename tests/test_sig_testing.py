@@ -0,0 +1,45 @@
+# tests/test_sig_testing.py
+import numpy as np
+import pytest
+
+from sig_testing import mean_tests, proportion_tests, significance_letters, t_critical, z_critical
+
+
+def test_critical_values_match_the_tables():
+    assert z_critical(0.95) == pytest.approx(1.959964, abs=1e-6)
+    assert z_critical(0.99) == pytest.approx(2.575829, abs=1e-6)
+    # Student's t, two-tailed 95%
+    np.testing.assert_allclose(t_critical(0.95, [5, 10, 30, 120]), [2.5706, 2.2281, 2.0423, 1.9799], atol=2e-3)
+    with pytest.raises(ValueError):
+        z_critical(95)
+
+
+def test_proportion_z_test_by_hand():
+    # 60% vs 45% on 100 each: pooled 0.525, se = sqrt(.525 * .475 * .02) = 0.07062, z = 2.124
+    counts = [[60, 45, 50, 15]]
+    bases = [100, 100, 100, 20]
+    sig = proportion_tests(counts, bases, 0.95)[0]
+    assert sig[0, 1] and not sig[1, 0]
+    # 60% vs 50%: z = 1.42
+    assert not sig[0, 2]
+    # The 20-respondent column is below the minimum base and never tested
+    assert not sig[:, 3].any() and not sig[3].any()
+    assert not proportion_tests(counts, bases, 0.99)[0][0, 1]
+
+
+def test_weighted_proportions_use_the_effective_base():
+    # Same shares as above, but an effective base of 40 per column leaves z = 1.34
+    sig = proportion_tests([[60, 45]], [100, 100], 0.95, effective_bases=[40, 40])[0]
+    assert not sig.any()
+
+
+def test_welch_t_test_by_hand():
+    # 10 vs 9, std 2 on 50 each: se = 0.4, t = 2.5 on 98 degrees of freedom (critical 1.98 / 2.63)
+    assert mean_tests([10, 9], [2, 2], [50, 50], 0.95).tolist() == [[False, True], [False, False]]
+    assert not mean_tests([10, 9], [2, 2], [50, 50], 0.99).any()
+
+
+def test_letters_are_separated_when_an_id_has_several_characters():
+    sig = np.array([[False, True, True], [False, False, False], [True, False, False]])
+    assert significance_letters(sig, ["A", "B", "C"]).tolist() == ["BC", "", "A"]
+    assert significance_letters(sig, ["N1", "N12", "N2"]).tolist() == ["N12 N2", "", "N1"]
@@ -0,0 +1,82 @@
+# tests/test_table_partials.py
+import json
+from functools import partial
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_survey
+from data_loader import iter_prepared_chunks, load_data
+from tab_cli import load_questions, run_study, validate_job
+from tab_runner import chunk_partials, load_banner_config, question_partials
+from table_partials import GridPartial
+
+
+@pytest.fixture(scope="module")
+def weighted_study(tmp_path_factory):
+    """A synthetic survey with survey-style weights (four decimals) and its job defaults."""
+    directory = tmp_path_factory.mktemp("study")
+    data, questions, banner_config, _ = make_survey(respondents=20_000, singles=6, multis=3, grids=2,
+                                                    banners=8, seed=4, grid_mode="grid")
+    data["wt"] = np.round(np.random.default_rng(4).lognormal(0, 0.5, len(data)), 4)
+    data.to_csv(directory / "data.csv", index=False)
+    (directory / "questions.json").write_text(json.dumps(questions))
+    (directory / "banners.json").write_text(json.dumps(banner_config))
+    defaults = {"client_name": "C", "data_file": str(directory / "data.csv"),
+                "questions": str(directory / "questions.json"), "banners": str(directory / "banners.json"),
+                "month": "October", "year": 2026, "use_data_cache": False, "reuse_tables": False}
+    return directory, defaults
+
+
+def _run(directory, defaults, name, **options):
+    job = validate_job({"study_name": "Weighted", "output": str(directory / f"{name}.csv"), **options}, defaults)
+    run_study(job)
+    return (directory / f"{name}.csv").read_bytes()
+
+
+@pytest.mark.parametrize("options", [{"weight_var": "wt"}, {"weight_var": "wt", "sig_level": 0.95}, {}])
+def test_streamed_output_is_byte_identical_to_serial(weighted_study, options):
+    directory, defaults = weighted_study
+    serial = _run(directory, defaults, "serial", **options)
+    for chunk_rows in (1000, 777):
+        assert _run(directory, defaults, f"stream{chunk_rows}", streaming=True, chunk_rows=chunk_rows,
+                    **options) == serial
+
+
+def _assert_partials_equal(merged, whole, exact):
+    # Weighted sums only differ in their last bits (No Answer is a difference of two of them)
+    check = np.testing.assert_array_equal if exact else partial(np.testing.assert_allclose, rtol=1e-9, atol=1e-6)
+    np.testing.assert_array_equal(merged.bases, whole.bases)
+    if whole.weight_totals is not None:
+        check(merged.weight_totals, whole.weight_totals)
+    if isinstance(whole, GridPartial):
+        check(merged.counts, whole.counts)
+    else:
+        assert merged.rows.keys() == whole.rows.keys()
+        for pos, counts in whole.rows.items():
+            check(merged.rows[pos], counts)
+        check(merged.code_total, whole.code_total)
+        if whole.no_answer is not None:
+            check(merged.no_answer, whole.no_answer)
+    if whole.stats is not None:
+        for name in ("totals", "means", "m2", "weight_squares", "histogram"):
+            np.testing.assert_allclose(getattr(merged.stats, name), getattr(whole.stats, name), rtol=1e-9,
+                                       atol=1e-6)
+        np.testing.assert_array_equal(merged.stats.levels, whole.stats.levels)
+
+
+@pytest.mark.parametrize("weight_var", [None, "wt"])
+def test_merged_chunk_partials_equal_the_whole_file(weighted_study, weight_var):
+    directory, defaults = weighted_study
+    questions = load_questions(defaults["questions"])
+    banner_config = load_banner_config(defaults["banners"])
+    run_info = {"client_name": "C", "study_name": "S", "month": "October", "year": 2026}
+    table_options = {"weight_var": weight_var}
+    data, _ = load_data(defaults["data_file"], use_cache=False)
+    whole = question_partials(data, questions, banner_config, table_options=table_options, **run_info)
+    chunks = (chunk for chunk, _ in iter_prepared_chunks(defaults["data_file"], chunksize=1500))
+    merged = chunk_partials(chunks, questions, banner_config, table_options=table_options, **run_info)
+
+    assert merged.keys() == whole.keys()
+    for table_number, table_partial in whole.items():
+        _assert_partials_equal(merged[table_number], table_partial, exact=weight_var is None)
@@ -0,0 +1,75 @@
+# tests/test_weighting.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from weighting import (WeightingError, effective_base, parse_rim_targets, rim_weights, weight_vector,
+                       weighted_quantile, weighted_summary)
+
+
+def _shares(df, var, weights):
+    totals = weights.groupby(df[var]).sum()
+    return (totals / totals.sum()).to_dict()
+
+
+def test_single_rim_has_a_closed_form():
+    # Three code-1 respondents and one code-2 respondent raked to 50/50
+    df = pd.DataFrame({"g": [1, 1, 1, 2]})
+    weights, report = rim_weights(df, {"g": {1: 0.5, 2: 0.5}})
+    np.testing.assert_allclose(weights.to_numpy(), [2 / 3, 2 / 3, 2 / 3, 2])
+    assert report["converged"] and report["iterations"] == 1
+    assert report["efficiency"] == pytest.approx(effective_base(weights) / 4)
+
+
+def test_rim_weights_hit_every_target():
+    rng = np.random.default_rng(2)
+    n = 5000
+    df = pd.DataFrame({"gender": rng.choice([1, 2], n, p=[0.3, 0.7]),
+                       "age": rng.choice([1, 2, 3], n, p=[0.5, 0.3, 0.2]),
+                       "region": rng.choice([1, 2, 3, 4, np.nan], n)})
+    targets = parse_rim_targets('{"gender": {"1": 50, "2": 50}, "age": {"1": 1, "2": 1, "3": 2}, '
+                                '"region": {"1": 0.25, "2": 0.25, "3": 0.25, "4": 0.25}}')
+    weights, report = rim_weights(df, targets)
+
+    assert report["converged"] and report["max_error"] < 1e-6
+    assert _shares(df, "gender", weights) == pytest.approx({1: 0.5, 2: 0.5}, abs=1e-6)
+    assert _shares(df, "age", weights) == pytest.approx({1: 0.25, 2: 0.25, 3: 0.5}, abs=1e-6)
+    # Blank regions have no target and are matched on the other rims only
+    assert _shares(df[df.region.notna()], "region", weights[df.region.notna()]) == pytest.approx(
+        {1: 0.25, 2: 0.25, 3: 0.25, 4: 0.25}, abs=1e-6)
+    assert weights.mean() == pytest.approx(1.0)
+
+
+def test_rim_targets_without_respondents_are_rejected():
+    with pytest.raises(WeightingError, match="no respondents"):
+        rim_weights(pd.DataFrame({"g": [1, 1]}), {"g": {1: 0.5, 2: 0.5}})
+    with pytest.raises(WeightingError, match="not in the data"):
+        rim_weights(pd.DataFrame({"g": [1]}), {"h": {1: 1}})
+
+
+def test_weight_vector_treats_blanks_as_zero_and_rejects_negatives():
+    np.testing.assert_array_equal(weight_vector(pd.Series([1.5, None, 2])), [1.5, 0.0, 2.0])
+    with pytest.raises(WeightingError):
+        weight_vector(pd.Series([1.0, -1.0], name="wt"))
+
+
+def test_weighted_summary_by_hand():
+    values = [1.0, 2.0, 4.0, np.nan]
+    weights = [1.0, 2.0, 1.0, 5.0]
+    mean, std, sem, median = weighted_summary(values, weights)
+    # sum w = 4, mean = (1 + 4 + 4) / 4, squared deviations weighted / (sum w - 1)
+    assert mean == pytest.approx(2.25)
+    assert std == pytest.approx(np.sqrt((1.25 ** 2 + 2 * 0.25 ** 2 + 1.75 ** 2) / 3))
+    assert sem == pytest.approx(std / np.sqrt(16 / 6))
+    assert median == 2.0
+
+
+def test_unit_weights_reproduce_the_unweighted_statistics():
+    values = np.random.default_rng(5).integers(0, 10, 101).astype(float)
+    mean, std, _, median = weighted_summary(values, np.ones_like(values))
+    assert mean == pytest.approx(values.mean())
+    assert std == pytest.approx(values.std(ddof=1))
+    assert median == np.median(values)
+    for q in (0.0, 0.25, 0.5, 0.9, 1.0):
+        assert weighted_quantile(values, np.ones_like(values), q) == np.quantile(
+            values, q, method="averaged_inverted_cdf")
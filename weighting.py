@@ -0,0 +1,191 @@
+# weighting.py
+import json
+
+import numpy as np
+import pandas as pd
+
+
+class WeightingError(ValueError):
+    """Raised when weights are invalid or rim targets cannot be met."""
+
+
+# ----------------------
+# Weight columns and weighted statistics
+# ----------------------
+def weight_vector(series):
+    """
+    Respondent weights as a float64 array.
+
+    Missing weights count as 0, so those respondents still appear in the
+    unweighted base but add nothing to weighted figures. Negative or
+    infinite weights are rejected.
+    """
+    weights = pd.to_numeric(pd.Series(series), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    weights = np.where(np.isnan(weights), 0.0, weights)
+    if not np.isfinite(weights).all() or (weights < 0).any():
+        raise WeightingError(f"Weight variable {getattr(series, 'name', '')!r} has negative or infinite values")
+    return weights
+
+
+def effective_base(weights):
+    """Kish effective sample size: (sum w)^2 / sum w^2."""
+    weights = np.asarray(weights, dtype=np.float64)
+    total_sq = float(np.dot(weights, weights))
+    return float(weights.sum()) ** 2 / total_sq if total_sq > 0 else 0.0
+
+
+def weighted_summary(values, weights):
+    """
+    Weighted ``(mean, std, sem, median)`` of ``values``, ignoring blanks.
+
+    The standard deviation treats weights as frequencies (divisor sum w - 1),
+    the standard error uses the effective base, and the median is the value
+    where the cumulative weight reaches half the total (the midpoint of two
+    values when it lands exactly between them). With all weights equal to 1
+    this matches the unweighted pandas statistics.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    keep = ~np.isnan(values) & (weights > 0)
+    values, weights = values[keep], weights[keep]
+    total = weights.sum()
+    if total <= 0:
+        return np.nan, np.nan, np.nan, np.nan
+
+    mean = np.dot(weights, values) / total
+    std = np.sqrt(np.dot(weights, (values - mean) ** 2) / (total - 1)) if total > 1 else np.nan
+    sem = std / np.sqrt(effective_base(weights))
+    return mean, std, sem, weighted_median(values, weights)
+
+
+def weighted_median(values, weights):
+    """
+    Value where the cumulative weight reaches half the total.
+
+    ``values`` may repeat (raw answers) or be distinct levels of a histogram
+    with their summed weights; both give the same result. When half the
+    weight falls exactly between two values their midpoint is returned, so
+    unit weights reproduce the ordinary median.
+    """
+    return weighted_quantile(values, weights, 0.5)
+
+
+def weighted_quantile(values, weights, q):
+    """
+    Value where the cumulative weight reaches ``q`` (0 to 1) of the total.
+
+    Follows the median's rule: when the cumulative weight lands exactly on
+    ``q`` the midpoint of the two neighbouring values is returned (numpy's
+    ``averaged_inverted_cdf`` for unit weights). ``q=0`` and ``q=1`` give
+    the smallest and largest value.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    keep = weights > 0
+    values, weights = values[keep], weights[keep]
+    if not len(values):
+        return np.nan
+    order = np.argsort(values, kind="stable")
+    values, cumulative = values[order], np.cumsum(weights[order])
+    total = cumulative[-1]
+    target = total * q
+    i = min(int(np.searchsorted(cumulative, target - 1e-9 * total)), len(values) - 1)
+    result = values[i]
+    if abs(cumulative[i] - target) <= 1e-9 * total and i + 1 < len(values):
+        result = (values[i] + values[i + 1]) / 2
+    return result
+
+
+# ----------------------
+# Rim weighting (raking)
+# ----------------------
+def _rim_codes(series, targets):
+    """Position of each respondent's answer in ``targets`` (-1 when it has no target)."""
+    index = pd.Index(list(targets), dtype=object)
+    return index.get_indexer(pd.Series(series, dtype=object))
+
+
+def _target_code(key):
+    """JSON object keys are strings; read numeric codes back as numbers."""
+    try:
+        number = float(key)
+    except (TypeError, ValueError):
+        return key
+    return int(number) if number.is_integer() else number
+
+
+def parse_rim_targets(spec):
+    """Rim targets from JSON text or a dict, with numeric codes turned back into numbers."""
+    try:
+        if isinstance(spec, str):
+            spec = json.loads(spec)
+        if not isinstance(spec, dict) or not all(isinstance(shares, dict) for shares in spec.values()):
+            raise TypeError
+        return {var: {_target_code(code): float(share) for code, share in shares.items()}
+                for var, shares in spec.items()}
+    except (TypeError, ValueError) as e:
+        raise WeightingError('Rim targets must look like {"variable": {"code": share, ...}, ...}') from e
+
+
+def rim_weights(df, targets, base_weights=None, max_iter=50, tol=1e-6):
+    """
+    Rim weights that match ``targets`` by iterative proportional fitting.
+
+    ``targets`` maps a variable to ``{code: share}``; shares are normalised,
+    so proportions, percentages or counts all work. Every variable is
+    factorized once up front, after which each iteration is one weighted
+    bincount and one gather per variable. Respondents whose answer has no
+    target (including blanks) are not adjusted on that variable, and the
+    targeted ones are matched against the weight they hold between them.
+
+    Returns ``(weights, report)``: a Series aligned to ``df`` whose non-zero
+    weights average 1, and a dict with ``iterations``, ``converged``,
+    ``max_error`` (largest gap between achieved and target share),
+    ``efficiency`` (effective base / n) and the min/max weight.
+    """
+    n = len(df)
+    weights = np.ones(n) if base_weights is None else weight_vector(base_weights).copy()
+    rims = []
+    for var, shares in targets.items():
+        if var not in df.columns:
+            raise WeightingError(f"Rim variable {var!r} is not in the data")
+        if not shares:
+            raise WeightingError(f"Rim variable {var!r} has no targets")
+        goal = np.asarray(list(shares.values()), dtype=np.float64)
+        if (goal < 0).any() or goal.sum() <= 0:
+            raise WeightingError(f"Targets for {var!r} must be non-negative and not all zero")
+        codes = _rim_codes(df[var], shares)
+        targeted = codes >= 0
+        counts = np.bincount(codes[targeted], weights=weights[targeted], minlength=len(goal))
+        empty = [code for code, share, have in zip(shares, goal, counts) if share > 0 and have <= 0]
+        if empty:
+            raise WeightingError(f"Rim variable {var!r} has no respondents for targeted codes {empty}")
+        rims.append((np.flatnonzero(targeted), codes[targeted], goal / goal.sum()))
+
+    iterations = 0
+    max_error = 0.0
+    for iterations in range(1, max_iter + 1):
+        for rows, codes, goal in rims:
+            current = weights[rows]
+            totals = np.bincount(codes, weights=current, minlength=len(goal))
+            factors = np.divide(goal * totals.sum(), totals, out=np.zeros_like(totals), where=totals > 0)
+            weights[rows] = current * factors[codes]
+
+        max_error = 0.0
+        for rows, codes, goal in rims:
+            totals = np.bincount(codes, weights=weights[rows], minlength=len(goal))
+            max_error = max(max_error, float(np.abs(totals / totals.sum() - goal).max()))
+        if max_error < tol:
+            break
+
+    if weights.sum() > 0:
+        weights *= weights.astype(bool).sum() / weights.sum()
+    report = {
+        "iterations": iterations,
+        "converged": max_error < tol,
+        "max_error": max_error,
+        "efficiency": effective_base(weights) / n if n else 0.0,
+        "min_weight": float(weights.min()) if n else 0.0,
+        "max_weight": float(weights.max()) if n else 0.0,
+    }
+    return pd.Series(weights, index=df.index, name="weight"), report